@@ -12,6 +12,7 @@ CREATE TABLE products (
     description JSONB DEFAULT '{}',     -- 제품 설명
     material JSONB DEFAULT '{}',        -- 재질
     size JSONB DEFAULT '{}',            -- 사이즈
+    searchable_text TEXT,               -- 색상/설명/재질/사이즈/리워드 통합 검색 텍스트 (스크래핑 시 생성)
     issoldout BOOLEAN DEFAULT FALSE,    -- 품절 여부
     indexed BOOLEAN DEFAULT FALSE,      -- 벡터DB 인덱싱 여부
     scraped_at TIMESTAMP DEFAULT NOW(),
@@ -26,6 +27,15 @@ CREATE TABLE product_images (
     image_order INTEGER DEFAULT 0       -- 이미지 순서
 );
 
+-- Chunk texts for vector search results (Milvus stores only product_id + chunk_ord)
+CREATE TABLE product_chunks (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    chunk_ord SMALLINT NOT NULL,        -- 제품 내 청크 순번
+    chunk_type VARCHAR(100),            -- 청크 타입
+    content TEXT NOT NULL,              -- 청크 원문
+    PRIMARY KEY (product_id, chunk_ord)
+);
+
 -- Scraping jobs for tracking scraping operations
 CREATE TABLE scraping_jobs (
     id SERIAL PRIMARY KEY,
@@ -38,4 +48,6 @@ CREATE TABLE scraping_jobs (
 
 -- Create basic indexes
 CREATE INDEX idx_products_indexed ON products(indexed);
+-- 미인덱싱 제품 카운트를 index-only scan으로 처리하기 위한 부분 인덱스
+CREATE INDEX idx_products_pending ON products(id) WHERE indexed = false;
 CREATE INDEX idx_product_images_product_id ON product_images(product_id);
\ No newline at end of file
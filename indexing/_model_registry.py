@@ -0,0 +1,55 @@
+"""
+BGE-M3 모델 레지스트리 - 프로세스 내 단일 인스턴스
+같은 (모델, fp16) 조합은 한 번만 로드하여 가중치/CUDA 컨텍스트/워밍업을 공유
+"""
+
+import functools
+import logging
+
+import torch
+import torch.multiprocessing
+from FlagEmbedding import BGEM3FlagModel
+
+logger = logging.getLogger(__name__)
+
+# 워커 프로세스로 텐서를 넘길 때 파일 디스크립터 고갈 방지
+torch.multiprocessing.set_sharing_strategy('file_system')
+
+def _compile_encoder(model: BGEM3FlagModel, warmup_batch: int) -> bool:
+    """
+    내부 XLM-RoBERTa 인코더를 torch.compile로 감싸고 최대 배치로 2회 워밍업 (실패 시 eager 유지)
+
+    컴파일은 첫 forward 시점에 일어나므로 트래픽 전에 그래프 캡처/커널 선택을 끝냄
+    """
+    wrapper = model.model
+    eager_encoder = wrapper.model
+    try:
+        # mode="default": encode가 여러 워커 스레드에서 호출되므로 스레드별 cudagraph 트리를 만드는 reduce-overhead는 사용 안 함
+        wrapper.model = torch.compile(eager_encoder, mode="default", dynamic=True, fullgraph=False)
+        with torch.inference_mode():
+            for _ in range(2):
+                model.encode(["warmup " * 16] * warmup_batch, batch_size=warmup_batch, max_length=512)
+        logger.info(f"✅ torch.compile 워밍업 완료 (배치: {warmup_batch})")
+        return True
+    except Exception as e:
+        wrapper.model = eager_encoder
+        logger.warning(f"⚠️ torch.compile 실패, eager 모드로 실행: {e}")
+        return False
+
+@functools.lru_cache(maxsize=4)
+def load_bge(model_name: str, fp16: bool, compile_batch: int = 0) -> BGEM3FlagModel:
+    """
+    BGE-M3 모델 로드 (캐시) - 첫 로드 시 워밍업 encode 1회로 cuBLAS/cuDNN 커널 선택까지 완료
+
+    Args:
+        model_name: 모델 이름 또는 로컬 경로
+        fp16: FP16 가중치 사용 여부 (GPU)
+        compile_batch: 0보다 크면 GPU에서 인코더를 torch.compile하고 이 배치 크기로 워밍업
+    """
+    model = BGEM3FlagModel(model_name, use_fp16=fp16)
+    with torch.inference_mode():
+        model.encode(["warmup"], batch_size=1, max_length=32)
+    if compile_batch > 0 and torch.cuda.is_available():
+        _compile_encoder(model, compile_batch)
+    logger.info(f"✅ BGE-M3 로드 및 워밍업 완료: {model_name} (fp16: {fp16})")
+    return model
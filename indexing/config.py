@@ -0,0 +1,54 @@
+"""
+인덱싱 서비스 설정 모듈
+환경변수를 import 시점에 한 번만 로드하여 타입이 지정된 상수로 제공
+"""
+
+import os
+from dotenv import load_dotenv
+
+# .env.global(프로젝트 전역) → .env(서비스 로컬) 순서로 한 번만 로드
+load_dotenv('../.env.global')
+load_dotenv()
+
+# PostgreSQL - 환경변수 필수 (기본값 없음, 에러 발생)
+POSTGRES_USER = os.environ['POSTGRES_USER']
+POSTGRES_PASSWORD = os.environ['POSTGRES_PASSWORD']
+POSTGRES_HOST = os.environ['POSTGRES_HOST']
+POSTGRES_DB = os.environ['POSTGRES_DB']
+# 컨테이너 간 통신에서는 내부 포트 사용
+POSTGRES_INTERNAL_PORT = os.environ['POSTGRES_INTERNAL_PORT']
+
+# Milvus - 컨테이너 간 통신용 내부 포트
+MILVUS_HOST = os.environ['MILVUS_HOST']
+MILVUS_INTERNAL_PORT = os.environ['MILVUS_INTERNAL_PORT']
+
+# 임베딩 모델
+USE_CUDA: bool = os.environ['USE_CUDA'].lower() == 'true'
+MODEL_PATH: str = os.environ.get('MODEL_PATH', '/app/models/bge-m3')  # 로컬 모델 경로
+EMBED_DTYPE: str = os.environ.get('EMBED_DTYPE', 'auto').lower()  # auto | float32 | float16 | bfloat16
+EMBED_CACHE_SIZE: int = int(os.environ.get('EMBED_CACHE_SIZE', '4096'))  # 임베딩 LRU 캐시 크기 (0이면 비활성)
+# 영구 임베딩 캐시 경로 (SQLite, 빈 문자열이면 비활성)
+EMBED_DISK_CACHE_PATH: str = os.environ.get('EMBED_DISK_CACHE_PATH', '/app/cache/embeddings.sqlite3')
+# CPU 모드에서 Linear 레이어 INT8 동적 양자화 적용 여부 - 기본 비활성 (켜면 기존 인덱스와 벡터가 어긋나므로 재인덱싱 필요)
+QUANTIZE: bool = os.environ.get('QUANTIZE', 'false').lower() == 'true'
+# torch.compile 적용 여부 - GPU에서만 기본 활성 (CPU는 컴파일 시간 대비 이득이 작음)
+EMBED_COMPILE: bool = os.environ.get('EMBED_COMPILE', 'true' if USE_CUDA else 'false').lower() == 'true'
+
+# TEI(Text-Embeddings-Inference) 서버 주소 - 설정 시 로컬 모델 대신 HTTP로 임베딩
+TEI_URL: str = os.environ.get('TEI_URL', '')
+TEI_BATCH_SIZE: int = int(os.environ.get('TEI_BATCH_SIZE', '32'))  # TEI --max-client-batch-size 이하
+
+# 인덱싱 배치 - GPU는 큰 배치에서 처리량이 높아지므로 기본 128, CPU는 32
+BATCH_SIZE: int = int(os.environ.get('INDEX_BATCH_SIZE', '128' if USE_CUDA else '32'))
+# Milvus insert 한 번에 모을 벡터 수 - 작은 insert는 RPC 오버헤드가 지배적이므로 여러 제품을 묶음
+# (8192 x 1024 x 4B = 32MB, gRPC 기본 메시지 한도 64MB 이내)
+MILVUS_INSERT_BATCH: int = int(os.environ.get('MILVUS_INSERT_BATCH', '8192'))
+# Milvus 스토리지 루트(localStorage.path)가 마운트된 경로 - 설정 시 콜드 재인덱싱에 bulk_insert 사용
+MILVUS_BULK_DIR: str = os.environ.get('MILVUS_BULK_DIR', '')
+# 전체 재인덱싱 대상이 이 제품 수 이상이면 bulk_insert 경로 사용
+BULK_INSERT_THRESHOLD: int = int(os.environ.get('BULK_INSERT_THRESHOLD', '5000'))
+# 한 배치의 텍스트 수가 이 값을 넘으면 멀티 프로세스/멀티 GPU 인코딩 사용
+MULTI_PROCESS_THRESHOLD: int = int(os.environ.get('MULTI_PROCESS_THRESHOLD', '2048'))
+
+# 서비스 포트
+INDEXING_INTERNAL_PORT: int = int(os.environ.get('INDEXING_INTERNAL_PORT', '8000'))
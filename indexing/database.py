@@ -1,28 +1,31 @@
-import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, DateTime, LargeBinary, ForeignKey
+import csv
+import io
+from typing import Dict, List, Tuple
+
+from sqlalchemy import create_engine, text, Column, Integer, SmallInteger, String, Text, Boolean, DateTime, LargeBinary, ForeignKey
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred, column_property
 from sqlalchemy.sql import func
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv('../.env.global')
-load_dotenv()
 
-# Database configuration - 환경변수 필수 (기본값 없음, 에러 발생)
-POSTGRES_USER = os.environ['POSTGRES_USER']
-POSTGRES_PASSWORD = os.environ['POSTGRES_PASSWORD'] 
-POSTGRES_HOST = os.environ['POSTGRES_HOST']
-POSTGRES_DB = os.environ['POSTGRES_DB']
-# 컨테이너 간 통신에서는 내부 포트 사용
-POSTGRES_INTERNAL_PORT = os.environ['POSTGRES_INTERNAL_PORT']
+# Database configuration - config 모듈에서 한 번만 로드된 환경변수 사용
+from config import POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_DB, POSTGRES_INTERNAL_PORT
 
 print(f"🔗 데이터베이스 연결 정보: {POSTGRES_USER}@{POSTGRES_HOST}:{POSTGRES_INTERNAL_PORT}/{POSTGRES_DB}")
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_INTERNAL_PORT}/{POSTGRES_DB}"
 
 # Create engine and session
-engine = create_engine(DATABASE_URL, pool_size=10, max_overflow=20)
+# - values_plus_batch: 다건 INSERT는 multi-VALUES, 다건 UPDATE/DELETE는 psycopg2 execute_batch로 묶어서 전송
+# (synchronous_commit=off는 멱등인 인덱싱 상태 갱신 트랜잭션에만 SET LOCAL로 적용 - main.commit_indexed)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    executemany_mode='values_plus_batch',
+    insertmanyvalues_page_size=1000,
+    executemany_batch_page_size=500,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -40,6 +43,7 @@ class Product(Base):
     description = Column(JSONB, default='{}')
     material = Column(JSONB, default='{}')
     size = Column(JSONB, default='{}')
+    searchable_text = Column(Text)  # 스크래퍼가 저장 시 생성하는 통합 검색 텍스트
     issoldout = Column(Boolean, default=False)
     indexed = Column(Boolean, default=False)
     scraped_at = Column(DateTime, server_default=func.now())
@@ -53,12 +57,23 @@ class ProductImage(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
-    image_data = Column(LargeBinary, nullable=False)
+    # 인덱싱에서는 크기만 필요하므로 바이너리는 지연 로딩, 크기는 SELECT 시 계산
+    image_data = deferred(Column(LargeBinary, nullable=False))
     image_order = Column(Integer, default=0)
+    size_bytes = column_property(func.octet_length(image_data))
     
     # Relationship
     product = relationship("Product", back_populates="images")
 
+class ProductChunkText(Base):
+    """벡터 검색 결과의 청크 원문 - Milvus에는 (product_id, chunk_ord)만 저장"""
+    __tablename__ = "product_chunks"
+    
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    chunk_ord = Column(SmallInteger, primary_key=True)  # 제품 내 청크 순번
+    chunk_type = Column(String(100))
+    content = Column(Text, nullable=False)
+
 class IndexingJob(Base):
     __tablename__ = "indexing_jobs"
     
@@ -77,9 +92,82 @@ def get_db():
     finally:
         db.close()
 
+# 스크래퍼 도입 이전 행의 통합 검색 텍스트 채우기 (scraper.build_searchable_text와 같은 형식)
+# 언어별 값은 HTML 태그 제거 + 공백 압축 후 빈 값 제외 (scraper._searchable_value와 같은 정리 규칙)
+_JSONB_TEXT = (
+    "(SELECT string_agg(v, ' / ') FROM ("
+    "SELECT btrim(regexp_replace(regexp_replace(value, '<[^>]+>', ' ', 'g'), '\\s+', ' ', 'g')) AS v "
+    "FROM jsonb_each_text(CASE WHEN jsonb_typeof({col}) = 'object' THEN {col} ELSE '{{}}'::jsonb END)"
+    ") cleaned WHERE v <> '')"
+)
+BACKFILL_SEARCHABLE_TEXT = (
+    "UPDATE products SET searchable_text = concat_ws(' | ', "
+    "'색상: ' || NULLIF(color, ''), "
+    f"'설명: ' || {_JSONB_TEXT.format(col='description')}, "
+    f"'재질: ' || {_JSONB_TEXT.format(col='material')}, "
+    f"'사이즈: ' || {_JSONB_TEXT.format(col='size')}, "
+    f"'리워드 포인트: ' || {_JSONB_TEXT.format(col='reward_points')}) "
+    "WHERE searchable_text IS NULL"
+)
+
+def save_chunk_texts(rows: List[Tuple[int, int, str, str]]) -> None:
+    """
+    청크 원문 저장 - 해당 제품들의 기존 청크를 지우고 COPY 1회로 적재 (트랜잭션 1개)
+    
+    Args:
+        rows: (product_id, chunk_ord, chunk_type, content) 목록 - 제품별 청크 전체
+    """
+    if not rows:
+        return
+    
+    # 문자열은 따옴표로 감싸 빈 문자열이 NULL로 해석되지 않도록 함
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+    
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM product_chunks WHERE product_id = ANY(%s)",
+                (sorted({row[0] for row in rows}),)
+            )
+            cursor.copy_expert(
+                "COPY product_chunks (product_id, chunk_ord, chunk_type, content) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+def fetch_chunk_texts(keys: List[Tuple[int, int]]) -> Dict[Tuple[int, int], str]:
+    """(product_id, chunk_ord) 목록의 청크 원문을 쿼리 1회로 조회"""
+    if not keys:
+        return {}
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT c.product_id, c.chunk_ord, c.content FROM product_chunks c "
+                "JOIN unnest(CAST(:pids AS integer[]), CAST(:ords AS smallint[])) AS k(product_id, chunk_ord) "
+                "USING (product_id, chunk_ord)"
+            ),
+            {"pids": [int(pid) for pid, _ in keys], "ords": [int(ord_) for _, ord_ in keys]}
+        )
+        return {(product_id, chunk_ord): content for product_id, chunk_ord, content in rows}
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    # 기존 DB에도 미인덱싱 제품 부분 인덱스 보장 (init.sql과 동일)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_products_pending ON products(id) WHERE indexed = false"
+        ))
+        conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS searchable_text TEXT"))
+        conn.execute(text(BACKFILL_SEARCHABLE_TEXT))
     print("Database tables created successfully")
 
 if __name__ == "__main__":
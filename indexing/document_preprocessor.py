@@ -5,10 +5,47 @@ PostgreSQL 제품 데이터를 단순 텍스트로 변환
 
 import json
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union
+
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
 
 logger = logging.getLogger(__name__)
 
+# (컬럼명, 라벨) - process_product와 동일한 순서로 텍스트 조합
+TEXT_FIELDS = [
+    ('name', '제품명: '),
+    ('price', '가격: '),
+    ('material', '재질: '),
+    ('features', '특징: '),
+    ('description', '설명: '),
+]
+
+def _as_string_column(column: pa.ChunkedArray) -> pa.Array:
+    """컬럼을 문자열 타입으로 변환 (빈 값은 null)"""
+    column = column.combine_chunks()
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        return pc.if_else(pc.equal(column, ''), pa.scalar(None, pa.string()), column)
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        return pc.cast(column, pa.string())
+    # dict/list 등 중첩 타입은 f-string과 동일하게 str() 변환
+    return pa.array([str(v) if v else None for v in column.to_pylist()], type=pa.string())
+
+def _parse_product_data(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+    """product_data JSON 파싱 (실패 시 None)"""
+    if not raw:
+        return None
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _labeled(label: str, values: List[Optional[str]]) -> pa.Array:
+    """라벨을 붙인 컬럼 생성 (null은 그대로 유지되어 조합 시 건너뜀)"""
+    return pc.binary_join_element_wise(label, pa.array(values, type=pa.string()), '')
+
 class DocumentPreprocessor:
     """제품 데이터를 문서로 변환"""
     
@@ -53,13 +90,57 @@ class DocumentPreprocessor:
         
         return document
     
-    def process_batch(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """배치 처리"""
-        documents = []
-        for product in products:
-            try:
-                doc = self.process_product(product)
-                documents.append(doc)
-            except Exception as e:
-                logger.error(f"Error processing product {product.get('id')}: {e}")
-        return documents
\ No newline at end of file
+    def process_batch(self, products: Union[pa.Table, List[Dict[str, Any]]]) -> pa.Table:
+        """
+        배치 처리 - 컬럼 단위로 텍스트 조합
+        
+        행별 dict 조회/문자열 연결 대신 pyarrow compute로 전체 컬럼을 한 번에 처리.
+        반환: product_id, text, metadata 컬럼을 가진 pa.Table
+              (임베딩 시 table['text'].to_pylist()로 한 번에 추출)
+        """
+        table = products if isinstance(products, pa.Table) else pa.Table.from_pylist(products)
+        
+        # id 없는 행은 문서화할 수 없으므로 제외
+        if 'id' not in table.column_names:
+            logger.error(f"Error processing batch: 'id' column missing ({table.num_rows} rows)")
+            return pa.table({'product_id': [], 'text': pa.array([], pa.string()), 'metadata': []})
+        skipped = table.num_rows - pc.count(table['id']).as_py()
+        if skipped:
+            logger.error(f"Error processing batch: {skipped}개 제품에 id 없음")
+            table = table.filter(pc.is_valid(table['id']))
+        
+        parts = []
+        for field, label in TEXT_FIELDS:
+            if field in table.column_names:
+                parts.append(pc.binary_join_element_wise(label, _as_string_column(table[field]), ''))
+        
+        # product_data JSON은 orjson으로 한 번에 파싱
+        if 'product_data' in table.column_names:
+            parsed = [_parse_product_data(raw) for raw in table['product_data'].to_pylist()]
+            parts.append(_labeled('상세: ', [
+                ' '.join(d['details']) if d and d.get('details') else None for d in parsed
+            ]))
+            parts.append(_labeled('사양: ', [
+                ' '.join(d['spec_items']) if d and d.get('spec_items') else None for d in parsed
+            ]))
+        
+        # null 파트는 건너뛰고 ' | '로 결합 (process_product와 동일한 결과)
+        if parts:
+            texts = pc.binary_join_element_wise(*parts, ' | ', null_handling='skip')
+        else:
+            texts = pa.array([''] * table.num_rows, type=pa.string())
+        
+        null_column = pa.nulls(table.num_rows, pa.string())
+        metadata = pa.StructArray.from_arrays(
+            [
+                table['name'].cast(pa.string()).combine_chunks() if 'name' in table.column_names else null_column,
+                table['url'].cast(pa.string()).combine_chunks() if 'url' in table.column_names else null_column,
+            ],
+            names=['name', 'url']
+        )
+        
+        return pa.table({
+            'product_id': table['id'],
+            'text': texts,
+            'metadata': metadata,
+        })
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+영구 임베딩 캐시 - 텍스트 SHA-256 해시 → float16 벡터 (SQLite)
+force_reindex 등으로 변경되지 않은 청크를 다시 인덱싱할 때 BGE-M3 추론을 생략
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite 바인딩 변수 개수 제한(구버전 999)보다 작게 IN 절 분할
+_SELECT_CHUNK = 900
+
+class EmbeddingCache:
+    """SHA-256(텍스트) 키 기반 영구 임베딩 캐시 (WAL 모드 SQLite)"""
+
+    def __init__(self, path: str, dim: int = 1024):
+        self.path = path
+        self.dim = dim
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 임베딩은 to_thread 워커 스레드에서 호출되므로 스레드 간 공유 + 락으로 직렬화
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb_cache (key BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+        logger.info(f"💾 임베딩 캐시 사용: {path}")
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def embed(self, texts: List[str], embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        캐시 히트는 저장된 벡터를, 미스만 embed_fn으로 임베딩하여 입력 순서대로 반환
+
+        Args:
+            texts: 임베딩할 텍스트 리스트
+            embed_fn: 미스 텍스트 리스트 → (n x dim) 임베딩 행렬
+        Returns:
+            (len(texts) x dim) float32 행렬
+        """
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out
+
+        keys = [self._key(text) for text in texts]
+
+        # 일괄 조회
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), _SELECT_CHUNK):
+                chunk = unique_keys[i:i + _SELECT_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, vec FROM emb_cache WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+
+        miss_idx = []
+        for i, key in enumerate(keys):
+            vec = found.get(key)
+            if vec is not None:
+                out[i] = np.frombuffer(vec, dtype=np.float16)
+            else:
+                miss_idx.append(i)
+
+        if miss_idx:
+            miss_embeddings = np.asarray(embed_fn([texts[i] for i in miss_idx]), dtype=np.float32)
+            out[miss_idx] = miss_embeddings
+
+            # float16으로 저장 (벡터당 2KB) - 일괄 INSERT
+            rows = [
+                (keys[i], embedding.astype(np.float16).tobytes())
+                for i, embedding in zip(miss_idx, miss_embeddings)
+            ]
+            with self._lock:
+                self._conn.executemany("INSERT OR REPLACE INTO emb_cache (key, vec) VALUES (?, ?)", rows)
+                self._conn.commit()
+
+        logger.info(f"💾 임베딩 캐시: {len(texts) - len(miss_idx)}개 히트, {len(miss_idx)}개 미스")
+        return out
+
+    def close(self):
+        """SQLite 연결 종료"""
+        with self._lock:
+            self._conn.close()
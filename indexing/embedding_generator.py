@@ -9,10 +9,14 @@ import os
 import subprocess
 import sys
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
+import threading
+from collections import OrderedDict
 import numpy as np
 
+import config
+
 logger = logging.getLogger(__name__)
 
 def download_model_automatically(model_path: str, model_name: str = "BAAI/bge-m3") -> bool:
@@ -70,6 +74,251 @@ def verify_model_files(model_path: str) -> bool:
     
     return True
 
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """행 단위 L2 정규화 - float32 행렬을 제자리에서 정규화하여 반환 (IP 메트릭 = 코사인)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not vectors.flags.writeable:
+        vectors = vectors.copy()
+    norms = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))[:, None]
+    np.maximum(norms, 1e-12, out=norms)
+    vectors /= norms
+    return vectors
+
+def resolve_embed_dtype(device: str) -> torch.dtype:
+    """
+    EMBED_DTYPE 환경변수에 따라 모델 연산 dtype 결정
+    
+    - auto (기본값): GPU에서 BF16 지원 시 bfloat16, 아니면 float16 / CPU는 float32
+    - float32 | float16 | bfloat16: 명시적 지정 (CPU는 항상 float32)
+    """
+    if device == 'cpu':
+        return torch.float32
+    
+    embed_dtype = config.EMBED_DTYPE
+    if embed_dtype == 'auto':
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    
+    dtypes = {'float32': torch.float32, 'float16': torch.float16, 'bfloat16': torch.bfloat16}
+    if embed_dtype not in dtypes:
+        raise ValueError(f"지원하지 않는 EMBED_DTYPE: {embed_dtype} (auto, float32, float16, bfloat16)")
+    return dtypes[embed_dtype]
+
+def _cpu_has_vnni() -> bool:
+    """CPU가 INT8 내적 가속 명령(AVX512-VNNI / AVX-VNNI)을 지원하는지 확인"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_vnni' in flags or 'avx_vnni' in flags
+
+def quantize_model_int8(model) -> None:
+    """
+    CPU 추론용 INT8 동적 양자화 - 트랜스포머의 nn.Linear 가중치를 qint8로 변환
+    
+    활성값은 실행 시점에 양자화되므로 별도 보정 데이터가 필요 없습니다.
+    """
+    if not torch.backends.mkldnn.is_available() or not _cpu_has_vnni():
+        print("⚠️ CPU에 oneDNN/VNNI 가속이 없음 - INT8 양자화 속도 이득이 제한적일 수 있음")
+    
+    transformer = model[0]
+    transformer.auto_model = torch.quantization.quantize_dynamic(
+        transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    print("✅ INT8 동적 양자화 적용 완료 (nn.Linear)")
+
+def compile_model(model, device: str, batch_sizes: List[int]) -> bool:
+    """
+    트랜스포머 본체를 torch.compile로 컴파일하고 워밍업합니다.
+    
+    컴파일은 첫 forward 시점에 일어나므로 대표 배치 크기로 미리 encode하여
+    그래프 캡처/커널 오토튜닝을 서비스 시작 시점에 끝냅니다.
+    실패하면 eager 모듈로 되돌리고 False를 반환합니다.
+    """
+    transformer = model[0]
+    eager_module = transformer.auto_model
+    # reduce-overhead의 cudagraph 트리는 스레드별인데 encode는 to_thread 워커에서 실행되므로 default 모드 사용
+    mode = 'default'
+    
+    try:
+        print(f"⚙️ torch.compile 적용 중 (mode={mode})...")
+        # dynamic=True: 길이순 배치마다 달라지는 시퀀스 길이에 대해 재컴파일 최소화
+        transformer.auto_model = torch.compile(eager_module, mode=mode, dynamic=True, fullgraph=False)
+        
+        with torch.inference_mode():
+            for batch_size in batch_sizes:
+                model.encode(["워밍업 문장 " * 8] * batch_size, batch_size=batch_size, show_progress_bar=False)
+        
+        print(f"✅ torch.compile 워밍업 완료 (배치: {batch_sizes})")
+        return True
+    except Exception as e:
+        transformer.auto_model = eager_module
+        print(f"⚠️ torch.compile 실패, eager 모드로 실행: {e}")
+        return False
+
+class SentenceTransformerWrapper:
+    """langchain 호환을 위한 SentenceTransformer 래퍼"""
+    
+    def __init__(self, model, device: str = 'cpu'):
+        self.model = model
+        self.device = device
+        self.pool = None  # encode_multi_process 워커 풀 (지연 생성)
+        
+        # model.max_seq_length 임시 변경 + encode 직렬화 (파이프라인 스레드와 단일 제품 API 스레드가 같은 모델 공유)
+        self._encode_lock = threading.Lock()
+        
+        # 텍스트 → 임베딩 LRU 캐시 (색상/재질 등 반복되는 청크의 재인코딩 방지)
+        self.cache_size = config.EMBED_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+    def embed_query(self, text: str) -> List[float]:
+        """단일 쿼리 임베딩"""
+        with self._encode_lock, torch.inference_mode():
+            embedding = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+        return embedding.tolist()
+        
+    def embed_documents(self, texts: List[str], batch_size: int = 64, max_length: Optional[int] = None) -> List[List[float]]:
+        """여러 문서 임베딩 (langchain 호환 - Python 리스트 반환)"""
+        return self.embed_documents_np(texts, batch_size=batch_size, max_length=max_length).tolist()
+    
+    def embed_documents_np(self, texts: List[str], batch_size: int = 64, max_length: Optional[int] = None) -> np.ndarray:
+        """
+        여러 문서 임베딩 - float32 ndarray 반환
+        
+        최근 임베딩한 텍스트는 LRU 캐시에서 바로 반환하고, 캐시 미스는
+        중복을 제거한 고유 텍스트만 한 번의 길이순 정렬 배치로 인코딩한 뒤
+        입력 순서대로 병합합니다.
+        
+        Args:
+            texts: 임베딩할 텍스트 리스트
+            batch_size: model.encode 미니배치 크기
+            max_length: 최대 토큰 길이 (None이면 모델 기본값)
+        """
+        dim = self.model.get_sentence_embedding_dimension()
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        
+        # 캐시 조회 - 히트는 바로 채우고 미스 위치만 모음
+        miss_idx = []
+        with self._cache_lock:
+            for i, text in enumerate(texts):
+                cached = self._cache.get((max_length, text))
+                if cached is not None:
+                    self._cache.move_to_end((max_length, text))
+                    out[i] = cached
+                else:
+                    miss_idx.append(i)
+        
+        if miss_idx:
+            # 배치 내 중복 텍스트 제거 (색상/재질 청크 등) - 고유 텍스트만 인코딩 후 역매핑
+            unique_pos = {}
+            inverse = [unique_pos.setdefault(texts[i], len(unique_pos)) for i in miss_idx]
+            miss_texts = list(unique_pos)
+            miss_embeddings = self._encode_sorted(miss_texts, batch_size, max_length)
+            out[miss_idx] = miss_embeddings[inverse]
+            
+            if self.cache_size > 0:
+                entries = [((max_length, text), embedding.copy()) for text, embedding in zip(miss_texts, miss_embeddings)]
+                with self._cache_lock:
+                    for key, embedding in entries:
+                        self._cache[key] = embedding
+                        self._cache.move_to_end(key)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        
+        return out
+    
+    def _encode_sorted(self, texts: List[str], batch_size: int, max_length: Optional[int]) -> np.ndarray:
+        """
+        길이순 정렬 배치 (smart batching) 인코딩
+        
+        미니배치마다 가장 긴 시퀀스 길이로 패딩되므로 길이가 비슷한 텍스트끼리
+        묶어 인코딩한 뒤 원래 순서로 되돌립니다.
+        """
+        # 문자 길이를 토큰 길이의 근사치로 사용 (추가 토크나이징 비용 없음)
+        order = np.argsort([len(t) for t in texts], kind='stable')
+        sorted_texts = [texts[i] for i in order]
+        
+        # 최대 길이 변경~복원 구간을 락으로 보호 - 동시 호출이 다른 호출의 길이로 인코딩/복원하지 않도록
+        with self._encode_lock:
+            original_max_length = self.model.max_seq_length
+            if max_length is not None:
+                self.model.max_seq_length = max_length
+            try:
+                # inference_mode: autograd 그래프/버전 카운터 추적 없이 실행 (no_grad보다 가벼움)
+                with torch.inference_mode():
+                    embeddings = self.model.encode(
+                        sorted_texts,
+                        batch_size=batch_size,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,
+                        show_progress_bar=False
+                    )
+            finally:
+                self.model.max_seq_length = original_max_length
+        
+        # 원래 입력 순서로 복원
+        out = np.empty(embeddings.shape, dtype=np.float32)
+        out[order] = embeddings
+        return out
+
+    def auto_batch_size(self, min_batch: int = 16, max_batch: int = 512) -> int:
+        """
+        GPU 여유 메모리 기준 encode 배치 크기 추정
+        
+        batch * seq_len * hidden * dtype 바이트가 여유 메모리의 60%를 넘지 않도록 선택.
+        CPU는 설정된 INDEX_BATCH_SIZE 사용.
+        """
+        if self.device == 'cpu' or not torch.cuda.is_available():
+            return config.BATCH_SIZE
+        
+        free_bytes, _ = torch.cuda.mem_get_info()
+        auto_model = self.model[0].auto_model
+        hidden = auto_model.config.hidden_size
+        dtype_bytes = next(auto_model.parameters()).element_size()
+        with self._encode_lock:
+            max_seq_length = self.model.max_seq_length
+        per_sample = max_seq_length * hidden * dtype_bytes
+        return int(min(max_batch, max(min_batch, (0.6 * free_bytes) // per_sample)))
+
+    @property
+    def supports_multi_process(self) -> bool:
+        """멀티 프로세스 인코딩이 이득인 환경인지 (GPU 2개 이상 또는 CPU 모드)"""
+        if self.device == 'cpu':
+            return (os.cpu_count() or 1) > 1
+        return torch.cuda.device_count() > 1
+    
+    def _multi_process_devices(self) -> List[str]:
+        """워커 프로세스별 대상 디바이스 목록"""
+        if self.device != 'cpu' and torch.cuda.device_count() > 1:
+            return [f'cuda:{i}' for i in range(torch.cuda.device_count())]
+        return ['cpu'] * max(1, (os.cpu_count() or 2) // 2)
+    
+    def embed_documents_mp(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """
+        여러 문서 임베딩 - 멀티 프로세스/멀티 GPU 분산 (float32 ndarray 반환)
+        
+        워커 풀은 첫 호출 시 생성되어 close() 호출 전까지 재사용됩니다.
+        """
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        if self.pool is None:
+            target_devices = self._multi_process_devices()
+            logger.info(f"멀티 프로세스 인코딩 풀 시작: {target_devices}")
+            self.pool = self.model.start_multi_process_pool(target_devices=target_devices)
+        
+        embeddings = self.model.encode_multi_process(texts, self.pool, batch_size=batch_size)
+        
+        # encode_multi_process는 정규화 옵션이 없으므로 직접 L2 정규화
+        return l2_normalize(embeddings)
+    
+    def close(self):
+        """멀티 프로세스 워커 풀 종료"""
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
 def get_bge_m3_model():
     """
     BGE-M3 임베딩 모델을 로드합니다.
@@ -78,10 +327,10 @@ def get_bge_m3_model():
     """
     
     # USE_CUDA 환경변수 확인
-    use_cuda = os.environ['USE_CUDA'].lower() == 'true'
+    use_cuda = config.USE_CUDA
     
     # 로컬 모델 경로 설정
-    local_model_path = "/app/models/bge-m3"
+    local_model_path = config.MODEL_PATH
     huggingface_model_name = 'BAAI/bge-m3'
     
     # 로컬 모델 존재 여부 확인
@@ -118,6 +367,15 @@ def get_bge_m3_model():
         device = 'cpu'
     
     print(f"🔧 임베딩 모델 디바이스: {device}")
+    
+    # 인덱싱 프로세스는 추론만 수행 - 그래디언트 추적 비활성화
+    # (set_grad_enabled는 스레드 로컬이므로 워커 스레드는 래퍼의 inference_mode로 보장)
+    torch.set_grad_enabled(False)
+    if device == 'cuda':
+        # FP32 연산이 남는 경우 TF32 텐서코어 사용 허용
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.set_float32_matmul_precision('high')
+    
     print(f"📁 모델 소스: {'로컬 파일' if model_name == local_model_path else 'HuggingFace Hub'}")
     
     model_kwargs = {'device': device}
@@ -129,32 +387,43 @@ def get_bge_m3_model():
         # sentence-transformers를 직접 사용
         model = SentenceTransformer(model_name, device=device)
         
+        # Rust 기반 fast tokenizer 강제 (느린 Python 토크나이저 폴백 방지)
+        if not getattr(model.tokenizer, 'is_fast', False):
+            from transformers import AutoTokenizer
+            print("🔧 fast tokenizer로 교체 중...")
+            model.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        
+        # GPU에서는 FP16/BF16으로 변환하여 처리량 향상 및 메모리 절감
+        model_dtype = resolve_embed_dtype(device)
+        if model_dtype != torch.float32:
+            model = model.to(dtype=model_dtype)
+        
+        # 추론 전용으로 고정 - dropout 비활성화 및 파라미터 그래디언트 해제
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+        
+        # CPU는 메모리 대역폭 병목 - Linear 레이어를 INT8로 양자화
+        if device == 'cpu' and config.QUANTIZE:
+            quantize_model_int8(model)
+        
+        # 고정된 추론 그래프를 컴파일 (실패 시 eager 폴백)
+        if config.EMBED_COMPILE:
+            compile_model(model, device, batch_sizes=[1, 32, config.BATCH_SIZE])
+        
         # 로딩 성공 후 간단한 테스트
         print(f"🧪 모델 테스트 중...")
-        test_embedding = model.encode("test", convert_to_numpy=True)
+        with torch.inference_mode():
+            test_embedding = model.encode("test", convert_to_numpy=True)
         embedding_dim = len(test_embedding)
         
         print(f"✅ 임베딩 모델 로딩 완료!")
         print(f"   📏 임베딩 차원: {embedding_dim}")
         print(f"   🎯 디바이스: {device}")
+        print(f"   🔢 모델 dtype: {model_dtype} (출력 dtype: {test_embedding.dtype})")
         print(f"   📁 모델 경로: {model_name}")
         
-        # langchain 호환을 위한 래퍼 클래스
-        class SentenceTransformerWrapper:
-            def __init__(self, model):
-                self.model = model
-                
-            def embed_query(self, text: str) -> List[float]:
-                """단일 쿼리 임베딩"""
-                embedding = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
-                return embedding.tolist()
-                
-            def embed_documents(self, texts: List[str]) -> List[List[float]]:
-                """여러 문서 임베딩"""
-                embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-                return embeddings.tolist()
-        
-        return SentenceTransformerWrapper(model)
+        return SentenceTransformerWrapper(model, device)
         
     except Exception as e:
         error_msg = f"❌ 임베딩 모델 로딩 실패: {e}\n"
@@ -7,32 +7,74 @@ UNCOMMON 제품 인덱싱 서비스 - BGE-M3 임베딩 모델과 Milvus 벡터 
 목적: PostgreSQL의 제품 데이터를 검색 가능한 벡터로 변환하여 RAG 시스템의 검색 성능 최적화
 """
 
-import os
 import json
+import re  # JSONB 텍스트 정리 (HTML 태그/공백)
+import asyncio  # 블로킹 작업을 스레드로 오프로딩
 import logging  # 인덱싱 작업 상세 로깅
+import multiprocessing  # 청킹 프로세스 풀 (spawn 컨텍스트)
+import os
+import time  # 카운트 캐시 TTL
+from concurrent.futures import ProcessPoolExecutor  # GIL 밖에서 청킹
 from datetime import datetime
-from typing import List, Dict, Any
+from itertools import islice  # 스트리밍 커서에서 고정 크기 배치 추출
+from typing import List, Dict, Any, Tuple, Callable
+import numpy as np  # 배치 임베딩 행렬 분할
+import orjson  # JSONB 필드 직렬화 (C 구현, 유효한 JSON 출력)
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi.responses import Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST  # /metrics 노출
 from pydantic import BaseModel  # API 요청/응답 모델 정의
-from sqlalchemy.orm import Session  # PostgreSQL ORM 세션
+import io
+from sqlalchemy import update, text  # 벌크 상태 업데이트
+from sqlalchemy.orm import Session, selectinload, load_only  # PostgreSQL ORM 세션, 관계 일괄 로딩, 컬럼 제한
 from langchain_core.documents import Document  # LangChain 문서 형태로 변환
-from dotenv import load_dotenv  # 환경변수 로드
 
 # 프로젝트 핵심 모듈 임포트 - 각각 특화된 벡터화 기능 담당
-from database import get_db, init_db, Product, ProductImage  # DB 연결 및 제품 모델
-from text_chunker import ProductTextChunker, ProductChunk  # 제품 특화 텍스트 청킹
+import config  # 환경변수 설정 (import 시 한 번만 로드)
+from database import get_db, init_db, SessionLocal, Product, ProductImage  # DB 연결 및 제품 모델
+from text_chunker import ProductTextChunker, ProductChunk, chunk_products  # 제품 특화 텍스트 청킹
 from embedding_generator import get_bge_m3_model  # BGE-M3 임베딩 모델 로더
+from tei_client import TEIEmbeddings  # TEI 서버 임베딩 클라이언트 (TEI_URL 설정 시)
 from milvus_client import ProductMilvusVectorStore  # Milvus 벡터 저장소
-
-# 환경변수 및 서비스 초기화 설정
-# .env.global에서 Milvus, BGE-M3 모델 관련 설정 로드
-load_dotenv('../.env.global')  # 프로젝트 전역 환경변수
-load_dotenv()  # 로컬 환경변수 (우선순위 높음)
+from metrics import STAGE, BatchSizeTuner  # 단계별 소요 시간 메트릭, 배치 크기 자동 조정
 
 # 인덱싱 작업 상세 로깅 설정 - 벡터화 과정 추적용
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 임베딩 배치 크기 - 여러 제품의 청크를 모아 한 번의 model.encode로 처리 (시작값, 실행 중 자동 조정)
+INDEX_BATCH_SIZE = config.BATCH_SIZE
+
+# 배치 크기 자동 조정 비교 구간 - 임베딩 호출 수
+EMBED_AUTOTUNE_WINDOW = 500
+
+# 청킹 프로세스 풀 크기 - CPU 코어 수
+CHUNKER_WORKERS = os.cpu_count() or 1
+
+# 한 배치의 텍스트 수가 이 값을 넘으면 멀티 프로세스/멀티 GPU 인코딩 사용
+MULTI_PROCESS_THRESHOLD = config.MULTI_PROCESS_THRESHOLD
+
+# 이 개수 이상의 제품 상태를 갱신할 때는 COPY 기반 임시 테이블 경로 사용
+COPY_UPDATE_THRESHOLD = 10000
+
+# 서버 사이드 커서로 한 번에 가져올 제품 수 - 전체 카탈로그를 메모리에 올리지 않음
+PRODUCT_FETCH_SIZE = 500
+
+# 파이프라인 단계 간 큐 크기 - 대기 배치 수 상한 (메모리 백프레셔)
+PIPELINE_QUEUE_SIZE = 4
+
+# Milvus insert 한 번에 모을 최소 벡터 수 - 여러 제품을 묶어 RPC 횟수 절감
+MILVUS_INSERT_BATCH = config.MILVUS_INSERT_BATCH
+
+# 동시에 진행할 Milvus insert 수 상한
+MILVUS_INSERT_CONCURRENCY = 4
+
+# 전체 재인덱싱 대상이 이 제품 수 이상이면 bulk_insert 경로 사용 (MILVUS_BULK_DIR 설정 시)
+BULK_INSERT_THRESHOLD = config.BULK_INSERT_THRESHOLD
+
+# /index/products 카운트 캐시 유지 시간(초) - UI 폴링 시 매번 COUNT(*) 실행 방지
+COUNT_CACHE_TTL = 10.0
+
 # FastAPI 애플리케이션 초기화 - 벡터 인덱싱 전용 API 서비스
 app = FastAPI(
     title="UNCOMMON Indexing Service",
@@ -44,6 +86,8 @@ app = FastAPI(
 embedding_model = None  # BGE-M3 임베딩 모델 (BAAI/bge-m3)
 vector_store = None  # Milvus 벡터 스토어 클라이언트
 chunker = None  # 제품 텍스트 청킹 모듈
+batch_tuner = None  # 임베딩 배치 크기 자동 조정기
+chunker_pool = None  # 청킹 프로세스 풀 (CPU 코어 수)
 
 # API 요청/응답 데이터 모델 - 클라이언트와 서버 간 인덱싱 작업 파라미터 정의
 # IndexRequest: 인덱싱 옵션 설정 (전체/부분, 강제 재인덱싱)
@@ -58,6 +102,7 @@ class IndexResponse(BaseModel):
     total_products: int  # 처리 대상 제품 총 개수
     indexed_count: int  # 성공적으로 인덱싱된 제품 수
     errors: List[str] = []  # 인덱싱 실패 시 오류 메시지 목록
+    stale_seconds: float = 0.0  # total_products 캐시 경과 시간 (0이면 방금 계산)
 
 class StatsResponse(BaseModel):
     total_products: int  # PostgreSQL 전체 제품 수
@@ -67,6 +112,77 @@ class StatsResponse(BaseModel):
 
 # Admin authentication removed for MVP
 
+# 빈 JSONB 값의 직렬화 결과 (비교용 센티널)
+EMPTY_JSON = orjson.dumps({})
+
+def _jsonb_text(value: Any) -> str:
+    """JSONB 값을 검색용 텍스트로 직렬화 - 비어 있으면 빈 문자열"""
+    if not value:
+        return ''
+    serialized = orjson.dumps(value)
+    return '' if serialized == EMPTY_JSON else serialized.decode()
+
+def _plain_text(value: Any) -> str:
+    """Text 컬럼 값 그대로 사용 - None이면 빈 문자열"""
+    return value or ''
+
+# JSONB 값 정리용 정규식 (모듈 로드 시 1회 컴파일)
+_TAG = re.compile(r"<[^>]+>")
+_WS = re.compile(r"\s+")
+
+def _walk(value: Any):
+    """dict/list를 재귀 순회하며 말단 값 반환"""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _walk(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk(item)
+    elif value is not None:
+        yield value
+
+def _flatten(value: Any) -> str:
+    """
+    다국어 JSONB 값을 검색용 텍스트로 평탄화 - 말단 값의 HTML 태그/중복 공백 제거 후 " / "로 결합
+    
+    {"en": "", "ko": ""}처럼 값이 모두 빈 dict는 빈 문자열이 되어 임베딩 텍스트에서 제외됨
+    """
+    parts = []
+    for leaf in _walk(value):
+        text = _WS.sub(' ', _TAG.sub(' ', leaf if isinstance(leaf, str) else str(leaf))).strip()
+        if text:
+            parts.append(text)
+    return ' / '.join(parts)
+
+# 검색용 통합 설명 텍스트 구성 필드 - (컬럼명, 접두어, 텍스트 변환 함수), 순서대로 결합
+# 색상: "빨간 안경" / 설명: 영문·한글 상세 / 재질: "아세테이트 안경" / 사이즈: "큰 프레임" / 리워드: 혜택 검색
+DESCRIPTION_FIELDS = (
+    ('color', '색상: ', _plain_text),  # Text 컬럼
+    ('description', '설명: ', _flatten),  # 이하 다국어 JSONB
+    ('material', '재질: ', _flatten),
+    ('size', '사이즈: ', _flatten),
+    ('reward_points', '리워드 포인트: ', _flatten),
+)
+
+def _attach_images(product_data: Dict[str, Any], product: Product, images: List[ProductImage]) -> Dict[str, Any]:
+    """제품 데이터에 이미지 메타데이터 추가"""
+    # 제품 이미지 메타데이터 구성 - 멀티모달 검색 지원용
+    # 이미지 바이너리는 PostgreSQL에 저장, 메타데이터만 벡터화
+    if images:
+        product_data['images'] = []
+        for idx, img in enumerate(images):
+            # 각 이미지의 검색 가능한 메타데이터 생성
+            image_info = {
+                'image_id': img.id,  # 이미지 DB 고유 ID
+                'image_order': img.image_order or idx,  # 이미지 표시 순서
+                'size_bytes': img.size_bytes or 0,  # 이미지 크기 (DB에서 octet_length로 계산)
+                'alt_text': f"제품 이미지 {idx + 1}",  # 대체 텍스트
+                'context': f"제품 {product.product_name}의 {idx + 1}번째 이미지"  # 검색 컨텍스트
+            }
+            product_data['images'].append(image_info)
+    
+    return product_data
+
 # 제품 데이터 전처리 함수 - PostgreSQL 제품 데이터를 벡터화에 최적화된 형태로 변환
 # 목적: DB의 정규화된 데이터를 검색용 텍스트로 통합, 다국어 정보 병합
 # 관련 함수: ProductTextChunker.chunk_product_data (청킹 처리)
@@ -80,152 +196,360 @@ def prepare_product_data(product: Product, images: List[ProductImage]) -> Dict[s
         'id': product.id,  # 제품 고유 식별자
         'name': product.product_name,  # 제품명 (주 검색 대상)
         'url': product.source_global_url or product.source_kr_url,  # 제품 페이지 링크
-        'price': str(product.price) if product.price else '',  # 가격 정보
+        'price': _jsonb_text(product.price),  # 가격 정보
         'brand': 'UNCOMMON',  # 브랜드명 (고정값)
         'category': 'eyewear'  # 제품 카테고리 (안경)
     }
     
     # 제품의 모든 속성 정보를 검색 가능한 텍스트로 통합
-    # PostgreSQL JSONB 필드들을 파싱하여 자연어 형태로 변환
-    description_parts = []
-    
-    # 색상 정보 추가 - 사용자가 "빨간 안경" 등으로 검색 시 매칭
-    if product.color:
-        description_parts.append(f"색상: {product.color}")
-    
-    # 제품 상세 설명 (JSONB) - 영문/한글 버전 모두 포함
-    if product.description:
-        desc_str = str(product.description)
-        if desc_str and desc_str != '{}':
-            description_parts.append(f"설명: {desc_str}")
-    
-    # 재질/소재 정보 (JSONB) - "아세테이트 안경" 등 재질 기반 검색 지원
-    if product.material:
-        material_str = str(product.material)
-        if material_str and material_str != '{}':
-            description_parts.append(f"재질: {material_str}")
-    
-    # 사이즈 정보 (JSONB) - "큰 안경", "작은 프레임" 등 크기 관련 검색
-    if product.size:
-        size_str = str(product.size)
-        if size_str and size_str != '{}':
-            description_parts.append(f"사이즈: {size_str}")
-    
-    # 리워드 포인트 정보 - 혜택 관련 검색 시 활용
-    if product.reward_points:
-        points_str = str(product.reward_points)
-        if points_str and points_str != '{}':
-            description_parts.append(f"리워드 포인트: {points_str}")
-    
-    # 모든 제품 속성을 하나의 검색 가능한 텍스트로 통합
-    product_data['description'] = " | ".join(description_parts) if description_parts else ""
+    # 스크래퍼가 저장 시 만든 searchable_text를 그대로 사용 (JSONB 직렬화 생략)
+    if product.searchable_text is not None:
+        product_data['description'] = product.searchable_text
+        return _attach_images(product_data, product, images)
     
-    # 제품 이미지 메타데이터 구성 - 멀티모달 검색 지원용
-    # 이미지 바이너리는 PostgreSQL에 저장, 메타데이터만 벡터화
-    if images:
-        product_data['images'] = []
-        for idx, img in enumerate(images):
-            # 각 이미지의 검색 가능한 메타데이터 생성
-            image_info = {
-                'image_id': img.id,  # 이미지 DB 고유 ID
-                'image_order': img.image_order or idx,  # 이미지 표시 순서
-                'size_bytes': len(img.image_data) if img.image_data else 0,  # 이미지 크기
-                'alt_text': f"제품 이미지 {idx + 1}",  # 대체 텍스트
-                'context': f"제품 {product.product_name}의 {idx + 1}번째 이미지"  # 검색 컨텍스트
-            }
-            product_data['images'].append(image_info)
+    # 폴백: searchable_text가 없는 행은 DESCRIPTION_FIELDS 순서로 직접 조합
+    # 비어 있는 필드는 변환 결과가 빈 문자열이므로 제외
+    product_data['description'] = " | ".join([
+        prefix + value
+        for attr, prefix, to_text in DESCRIPTION_FIELDS
+        if (value := to_text(getattr(product, attr)))
+    ])
     
-    return product_data
+    return _attach_images(product_data, product, images)
+
+# 제품 수 캐시 - 키별 (계산 시각, 값) 저장
+_count_cache: Dict[str, Tuple[float, int]] = {}
+
+def cached_count(key: str, compute: Callable[[], int]) -> Tuple[int, float]:
+    """TTL 내에는 캐시된 카운트를 반환, (값, 경과 초) 튜플"""
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached is not None and now - cached[0] < COUNT_CACHE_TTL:
+        return cached[1], round(now - cached[0], 3)
+    
+    value = compute()
+    _count_cache[key] = (now, value)
+    return value, 0.0
+
+def approx_product_count(db: Session) -> int:
+    """pg_class 통계 기반 전체 제품 수 근사치 (ANALYZE 전이면 정확한 COUNT로 대체)"""
+    estimate = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'products'")
+    ).scalar()
+    if estimate is None or estimate <= 0:
+        return db.query(Product).count()
+    return int(estimate)
+
+# 인덱싱 상태 벌크 업데이트 함수 - 제품별 UPDATE + commit 대신 단일 쿼리로 처리
+# 목적: N번의 왕복/fsync를 1번으로 줄임, 대량 재인덱싱 시 COPY + 조인 UPDATE 사용
+def mark_products_indexed(db: Session, product_ids: List[int]) -> None:
+    """주어진 제품들을 indexed=True로 한 번에 갱신 (커밋은 호출자의 트랜잭션에서)"""
+    if not product_ids:
+        return
+    
+    indexed_at = datetime.utcnow()
+    if len(product_ids) < COPY_UPDATE_THRESHOLD:
+        db.execute(
+            update(Product)
+            .where(Product.id.in_(product_ids))
+            .values(indexed=True, indexed_at=indexed_at)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        # 임시 테이블에 COPY로 ID 적재 후 조인 UPDATE
+        db.execute(text("CREATE TEMP TABLE tmp_indexed_ids (id INTEGER PRIMARY KEY) ON COMMIT DROP"))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_from(io.StringIO("\n".join(map(str, product_ids))), 'tmp_indexed_ids', columns=('id',))
+        finally:
+            cursor.close()
+        db.execute(
+            text("UPDATE products SET indexed = true, indexed_at = :indexed_at "
+                 "FROM tmp_indexed_ids WHERE products.id = tmp_indexed_ids.id"),
+            {"indexed_at": indexed_at}
+        )
+
+def _chunks_to_documents(chunks: List[ProductChunk]) -> List[Document]:
+    """청크 리스트를 LangChain Document 리스트로 변환"""
+    return [Document(page_content=chunk.page_content, metadata=chunk.metadata) for chunk in chunks]
+
+# 배치 임베딩 함수 - 여러 제품의 청크를 한 번에 임베딩하고 제품별 행렬로 분할
+# 목적: 제품 단위의 작은 encode 호출 N번 대신 큰 배치 1번으로 GPU/CPU 효율 극대화
+# 입력: (제품, 청크 리스트) 튜플 목록
+# 출력: (제품, 청크 리스트, 임베딩 행렬) 튜플 목록
+def embed_batch(pending: List[Tuple[Product, List[ProductChunk]]]) -> List[Tuple[Product, List[ProductChunk], np.ndarray]]:
+    """누적된 제품 청크를 단일 encode 호출로 임베딩"""
+    if not pending:
+        return []
+    
+    all_texts = [chunk.page_content for _, chunks in pending for chunk in chunks]
+    logger.info(f"🧮 배치 임베딩: {len(pending)}개 제품, {len(all_texts)}개 청크")
+    
+    # 영구 캐시 미스만 모델로 임베딩 - 배치 크기는 측정 기반 자동 조정값
+    batch_size = batch_tuner.batch_size
+    if len(all_texts) > MULTI_PROCESS_THRESHOLD and embedding_model.supports_multi_process:
+        embed_fn = lambda texts: embedding_model.embed_documents_mp(texts, batch_size=batch_size)
+    else:
+        embed_fn = lambda texts: embedding_model.embed_documents_np(texts, batch_size=batch_size)
+    started = time.perf_counter()
+    with STAGE.labels("embed").time():
+        embeddings = vector_store.embed_with_cache(all_texts, embed_fn)
+    batch_tuner.record(time.perf_counter() - started, len(all_texts))
+    
+    # 제품별 청크 수 기준으로 임베딩 행렬 분할
+    offsets = np.cumsum([len(chunks) for _, chunks in pending])[:-1]
+    per_product_embeddings = np.split(embeddings, offsets)
+    return [(product, chunks, product_embeddings)
+            for (product, chunks), product_embeddings in zip(pending, per_product_embeddings)]
+
+# 배치 저장 함수 - 임베딩이 끝난 여러 제품을 한 번의 Milvus insert로 저장
+# 목적: 제품별 insert RPC N번을 1번으로 줄임, 실패 시에만 제품별 insert로 오류 격리
+# 입력: (제품, 청크 리스트, 임베딩 행렬) 튜플 목록
+# 출력: 저장 성공 제품 ID 목록, 오류 메시지 목록
+def insert_batch(embedded: List[Tuple[Product, List[ProductChunk], np.ndarray]], bulk: bool = False) -> Tuple[List[int], List[str]]:
+    """임베딩된 제품 청크를 Milvus에 저장 (DB 상태 갱신은 commit_indexed에서)"""
+    if not embedded:
+        return [], []
+    
+    errors = []
+    try:
+        documents = [doc for _, chunks, _ in embedded for doc in _chunks_to_documents(chunks)]
+        embeddings = np.concatenate([emb for _, _, emb in embedded])
+        if bulk:
+            # 콜드 재인덱싱 - WAL을 거치지 않는 bulk_insert
+            vector_store.bulk_add(documents, embeddings)
+        else:
+            vector_store.add_documents_with_embeddings(documents, embeddings)
+        logger.info(f"  ✅ {len(embedded)}개 제품: {len(documents)}개 문서 Milvus 저장 완료")
+        indexed_ids = [product.id for product, _, _ in embedded]
+    except Exception as e:
+        # 일괄 저장 실패 시 제품별로 재시도하여 실패 제품만 격리
+        logger.warning(f"  ⚠️ 일괄 저장 실패, 제품별 재시도: {e}")
+        indexed_ids = []
+        for product, chunks, product_embeddings in embedded:
+            try:
+                vector_store.add_documents_with_embeddings(_chunks_to_documents(chunks), product_embeddings)
+                indexed_ids.append(product.id)
+            except Exception as e:
+                error_msg = f"제품 {product.id} 인덱싱 실패: {str(e)}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+    
+    return indexed_ids, errors
+
+def commit_indexed(db: Session, product_ids: List[int]) -> None:
+    """Milvus 저장이 끝난 제품 상태 갱신 - 배치당 트랜잭션 1개 (커밋 1회)"""
+    if not product_ids:
+        return
+    with db.begin():
+        # 실패해도 다음 실행에서 재인덱싱될 뿐이므로 이 트랜잭션만 WAL flush 대기 없이 커밋
+        db.execute(text("SET LOCAL synchronous_commit = off"))
+        mark_products_indexed(db, product_ids)
 
 async def process_products_indexing(product_ids: List[int] = None, force_reindex: bool = False):
-    """제품 인덱싱 백그라운드 작업"""
-    db = next(get_db())
+    """
+    제품 인덱싱 백그라운드 작업 - 조회/청킹 → 임베딩 → Milvus 저장 3단계 파이프라인
+    
+    각 단계는 크기 제한 큐(PIPELINE_QUEUE_SIZE)로 연결된 별도 태스크로 동시에 실행되어
+    임베딩 중에도 다음 제품 조회와 이전 배치의 Milvus 저장이 진행됩니다.
+    블로킹 작업(DB 조회, encode, insert)은 asyncio.to_thread로 실행하여
+    이벤트 루프(/index/stats 등)가 막히지 않도록 함
+    
+    제품은 서버 사이드 커서로 PRODUCT_FETCH_SIZE개씩 스트리밍하며,
+    상태 업데이트 커밋이 커서를 무효화하지 않도록 조회용 세션을 분리함
+    쓰기 세션은 작업 전체에서 하나를 재사용하고 insert 배치마다 트랜잭션 1개로 커밋 (commit_indexed)
+    """
+    db = SessionLocal()  # 상태 업데이트 전용 세션 (배치별 db.begin())
+    read_db = SessionLocal()  # 스트리밍 조회 전용 세션 (커밋하지 않음)
     errors = []
     indexed_count = 0
     
-    try:
-        # 처리할 제품 선택
-        query = db.query(Product)
+    # 단계 간 큐 - 가득 차면 앞 단계가 대기 (메모리 상한)
+    to_embed: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    to_insert: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    
+    async def produce():
+        """A: 제품 스트리밍 + 청킹 → 임베딩 배치 크기(batch_tuner) 청크 단위로 to_embed에 전달"""
+        # 처리할 제품 선택 - 이미지는 selectinload로 일괄 조회 (N+1 쿼리 방지)
+        # 필요한 컬럼만 조회 - JSONB 원본은 searchable_text가 없는 행의 폴백에서만 지연 로드
+        query = read_db.query(Product).options(
+            load_only(
+                Product.id, Product.product_name, Product.source_global_url,
+                Product.source_kr_url, Product.price, Product.searchable_text
+            ),
+            selectinload(Product.images)
+        )
         
         if product_ids:
             query = query.filter(Product.id.in_(product_ids))
         elif not force_reindex:
             query = query.filter(Product.indexed == False)
-            
-        products = query.all()
         
-        logger.info(f"🚀 {len(products)}개 제품 인덱싱 시작")
+        # iter() 시점에 SELECT가 실행되므로 커서 오픈도 스레드에서 수행
+        product_stream = await asyncio.to_thread(
+            iter, query.execution_options(stream_results=True).yield_per(PRODUCT_FETCH_SIZE)
+        )
         
-        # 제품별 처리
-        for product in products:
-            try:
-                logger.info(f"📦 제품 {product.id} ({product.product_name}) 처리 중...")
-                
-                # 이미지 정보 조회
-                images = db.query(ProductImage).filter(ProductImage.product_id == product.id).all()
-                
-                # 제품 데이터 준비
-                product_data = prepare_product_data(product, images)
+        pending = []
+        pending_texts = 0
+        while True:
+            # 다음 제품 묶음을 스레드에서 fetch (이미지 selectin 쿼리 포함)
+            with STAGE.labels("fetch").time():
+                products = await asyncio.to_thread(list, islice(product_stream, PRODUCT_FETCH_SIZE))
+            if not products:
+                break
+            
+            # 제품 데이터 준비는 ORM 객체가 필요하므로 이 프로세스에서 (이미지는 selectinload로 미리 로드됨)
+            prepared = []
+            for product in products:
+                try:
+                    prepared.append((product, prepare_product_data(product, product.images)))
+                except Exception as e:
+                    error_msg = f"제품 {product.id} 인덱싱 실패: {str(e)}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+            
+            # 청킹은 프로세스 풀에서 병렬 실행 (순수 Python 문자열 처리 - GIL 회피)
+            # 워커 수만큼 묶어 보내 제품별 IPC 왕복을 줄임
+            loop = asyncio.get_running_loop()
+            datas = [product_data for _, product_data in prepared]
+            step = max(1, -(-len(datas) // CHUNKER_WORKERS))
+            with STAGE.labels("chunk").time():
+                chunk_groups = await asyncio.gather(*[
+                    loop.run_in_executor(chunker_pool, chunk_products, chunker, datas[i:i + step])
+                    for i in range(0, len(datas), step)
+                ])
+            chunks_list = [chunks for group in chunk_groups for chunks in group]
+            
+            for (product, _), chunks in zip(prepared, chunks_list):
+                logger.debug("📦 제품 %s (%s) 처리 중...", product.id, product.product_name)
                 
-                # 청킹
-                chunks = chunker.chunk_product_data(product_data)
-                logger.info(f"  📄 {len(chunks)}개 청크 생성")
+                if isinstance(chunks, Exception):
+                    error_msg = f"제품 {product.id} 인덱싱 실패: {str(chunks)}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+                    continue
+                logger.debug("  📄 %s개 청크 생성", len(chunks))
                 
-                # 청킹 결과 상세 출력
-                for i, chunk in enumerate(chunks, 1):
-                    logger.info(f"  🔵 청크 {i}/{len(chunks)}:")
-                    logger.info(f"     📝 내용: {chunk.page_content[:200]}...")
-                    logger.info(f"     🏷️  메타데이터: {chunk.metadata}")
+                # 청킹 결과 상세 출력 (DEBUG 레벨에서만 - 청크 수 x 제품 수만큼 문자열 생성 방지)
+                if logger.isEnabledFor(logging.DEBUG):
+                    for i, chunk in enumerate(chunks, 1):
+                        logger.debug("  🔵 청크 %s/%s:", i, len(chunks))
+                        logger.debug("     📝 내용: %s...", chunk.page_content[:200])
+                        logger.debug("     🏷️  메타데이터: %s", chunk.metadata)
                 
                 if not chunks:
                     logger.warning(f"  ⚠️ 제품 {product.id}: 청크가 생성되지 않음")
                     continue
                 
-                # LangChain Document 변환
-                documents = []
-                for chunk in chunks:
-                    doc = Document(
-                        page_content=chunk.page_content,
-                        metadata=chunk.metadata
-                    )
-                    documents.append(doc)
-                
-                # Milvus에 저장
-                if documents:
-                    vector_store.add_documents(documents)
-                    logger.info(f"  ✅ 제품 {product.id}: {len(documents)}개 문서 Milvus 저장 완료")
-                    
-                    # 상태 업데이트
-                    product.indexed = True
-                    product.indexed_at = datetime.utcnow()
-                    db.commit()
-                    
-                    indexed_count += 1
-                else:
-                    logger.warning(f"  ⚠️ 제품 {product.id}: 문서가 생성되지 않음")
+                pending.append((product, chunks))
+                pending_texts += len(chunks)
                 
-            except Exception as e:
-                error_msg = f"제품 {product.id} 인덱싱 실패: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-                continue
+                # 배치 크기에 도달하면 임베딩 단계로 전달
+                if pending_texts >= batch_tuner.batch_size:
+                    await to_embed.put(pending)
+                    pending = []
+                    pending_texts = 0
+        
+        # 남은 제품 전달 후 종료 신호
+        if pending:
+            await to_embed.put(pending)
+        await to_embed.put(None)
+    
+    async def embed():
+        """B: 배치 임베딩 → to_insert에 전달"""
+        while True:
+            pending = await to_embed.get()
+            if pending is None:
+                await to_insert.put(None)
+                return
+            await to_insert.put(await asyncio.to_thread(embed_batch, pending))
+    
+    # 동시 Milvus insert 수 제한 ("task queue is full" 방지), 쓰기 세션은 락으로 직렬화
+    insert_slots = asyncio.Semaphore(MILVUS_INSERT_CONCURRENCY)
+    db_lock = asyncio.Lock()
+    
+    async def store(buffered):
+        """insert 1건 - 슬롯은 호출 전에 확보되어 있으며 종료 시 반환"""
+        nonlocal indexed_count
+        try:
+            with STAGE.labels("milvus_insert").time():
+                indexed_ids, batch_errors = await asyncio.to_thread(insert_batch, buffered, use_bulk)
+            async with db_lock:
+                with STAGE.labels("db_commit").time():
+                    await asyncio.to_thread(commit_indexed, db, indexed_ids)
+            indexed_count += len(indexed_ids)
+            errors.extend(batch_errors)
+        finally:
+            insert_slots.release()
+    
+    async def insert():
+        """C: MILVUS_INSERT_BATCH 벡터 단위로 모아 최대 MILVUS_INSERT_CONCURRENCY개 동시 저장"""
+        inflight = []
+        buffered = []
+        buffered_vectors = 0
+        while True:
+            embedded = await to_insert.get()
+            if embedded is not None:
+                buffered.extend(embedded)
+                buffered_vectors += sum(len(chunks) for _, chunks, _ in embedded)
+                if buffered_vectors < MILVUS_INSERT_BATCH:
+                    continue
+            
+            if buffered:
+                # 슬롯이 없으면 여기서 대기 → to_insert 큐가 차면서 앞 단계에 백프레셔 전달
+                await insert_slots.acquire()
+                inflight.append(asyncio.create_task(store(buffered)))
+                buffered = []
+                buffered_vectors = 0
+            
+            if embedded is None:
+                await asyncio.gather(*inflight)
+                return
+    
+    # 빈 컬렉션에 대량 전체 재인덱싱이면 스트리밍 insert 대신 bulk_insert 사용
+    # (bulk_insert는 upsert가 아니므로 기존 청크가 있으면 중복 저장됨)
+    use_bulk = False
+    if force_reindex and not product_ids and vector_store.supports_bulk_insert:
+        use_bulk = (await asyncio.to_thread(lambda: vector_store.collection.num_entities) == 0
+                    and await asyncio.to_thread(approx_product_count, read_db) >= BULK_INSERT_THRESHOLD)
+    
+    logger.info(f"🚀 제품 인덱싱 시작 (조회 단위: {PRODUCT_FETCH_SIZE}, 배치 크기: {batch_tuner.batch_size}, "
+                f"적재 방식: {'bulk_insert' if use_bulk else 'insert'})")
+    
+    stages = [asyncio.create_task(stage()) for stage in (produce, embed, insert)]
+    try:
+        await asyncio.gather(*stages)
+        
+        # 전체 insert가 끝난 뒤 세그먼트 flush 1회, 첫 적재라면 전체 데이터 기준으로 인덱스 생성
+        await asyncio.to_thread(vector_store.flush)
+        await asyncio.to_thread(vector_store.ensure_index)
+        
+        # 상태가 바뀌었으므로 카운트 캐시 무효화
+        _count_cache.clear()
         
         logger.info(f"🎉 인덱싱 완료: {indexed_count}개 성공, {len(errors)}개 오류")
         return indexed_count, errors
         
     except Exception as e:
+        # 한 단계가 실패하면 큐에서 대기 중인 나머지 단계도 중단
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        
         error_msg = f"인덱싱 작업 전체 실패: {str(e)}"
         logger.error(error_msg)
         errors.append(error_msg)
         return indexed_count, errors
     finally:
+        read_db.close()
         db.close()
 
 # API 엔드포인트
 @app.on_event("startup")
 async def startup():
     """서비스 시작 시 초기화"""
-    global embedding_model, vector_store, chunker
+    global embedding_model, vector_store, chunker, batch_tuner, chunker_pool
     
     logger.info("🚀 UNCOMMON 인덱싱 서비스 시작")
     
@@ -236,9 +560,17 @@ async def startup():
         
         # BGE-M3 임베딩 모델 로드
         logger.info("📥 BGE-M3 임베딩 모델 로딩 중...")
-        embedding_model = get_bge_m3_model()
+        if config.TEI_URL:
+            # 모델은 TEI 사이드카에서 실행 (서버 측 동적 배칭)
+            embedding_model = TEIEmbeddings(config.TEI_URL, batch_size=config.TEI_BATCH_SIZE)
+        else:
+            embedding_model = get_bge_m3_model()
         logger.info("✅ 임베딩 모델 로딩 완료")
         
+        # 임베딩 배치 크기 자동 조정 (TEI는 서버 측에서 배칭하므로 고정)
+        batch_tuner = BatchSizeTuner(INDEX_BATCH_SIZE, window=EMBED_AUTOTUNE_WINDOW)
+        batch_tuner.frozen = isinstance(embedding_model, TEIEmbeddings)
+        
         # Milvus 벡터 스토어 초기화
         logger.info("🔗 Milvus 벡터 스토어 초기화 중...")
         vector_store = ProductMilvusVectorStore(
@@ -250,7 +582,9 @@ async def startup():
         
         # 청킹 모듈 초기화
         chunker = ProductTextChunker(chunk_size=500)
-        logger.info("✅ 제품 청킹 모듈 초기화 완료")
+        # spawn 컨텍스트 - gRPC/CUDA가 초기화된 프로세스를 fork하지 않음 (워커는 text_chunker만 임포트)
+        chunker_pool = ProcessPoolExecutor(max_workers=CHUNKER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"✅ 제품 청킹 모듈 초기화 완료 (프로세스 풀: {CHUNKER_WORKERS}개)")
         
         logger.info("🎉 모든 모듈 초기화 완료!")
         
@@ -258,6 +592,22 @@ async def startup():
         logger.error(f"❌ 서비스 초기화 실패: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown():
+    """서비스 종료 시 리소스 정리"""
+    if isinstance(embedding_model, TEIEmbeddings):
+        await embedding_model.aclose()
+        logger.info("✅ TEI 클라이언트 종료")
+    elif embedding_model is not None:
+        embedding_model.close()
+        logger.info("✅ 임베딩 워커 풀 종료")
+    if chunker_pool is not None:
+        chunker_pool.shutdown(cancel_futures=True)
+        logger.info("✅ 청킹 프로세스 풀 종료")
+    if vector_store is not None and vector_store.embedding_cache is not None:
+        vector_store.embedding_cache.close()
+        logger.info("✅ 임베딩 캐시 종료")
+
 @app.get("/")
 async def root():
     """서비스 상태 확인"""
@@ -277,6 +627,11 @@ async def health_check():
         "service": "indexing"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 메트릭 (단계별 소요 시간, 임베딩 배치 크기)"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/index/products", response_model=IndexResponse)
 async def index_products(
     request: IndexRequest,
@@ -288,19 +643,24 @@ async def index_products(
     # 처리할 제품 수 확인
     query = db.query(Product)
     
+    stale_seconds = 0.0
     if request.product_ids:
         query = query.filter(Product.id.in_(request.product_ids))
         total_count = len(request.product_ids)
     elif request.force_reindex:
-        total_count = query.count()
+        total_count, stale_seconds = cached_count("all", lambda: approx_product_count(db))
     else:
-        total_count = query.filter(Product.indexed == False).count()
+        # idx_products_pending 부분 인덱스로 index-only scan
+        total_count, stale_seconds = cached_count(
+            "pending", lambda: query.filter(Product.indexed == False).count()
+        )
     
     if total_count == 0:
         return IndexResponse(
             message="인덱싱할 제품이 없습니다",
             total_products=0,
-            indexed_count=0
+            indexed_count=0,
+            stale_seconds=stale_seconds
         )
     
     # 백그라운드 작업 시작
@@ -313,7 +673,8 @@ async def index_products(
     return IndexResponse(
         message=f"인덱싱 시작: {total_count}개 제품 처리 예정",
         total_products=total_count,
-        indexed_count=0
+        indexed_count=0,
+        stale_seconds=stale_seconds
     )
 
 @app.get("/index/stats", response_model=StatsResponse)
@@ -343,22 +704,24 @@ async def get_indexing_stats(
     )
 
 @app.post("/index/products/{product_id}")
-async def index_single_product(
+def index_single_product(
     product_id: int,
     db: Session = Depends(get_db)
 ):
-    """단일 제품 즉시 인덱싱"""
+    """단일 제품 즉시 인덱싱 (동기 엔드포인트 - FastAPI 스레드풀에서 실행)"""
     
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = (
+        db.query(Product)
+        .options(selectinload(Product.images))
+        .filter(Product.id == product_id)
+        .first()
+    )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     try:
-        # 이미지 정보 조회
-        images = db.query(ProductImage).filter(ProductImage.product_id == product_id).all()
-        
-        # 제품 데이터 준비
-        product_data = prepare_product_data(product, images)
+        # 제품 데이터 준비 (이미지는 selectinload로 미리 로드됨)
+        product_data = prepare_product_data(product, product.images)
         
         # 청킹
         chunks = chunker.chunk_product_data(product_data)
@@ -377,6 +740,7 @@ async def index_single_product(
         
         # Milvus에 저장
         vector_store.add_documents(documents)
+        vector_store.ensure_index()
         
         # 상태 업데이트
         product.indexed = True
@@ -441,5 +805,4 @@ async def process_new_products(
 
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.environ['INDEXING_INTERNAL_PORT'])
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=config.INDEXING_INTERNAL_PORT)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+인덱싱 파이프라인 Prometheus 메트릭 + 임베딩 배치 크기 자동 조정
+단계별(조회/청킹/임베딩/Milvus 저장/DB 커밋) 소요 시간을 기록하여 병목 단계 확인
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# 단계별 소요 시간 - with STAGE.labels("embed").time(): ...
+STAGE = Histogram(
+    "indexing_stage_seconds",
+    "인덱싱 파이프라인 단계별 소요 시간(초)",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+
+# 현재 임베딩 배치 크기 (자동 조정 결과)
+EMBED_BATCH_SIZE = Gauge("indexing_embed_batch_size", "현재 임베딩 배치 크기")
+
+class BatchSizeTuner:
+    """
+    임베딩 배치 크기 자동 조정 - 측정 구간마다 텍스트당 p50 지연 비교
+
+    직전 구간보다 텍스트당 지연이 줄었으면(연산 여유가 있으면) 배치를 2배로 늘리고,
+    늘지 않았으면(메모리/대역폭 한계) 직전 배치 크기로 되돌린 뒤 고정합니다.
+    """
+
+    def __init__(self, initial: int, max_batch: int = 512, window: int = 500):
+        """
+        Args:
+            initial: 시작 배치 크기 (config.BATCH_SIZE)
+            max_batch: 배치 크기 상한
+            window: 비교 구간의 임베딩 호출 수
+        """
+        self.batch_size = initial
+        self.max_batch = max(initial, max_batch)
+        self.window = window
+        self.frozen = False
+        self._samples: List[float] = []
+        self._best: Optional[Tuple[int, float]] = None  # (배치 크기, 텍스트당 p50 지연)
+        EMBED_BATCH_SIZE.set(initial)
+
+    def record(self, seconds: float, num_texts: int):
+        """임베딩 호출 1회의 소요 시간 기록 - 구간이 차면 배치 크기 조정"""
+        if self.frozen or num_texts == 0:
+            return
+        self._samples.append(seconds / num_texts)
+        if len(self._samples) < self.window:
+            return
+
+        p50 = float(np.median(self._samples))
+        self._samples.clear()
+
+        if self._best is None or p50 < self._best[1]:
+            self._best = (self.batch_size, p50)
+            if self.batch_size * 2 > self.max_batch:
+                self.frozen = True
+                logger.info(f"📈 배치 크기 자동 조정 완료: {self.batch_size} (상한 도달)")
+                return
+            self.batch_size *= 2
+            logger.info(f"📈 배치 크기 확대: {self._best[0]} → {self.batch_size} (텍스트당 p50 {p50 * 1000:.2f}ms)")
+        else:
+            logger.info(f"📉 배치 {self.batch_size}에서 개선 없음 (텍스트당 p50 {p50 * 1000:.2f}ms), "
+                        f"{self._best[0]}로 복귀")
+            self.batch_size = self._best[0]
+            self.frozen = True
+
+        EMBED_BATCH_SIZE.set(self.batch_size)
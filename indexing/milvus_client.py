@@ -3,23 +3,55 @@ Milvus 벡터 데이터베이스 클라이언트 - UNCOMMON 프로젝트 전용
 langchain-milvus를 사용한 고도화된 벡터 스토어
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from langchain_milvus import Milvus
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain_core.documents import Document
 from langchain.vectorstores.base import VectorStore
 # from langchain_huggingface import HuggingFaceEmbeddings  # 제거됨
-from pymilvus import connections, utility, FieldSchema, CollectionSchema, DataType, Collection
-import os
+from pymilvus import connections, utility, FieldSchema, CollectionSchema, DataType, Collection, BulkInsertState
+import hashlib
 import logging
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv('../.env.global')
-load_dotenv()
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+import time
+import uuid
+import numpy as np
+from config import MILVUS_HOST, MILVUS_INTERNAL_PORT, EMBED_DISK_CACHE_PATH, MILVUS_BULK_DIR
+from database import save_chunk_texts, fetch_chunk_texts
+from embedding_cache import EmbeddingCache
+from embedding_generator import l2_normalize
+from metrics import STAGE
 
 logger = logging.getLogger(__name__)
 
+# 엔티티 수가 이 값을 넘으면 HNSW 대신 IVF_PQ 인덱스 생성
+IVF_PQ_THRESHOLD = 1_000_000
+
+# 쿼리 결과 캐시 - 정확 일치 LRU 크기 / 의미 캐시 크기 및 코사인 유사도 임계값
+QUERY_CACHE_SIZE = 1024
+SEMANTIC_CACHE_THRESHOLD = 0.98
+
+# num_entities(코디네이터 RPC) 캐시 유지 시간(초)
+NUM_ENTITIES_TTL = 30.0
+
+# product_id % NUM_PARTITIONS 기준 파티션 - 파티션별 insert 병렬화 및 제품 필터 검색 프루닝
+NUM_PARTITIONS = 16
+SHARDS_NUM = 8
+
+# 재인덱싱 전 기존 청크 삭제 표현식당 최대 제품 수
+DELETE_BATCH = 1000
+
+def partition_name(product_id: int) -> str:
+    """제품 ID가 속한 파티션 이름 (part_00 ~ part_15)"""
+    return f"part_{product_id % NUM_PARTITIONS:02d}"
+
+def chunk_hash(product_id: int, chunk_type: str, content: str) -> str:
+    """청크 기본 키 - 같은 제품/청크 타입/내용이면 항상 같은 값 (재인덱싱 시 upsert로 덮어씀)"""
+    return hashlib.blake2b(f"{product_id}|{chunk_type}|{content}".encode('utf-8'), digest_size=16).hexdigest()
+
 class ProductMilvusVectorStore(VectorStore):
     """제품 데이터 전용 Milvus 벡터 스토어"""
     
@@ -49,37 +81,58 @@ class ProductMilvusVectorStore(VectorStore):
         self.index_type = index_type
         
         # 환경변수에서 Milvus 접속 정보 가져오기 (컨테이너 간 통신용 내부 포트 사용)
-        self.milvus_host = milvus_host or os.environ['MILVUS_HOST']
-        self.milvus_port = milvus_port or os.environ['MILVUS_INTERNAL_PORT']
+        self.milvus_host = milvus_host or MILVUS_HOST
+        self.milvus_port = milvus_port or MILVUS_INTERNAL_PORT
+        
+        # 텍스트 해시 기반 영구 임베딩 캐시 (재인덱싱 시 추론 생략)
+        self.embedding_cache = EmbeddingCache(EMBED_DISK_CACHE_PATH, self.embedding_dim) if EMBED_DISK_CACHE_PATH else None
+        
+        # 검색 결과 캐시 - (쿼리, k) 정확 일치 LRU + 과거 쿼리 벡터 기반 의미 캐시 (링 버퍼)
+        self._query_cache = OrderedDict()
+        self._sem_vectors = np.zeros((QUERY_CACHE_SIZE, self.embedding_dim), dtype=np.float32)
+        self._sem_results = [None] * QUERY_CACHE_SIZE  # (k, docs)
+        self._sem_count = 0
+        self._sem_next = 0
+        
+        # 검색 경로 상태 - 컬렉션 로드/인덱스 파라미터는 한 번만 조회, 엔티티 수는 TTL 캐시
+        self._loaded = False
+        self._search_params = None
+        self._index_type_loaded = None
+        self._num_entities = 0
+        self._num_entities_at = 0.0
+        
+        # 파티션별 insert를 동시에 보내기 위한 스레드 풀 / 파티션 프루닝 사용 가능 여부
+        self._insert_pool = ThreadPoolExecutor(max_workers=SHARDS_NUM, thread_name_prefix="milvus-insert")
+        self._partitioned = False
         
         # Milvus 연결
-        print(f"\n🔗 Milvus 연결 시도: {self.milvus_host}:{self.milvus_port}")
+        logger.info("🔗 Milvus 연결 시도: %s:%s", self.milvus_host, self.milvus_port)
         connections.connect("default", host=self.milvus_host, port=self.milvus_port)
 
         # 서버 버전 정보를 요청하여 실제 통신 확인
         server_version = utility.get_server_version()
-        print(f"✅ Milvus 연결 성공! (서버 버전: {server_version})")
+        logger.info("✅ Milvus 연결 성공! (서버 버전: %s)", server_version)
         
         # 컬렉션 생성 또는 로드
         self._setup_collection()
 
     def _setup_collection(self):
         """Milvus 컬렉션 설정"""
-        print(f"\n📋 컬렉션 설정: {self.collection_name}")
+        logger.info("📋 컬렉션 설정: %s", self.collection_name)
         
         # 스키마 정의
         fields = [
-            # id 필드 (자동 ID 생성)
-            FieldSchema(name="pk", dtype=DataType.VARCHAR, is_primary=True, auto_id=True, max_length=100),
+            # 기본 키 - 청크 내용 해시 (재인덱싱 시 같은 청크는 upsert로 덮어씀)
+            FieldSchema(name="chunk_hash", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=64),
             # 벡터를 저장할 필드
             FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
             # 제품 정보 필드들
             FieldSchema(name="product_id", dtype=DataType.INT64),
             FieldSchema(name="product_name", dtype=DataType.VARCHAR, max_length=500),
             FieldSchema(name="chunk_type", dtype=DataType.VARCHAR, max_length=100),
-            FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=200),
-            # 원본 텍스트를 저장할 필드
-            FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535)
+            # 제품 내 청크 순번 - 원본 텍스트는 PostgreSQL product_chunks에 (product_id, chunk_ord)로 저장
+            FieldSchema(name="chunk_ord", dtype=DataType.INT16),
+            FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=200)
         ]
         
         schema = CollectionSchema(fields, f"'{self.collection_name}' UNCOMMON Product Documents")
@@ -87,41 +140,132 @@ class ProductMilvusVectorStore(VectorStore):
         if self.always_new:
             # 기존 컬렉션이 있으면 삭제
             if utility.has_collection(self.collection_name):
-                print(f"🗑️ 기존 컬렉션 '{self.collection_name}' 삭제")
+                logger.info("🗑️ 기존 컬렉션 '%s' 삭제", self.collection_name)
                 utility.drop_collection(self.collection_name)
 
         # 컬렉션 생성
         try:
-            self.collection = Collection(self.collection_name, schema)
-            print(f"✅ 새 컬렉션 '{self.collection_name}' 생성")
+            self.collection = Collection(self.collection_name, schema, shards_num=SHARDS_NUM)
+            logger.info("✅ 새 컬렉션 '%s' 생성", self.collection_name)
         except Exception:
             self.collection = Collection(self.collection_name)
-            print(f"✅ 기존 컬렉션 '{self.collection_name}' 로드")
+            logger.info("✅ 기존 컬렉션 '%s' 로드", self.collection_name)
+        
+        # 삽입 컬럼 순서 (auto_id 필드 제외) - 해시 기본 키 스키마면 upsert 사용
+        self._field_names = [field.name for field in self.collection.schema.fields if not field.auto_id]
+        self._upsert = self.collection.schema.primary_field.name == "chunk_hash"
+        # content 필드가 있는 기존 스키마는 Milvus에 원문 저장, 없으면 PostgreSQL에서 조회
+        self._store_content = "content" in self._field_names
+        self._output_fields = [
+            name for name in ("product_id", "product_name", "chunk_type", "chunk_ord", "source", "content")
+            if name in self._field_names
+        ]
+        if not self._upsert:
+            logger.warning("⚠️ 기존 auto_id 스키마 컬렉션 - 해시 기본 키 사용을 위해 always_new로 재생성 권장")
         
-        # 인덱스 생성
-        self._create_index()
+        self._ensure_partitions()
+        
+        # 인덱스는 데이터 적재 후 전체 데이터 기준으로 한 번에 생성 (ensure_index)
+        # 단, 인덱스 없이 데이터만 있는 기존 컬렉션은 바로 생성
+        if not self.collection.has_index() and self.collection.num_entities > 0:
+            self.ensure_index()
+        
+        # 인덱스가 있으면 검색용으로 한 번만 로드
+        self._ensure_loaded()
 
-    def _create_index(self):
-        """벡터 필드에 인덱스 생성"""
-        if self.index_type == 'HNSW':
-            params = {"M": 8, "efConstruction": 64}
-        elif self.index_type in ["IVF_FLAT", "IVF_SQ8", "IVF_PQ"]:
-            params = {"nlist": 128}
+    def _ensure_partitions(self):
+        """part_00 ~ part_15 파티션 생성 (없는 것만)"""
+        existing = {partition.name for partition in self.collection.partitions}
+        for k in range(NUM_PARTITIONS):
+            name = f"part_{k:02d}"
+            if name not in existing:
+                self.collection.create_partition(name)
+        
+        # 파티션 도입 전 _default에 적재된 데이터가 있으면 프루닝 시 누락되므로 전체 검색 유지
+        self._partitioned = self.collection.partition("_default").num_entities == 0
+        if self._partitioned:
+            logger.info("✅ 파티션 %s개 준비 완료", NUM_PARTITIONS)
+        else:
+            logger.warning("⚠️ _default 파티션에 기존 데이터가 있어 검색 파티션 프루닝을 사용하지 않습니다 (재인덱싱 필요)")
+
+    def _ensure_loaded(self) -> bool:
+        """
+        컬렉션을 한 번만 로드하고 인덱스 기반 검색 파라미터를 캐시
+        
+        인덱스가 아직 없으면(첫 적재 전) 로드할 수 없으므로 False 반환.
+        """
+        if self._loaded:
+            return True
+        if not self.collection.has_index():
+            return False
+        
+        self.collection.load()
+        try:
+            index_params = self.collection.indexes[0].params
+            index_type = index_params.get("index_type", self.index_type)
+            metric_type = index_params.get("metric_type", self.metric_type)
+        except Exception:
+            index_type, metric_type = self.index_type, self.metric_type
+        
+        if index_type == 'HNSW':
+            params = {"ef": 64}
+        elif index_type in ["IVF_FLAT", "IVF_SQ8", "IVF_PQ"]:
+            params = {"nprobe": 10}
         else:
             params = {}
+        
+        self._index_type_loaded = index_type
+        self._search_params = {"metric_type": metric_type, "params": params}
+        self._loaded = True
+        logger.info("✅ 컬렉션 로드 완료 (index_type: %s, 검색 파라미터: %s)", index_type, self._search_params)
+        return True
+
+    def _cached_num_entities(self) -> int:
+        """num_entities를 NUM_ENTITIES_TTL 동안 캐시"""
+        now = time.monotonic()
+        if now - self._num_entities_at > NUM_ENTITIES_TTL:
+            self._num_entities = self.collection.num_entities
+            self._num_entities_at = now
+        return self._num_entities
 
-        index_params = {
-            "metric_type": self.metric_type,  
-            "index_type": self.index_type,
+    def _index_params(self, num_entities: int) -> dict:
+        """데이터 규모에 맞는 벡터 인덱스 파라미터"""
+        if num_entities > IVF_PQ_THRESHOLD:
+            # 대규모: HNSW 빌드 비용이 지배적이므로 IVF_PQ로 전환 (1024차원 → 16 서브벡터 x 8bit)
+            index_type, params = "IVF_PQ", {"nlist": 4096, "m": 16, "nbits": 8}
+        elif self.index_type == 'HNSW':
+            index_type, params = "HNSW", {"M": 16, "efConstruction": 200}
+        elif self.index_type in ["IVF_FLAT", "IVF_SQ8", "IVF_PQ"]:
+            index_type, params = self.index_type, {"nlist": 128}
+        else:
+            index_type, params = self.index_type, {}
+        
+        return {
+            "metric_type": self.metric_type,
+            "index_type": index_type,
             "params": params
         }
+
+    def ensure_index(self) -> bool:
+        """
+        벡터 인덱스가 없으면 현재 데이터 규모 기준으로 생성 (적재 후 1회)
+        
+        빈 컬렉션에 미리 만든 인덱스를 데이터 유입마다 증분 빌드하는 대신
+        전체 데이터에 대해 한 번 빌드합니다. 새로 생성했으면 True 반환.
+        """
+        if self.collection.has_index():
+            return False
         
+        index_params = self._index_params(self.collection.num_entities)
         try:
-            print(f"🔧 벡터 인덱스 생성 중...")
+            logger.info("🔧 벡터 인덱스 생성 중... (%s개 엔티티)", self.collection.num_entities)
             self.collection.create_index("vector", index_params)
-            print(f"✅ 인덱스 생성 완료 (metric_type: {self.metric_type}, index_type: {self.index_type})")
+            logger.info("✅ 인덱스 생성 완료 (metric_type: %s, index_type: %s)", self.metric_type, index_params['index_type'])
+            self._ensure_loaded()
+            return True
         except Exception as e:
-            print(f"⚠️ 인덱스 생성 오류 (이미 존재할 수 있음): {e}")
+            logger.warning("⚠️ 인덱스 생성 오류 (이미 존재할 수 있음): %s", e)
+            return False
 
     def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
         """
@@ -130,81 +274,312 @@ class ProductMilvusVectorStore(VectorStore):
         if metadatas is None:
             metadatas = [{}] * len(texts)
         
-        print(f"\n📤 {len(texts)}개 문서를 배치로 처리합니다...")
+        logger.debug("📤 %s개 문서를 배치로 처리합니다...", len(texts))
         
-        # 배치 크기 설정 (GPU 메모리에 따라 조정)
-        BATCH_SIZE = 16  # 한 번에 16개씩 처리
+        # 배치 크기 설정 - GPU 여유 메모리 기준 자동 산정 (지원하지 않는 모델은 16)
+        auto_batch_size = getattr(self.embedding_model, 'auto_batch_size', None)
+        batch_size = auto_batch_size() if auto_batch_size else 16
+        logger.debug("   배치 크기: %s", batch_size)
         
         # 전체 데이터를 배치로 나누어 처리
         all_vectors = []
-        for i in range(0, len(texts), BATCH_SIZE):
-            batch_texts = texts[i:i+BATCH_SIZE]
-            print(f"   배치 {i//BATCH_SIZE + 1}/{(len(texts)-1)//BATCH_SIZE + 1}: {len(batch_texts)}개 문서 임베딩 중...")
+        i = 0
+        while i < len(texts):
+            batch_texts = texts[i:i+batch_size]
+            logger.debug("   %s~%s/%s: %s개 문서 임베딩 중...", i+1, i+len(batch_texts), len(texts), len(batch_texts))
             
             try:
-                # 배치별 임베딩 생성
-                batch_vectors = self.embedding_model.embed_documents(batch_texts)
-                all_vectors.extend(batch_vectors)
-                print(f"   ✅ 배치 완료 ({len(batch_vectors)}개 벡터 생성)")
+                # 배치별 임베딩 생성 (영구 캐시 미스만 모델 추론)
+                with STAGE.labels("embed").time():
+                    batch_vectors = self.embed_with_cache(batch_texts)
+                all_vectors.append(batch_vectors)
+                logger.debug("   ✅ 배치 완료 (%s개 벡터 생성)", len(batch_vectors))
+                i += len(batch_texts)
                 
             except RuntimeError as e:
-                if "CUDA" in str(e):
-                    print(f"   ❌ CUDA 메모리 오류 발생, 더 작은 배치로 재시도...")
-                    # 더 작은 배치로 재시도
-                    for j in range(i, min(i+BATCH_SIZE, len(texts))):
-                        single_vector = self.embedding_model.embed_documents([texts[j]])
-                        all_vectors.extend(single_vector)
-                        print(f"     단일 문서 처리: {j+1}/{len(texts)}")
+                if "CUDA" in str(e) and batch_size > 1:
+                    # 같은 구간을 절반 크기 배치로 재시도
+                    batch_size = max(1, batch_size // 2)
+                    logger.warning("   ❌ CUDA 메모리 오류 발생, 배치 크기 %s로 재시도...", batch_size)
                 else:
                     raise e
         
-        print(f"✅ 전체 {len(all_vectors)}개 벡터 생성 완료")
+        all_vectors = np.concatenate(all_vectors) if all_vectors else np.empty((0, self.embedding_dim), dtype=np.float32)
+        logger.debug("✅ 전체 %s개 벡터 생성 완료", len(all_vectors))
         
-        # 데이터 준비
-        product_ids = []
-        product_names = []
-        chunk_types = []
-        sources = []
-        contents = []
+        return self._insert(texts, metadatas, all_vectors)
+
+    def embed_with_cache(self, texts: List[str], embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None) -> np.ndarray:
+        """
+        영구 임베딩 캐시를 거쳐 임베딩 (float32 ndarray 반환)
         
-        for i, text in enumerate(texts):
-            metadata = metadatas[i]
-            
-            # 메타데이터 추출
-            product_id = metadata.get('product_id', 0)
-            product_name = metadata.get('product_name', '')
-            chunk_type = metadata.get('chunk_type', 'unknown')
-            source = metadata.get('source', '')
-
-            # 데이터 추가
-            product_ids.append(product_id)
-            product_names.append(product_name)
-            chunk_types.append(chunk_type)
-            sources.append(source)
-            contents.append(text)
-        
-        # Milvus에 삽입할 데이터 구성
-        data = [
-            all_vectors,  # 배치로 생성된 전체 벡터
-            product_ids,
-            product_names,
-            chunk_types,
-            sources,
-            contents
-        ]
+        Args:
+            texts: 임베딩할 텍스트 리스트
+            embed_fn: 캐시 미스 임베딩 함수 (기본값: embedding_model.embed_documents_np)
+        """
+        embed_fn = embed_fn or self.embedding_model.embed_documents_np
+        if self.embedding_cache is None:
+            return embed_fn(texts)
+        return self.embedding_cache.embed(texts, embed_fn)
 
-        # 컬렉션 로드 (검색을 위해 필요)
-        self.collection.load()
+    def add_documents_with_embeddings(self, documents: List[Document], embeddings) -> List[str]:
+        """
+        미리 계산된 임베딩과 함께 Document 리스트를 저장 (재임베딩 없음)
         
-        # 데이터 삽입
-        mr = self.collection.insert(data)
-        print(f"✅ {len(texts)}개 문서가 성공적으로 삽입되었습니다.")
+        Args:
+            documents: 저장할 Document 리스트
+            embeddings: documents와 같은 순서의 임베딩 행렬 (len(documents) x dim)
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError(f"문서 수({len(documents)})와 임베딩 수({len(embeddings)})가 일치하지 않습니다")
         
-        # 데이터 플러시 (영구 저장)
-        self.collection.flush()
-        print("✅ 데이터가 영구 저장되었습니다.")
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        return self._insert(texts, metadatas, embeddings)
+
+    def _columns(self, texts: List[str], metadatas: List[dict], vectors) -> Dict[str, Any]:
+        """
+        필드별 컬럼 데이터 구성 (필드명 → 컬럼)
+        
+        벡터는 연속 float32 행렬, product_id는 int64 배열로 만들어
+        pymilvus가 요소별 타입 변환 없이 직렬화하도록 함.
+        chunk_ord는 입력 순서대로 제품별 0부터 부여 (호출마다 제품의 청크 전체가 전달됨).
+        """
+        product_ids = [m.get('product_id', 0) for m in metadatas]
+        chunk_types = [m.get('chunk_type', 'unknown') for m in metadatas]
+        contents = list(texts)
         
-        return mr.primary_keys  
+        next_ord: Dict[int, int] = {}
+        chunk_ords = np.empty(len(product_ids), dtype=np.int16)
+        for i, pid in enumerate(product_ids):
+            ord_ = next_ord.get(pid, 0)
+            chunk_ords[i] = ord_
+            next_ord[pid] = ord_ + 1
+        
+        columns = {
+            "vector": l2_normalize(vectors),  # 임베딩 벡터 (단위 길이 float32 행렬)
+            "product_id": np.asarray(product_ids, dtype=np.int64),
+            "product_name": [m.get('product_name', '') for m in metadatas],
+            "chunk_type": chunk_types,
+            "chunk_ord": chunk_ords,
+            "source": [m.get('source', '') for m in metadatas],
+            "content": contents,
+        }
+        if self._upsert:
+            columns["chunk_hash"] = [chunk_hash(*row) for row in zip(product_ids, chunk_types, contents)]
+        return columns
+
+    def _prepare_write(self, texts: List[str], metadatas: List[dict], vectors, replace: bool = False) -> list:
+        """
+        스키마 순서(auto_id 제외)의 삽입 데이터 구성
+        
+        원문을 Milvus에 저장하지 않는 스키마면 Milvus 쓰기 전에 PostgreSQL에 COPY로 저장.
+        replace면 원문을 바꾸기 전에 해당 제품의 기존 Milvus 청크부터 삭제 - 이전 벡터의
+        (product_id, chunk_ord)가 새 원문(다른 청크)을 가리키는 시점이 생기지 않도록 함
+        """
+        columns = self._columns(texts, metadatas, vectors)
+        if replace:
+            with STAGE.labels("milvus_delete").time():
+                self._delete_existing(columns["product_id"])
+        if not self._store_content:
+            with STAGE.labels("chunk_text_copy").time():
+                save_chunk_texts(list(zip(
+                    columns["product_id"].tolist(), columns["chunk_ord"].tolist(),
+                    columns["chunk_type"], columns["content"]
+                )))
+        return [columns[name] for name in self._field_names]
+
+    @staticmethod
+    def _partition_groups(product_ids: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+        """행 인덱스를 product_id % NUM_PARTITIONS 기준으로 묶기 - [(파티션 이름, 행 인덱스 배열)]"""
+        if len(product_ids) == 0:
+            return []
+        keys = product_ids % NUM_PARTITIONS
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        bounds = np.flatnonzero(np.diff(sorted_keys)) + 1
+        return [(f"part_{keys[rows[0]]:02d}", rows) for rows in np.split(order, bounds)]
+
+    @staticmethod
+    def _take(columns: list, rows: np.ndarray) -> list:
+        """컬럼 데이터에서 지정한 행만 추출"""
+        return [column[rows] if isinstance(column, np.ndarray) else [column[i] for i in rows] for column in columns]
+
+    @staticmethod
+    def _unique_rows(texts: List[str], metadatas: List[dict]) -> Tuple[List[int], List[int]]:
+        """
+        같은 배치 안의 동일 청크(product_id, chunk_type, content) 제거
+        
+        Returns:
+            (남길 입력 인덱스 목록, 입력 행별 남긴 행 위치) - 동일 청크는 같은 기본 키를 공유
+        """
+        first: Dict[Tuple[Any, str, str], int] = {}
+        keep: List[int] = []
+        position: List[int] = []
+        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+            key = (metadata.get('product_id', 0), metadata.get('chunk_type', 'unknown'), text)
+            slot = first.get(key)
+            if slot is None:
+                slot = first[key] = len(keep)
+                keep.append(i)
+            position.append(slot)
+        return keep, position
+
+    def _delete_existing(self, product_ids: np.ndarray):
+        """
+        제품들의 기존 청크 전체 삭제 - 파티션별 `product_id in [...]` (DELETE_BATCH개 단위, 파티션 간 병렬)
+        
+        _default에 파티션 도입 전 데이터가 남아 있으면(_partitioned=False) 제품 청크가 _default에도
+        있을 수 있으므로 파티션 지정 없이 컬렉션 전체에서 삭제 - 새 청크는 파티션에 기록되어 점차 이전됨
+        """
+        if not self._partitioned:
+            pids = sorted(set(product_ids.tolist()))
+            for i in range(0, len(pids), DELETE_BATCH):
+                self.collection.delete(f"product_id in {pids[i:i + DELETE_BATCH]}")
+            return
+        
+        def delete_group(group):
+            name, rows = group
+            pids = sorted(set(product_ids[rows].tolist()))
+            for i in range(0, len(pids), DELETE_BATCH):
+                self.collection.delete(f"product_id in {pids[i:i + DELETE_BATCH]}", partition_name=name)
+        
+        groups = self._partition_groups(product_ids)
+        if len(groups) > 1:
+            list(self._insert_pool.map(delete_group, groups))
+        else:
+            for group in groups:
+                delete_group(group)
+
+    def _insert(self, texts: List[str], metadatas: List[dict], vectors) -> List[str]:
+        """
+        벡터와 메타데이터를 파티션별로 나누어 Milvus 컬렉션에 삽입
+        
+        호출마다 제품의 청크 전체가 전달되므로 해당 제품의 기존 청크를 먼저 삭제한 뒤 쓰기
+        (내용이 바뀐 청크의 이전 벡터가 남지 않음, PostgreSQL 원문 교체보다 먼저 삭제).
+        배치 안의 동일 청크는 한 번만 저장.
+        """
+        keep, position = self._unique_rows(texts, metadatas)
+        if len(keep) < len(texts):
+            logger.debug("배치 내 동일 청크 %s개 제외", len(texts) - len(keep))
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            vectors = np.asarray(vectors)[keep]
+        
+        data = self._prepare_write(texts, metadatas, vectors, replace=True)
+        groups = self._partition_groups(data[self._field_names.index("product_id")])
+        
+        # 해시 기본 키면 upsert - 변경 없는 청크 재인덱싱은 같은 키를 덮어씀
+        write = self.collection.upsert if self._upsert else self.collection.insert
+        
+        def insert_group(group):
+            name, rows = group
+            return rows, write(self._take(data, rows), partition_name=name)
+
+        # 데이터 삽입 (insert에는 load 불필요 - load는 인덱스 생성 후 검색 시점에)
+        # 파티션(샤드)별 insert를 동시에 보내 단일 datanode 직렬화 회피
+        if len(groups) > 1:
+            results = list(self._insert_pool.map(insert_group, groups))
+        else:
+            results = [insert_group(group) for group in groups]
+        
+        # 기본 키를 입력 순서대로 복원 (배치 내 동일 청크는 같은 키)
+        unique_keys = [None] * len(texts)
+        for rows, mr in results:
+            for i, pk in zip(rows, mr.primary_keys):
+                unique_keys[i] = pk
+        primary_keys = [unique_keys[slot] for slot in position]
+        logger.debug("✅ %s개 문서가 %s개 파티션에 삽입되었습니다.", len(texts), len(groups))
+        
+        # 데이터가 바뀌었으므로 검색 결과 캐시와 엔티티 수 캐시 무효화
+        self.clear_query_cache()
+        self._num_entities_at = 0.0
+        
+        # flush는 클러스터 전체 세그먼트를 봉인하는 무거운 작업이므로 insert마다 호출하지 않음
+        # (insert 데이터는 WAL에 기록되어 유실되지 않으며, 배치 작업 종료 시 flush() 1회 호출)
+        return primary_keys
+
+    @property
+    def supports_bulk_insert(self) -> bool:
+        """Milvus 스토리지 경로가 공유 볼륨으로 마운트되어 bulk_insert 사용 가능한지"""
+        return bool(MILVUS_BULK_DIR)
+
+    def bulk_add(self, documents: List[Document], embeddings, timeout: float = 600.0) -> int:
+        """
+        대량 적재 경로 - 컬럼별 NumPy 파일을 Milvus 스토리지에 쓰고 do_bulk_insert로 가져오기
+        
+        스트리밍 insert와 달리 WAL을 거치지 않아 콜드 재인덱싱 시 처리량이 높음.
+        Milvus는 로컬 스토리지 모드이므로 MinIO 업로드 대신 공유 볼륨(MILVUS_BULK_DIR)에 기록.
+        bulk_insert는 기본 키 중복을 덮어쓰지 않으므로 빈 컬렉션 적재에만 사용.
+        
+        Args:
+            documents: 저장할 Document 리스트
+            embeddings: documents와 같은 순서의 임베딩 행렬
+            timeout: 가져오기 완료 대기 시간(초)
+        Returns:
+            가져온 행 수
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError(f"문서 수({len(documents)})와 임베딩 수({len(embeddings)})가 일치하지 않습니다")
+        
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        # bulk_insert는 기본 키 중복을 거르지 않으므로 배치 내 동일 청크를 미리 제거
+        keep, _ = self._unique_rows(texts, metadatas)
+        if len(keep) < len(texts):
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            embeddings = np.asarray(embeddings)[keep]
+        data = self._prepare_write(texts, metadatas, embeddings)
+        
+        # 파티션별로 필드명.npy 형식의 컬럼 파일 작성 (경로는 Milvus 스토리지 루트 기준 상대 경로)
+        batch_dir = os.path.join("bulk_insert", uuid.uuid4().hex)
+        local_root = os.path.join(MILVUS_BULK_DIR, batch_dir)
+        
+        try:
+            task_ids = []
+            for name, rows in self._partition_groups(data[self._field_names.index("product_id")]):
+                local_dir = os.path.join(local_root, name)
+                os.makedirs(local_dir, exist_ok=True)
+                files = []
+                for field_name, column in zip(self._field_names, self._take(data, rows)):
+                    if not isinstance(column, np.ndarray):
+                        column = np.asarray(column, dtype=np.str_)
+                    np.save(os.path.join(local_dir, f"{field_name}.npy"), column)
+                    files.append(os.path.join(batch_dir, name, f"{field_name}.npy"))
+                task_ids.append(utility.do_bulk_insert(
+                    collection_name=self.collection_name, partition_name=name, files=files
+                ))
+            logger.info("📦 bulk_insert 시작: %s개 문서 (%s개 파티션 task)", len(texts), len(task_ids))
+            
+            row_count = 0
+            pending = list(task_ids)
+            deadline = time.monotonic() + timeout
+            while pending:
+                for task_id in list(pending):
+                    state = utility.get_bulk_insert_state(task_id=task_id)
+                    if state.state == BulkInsertState.ImportCompleted:
+                        row_count += state.row_count
+                        pending.remove(task_id)
+                    elif state.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+                        raise RuntimeError(f"bulk_insert 실패 (task {task_id}): {state.failed_reason}")
+                if not pending:
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"bulk_insert 시간 초과 (남은 task {pending})")
+                time.sleep(1.0)
+            
+            logger.info("✅ bulk_insert 완료: %s개 행", row_count)
+            self.clear_query_cache()
+            self._num_entities_at = 0.0
+            return row_count
+        finally:
+            shutil.rmtree(local_root, ignore_errors=True)
+
+    def flush(self):
+        """삽입된 데이터를 세그먼트로 봉인 (인덱싱 작업 종료 시 1회 호출)"""
+        self.collection.flush()
+        logger.info("✅ 데이터가 영구 저장되었습니다.")
 
     def add_documents(self, documents: List[Document], **kwargs) -> List[str]:
         """Document 객체 리스트를 벡터 스토어에 추가"""
@@ -212,86 +587,152 @@ class ProductMilvusVectorStore(VectorStore):
         metadatas = [doc.metadata for doc in documents]
         return self.add_texts(texts, metadatas, **kwargs)
 
+    def clear_query_cache(self):
+        """검색 결과 캐시 비우기 (데이터 변경 시)"""
+        self._query_cache.clear()
+        self._sem_results = [None] * QUERY_CACHE_SIZE
+        self._sem_count = 0
+        self._sem_next = 0
+
+    def _semantic_lookup(self, query_vector: np.ndarray, k: int) -> Optional[List[Document]]:
+        """과거 쿼리 중 코사인 유사도가 임계값 이상이고 k개 이상 결과를 가진 항목 반환"""
+        if self._sem_count == 0:
+            return None
+        scores = self._sem_vectors[:self._sem_count] @ query_vector
+        for slot in np.argsort(scores)[::-1]:
+            if scores[slot] < SEMANTIC_CACHE_THRESHOLD:
+                return None
+            cached_k, docs = self._sem_results[slot]
+            if cached_k >= k:
+                return docs[:k]
+        return None
+
+    def _store_query_result(self, cache_key: tuple, query_vector: Optional[np.ndarray], docs: List[Document]):
+        """정확 일치 LRU와 의미 캐시에 검색 결과 저장 (query_vector가 None이면 정확 일치만)"""
+        self._query_cache[cache_key] = docs
+        while len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        if query_vector is None:
+            return
+        
+        # 링 버퍼 - 가득 차면 가장 오래된 슬롯 덮어쓰기
+        self._sem_vectors[self._sem_next] = query_vector
+        self._sem_results[self._sem_next] = (cache_key[1], docs)
+        self._sem_next = (self._sem_next + 1) % QUERY_CACHE_SIZE
+        self._sem_count = min(self._sem_count + 1, QUERY_CACHE_SIZE)
+
     def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
-        """유사한 문서 검색 (LangChain 인터페이스)"""
-        # 먼저 컬렉션의 총 문서 수 확인
-        self.collection.load()
-        total_docs = self.collection.num_entities
-        print(f"\n📊 컬렉션 총 문서 수: {total_docs}")
-        print(f"📊 요청된 k 값: {k}")
+        """
+        유사한 문서 검색 (LangChain 인터페이스)
+        
+        kwargs의 product_id / product_ids로 제품을 지정하면 해당 파티션만 검색
+        """
+        product_ids = kwargs.get('product_ids')
+        if product_ids is None and kwargs.get('product_id') is not None:
+            product_ids = [kwargs['product_id']]
+        product_ids = sorted({int(pid) for pid in product_ids}) if product_ids else None
+        cache_key = (query, k, tuple(product_ids) if product_ids else None)
+        
+        # 1) 정확 일치 캐시
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            self._query_cache.move_to_end(cache_key)
+            logger.debug("⚡ 쿼리 캐시 히트: '%s'", query)
+            return list(cached)
+        
+        # 컬렉션은 한 번만 로드 (인덱스가 아직 없으면 검색 불가)
+        if not self._ensure_loaded():
+            logger.warning("⚠️ 벡터 인덱스가 아직 생성되지 않았습니다!")
+            return []
+        
+        # 먼저 컬렉션의 총 문서 수 확인 (TTL 캐시)
+        total_docs = self._cached_num_entities()
+        logger.debug("📊 컬렉션 총 문서 수: %s", total_docs)
+        logger.debug("📊 요청된 k 값: %s", k)
         
         # 실제 k 값 조정 (총 문서 수보다 클 수 없음)
         actual_k = min(k, total_docs)
-        print(f"📊 실제 검색할 k 값: {actual_k}")
+        logger.debug("📊 실제 검색할 k 값: %s", actual_k)
         
         if total_docs == 0:
-            print("⚠️ 컬렉션에 문서가 없습니다!")
+            logger.warning("⚠️ 컬렉션에 문서가 없습니다!")
             return []
         
         # 쿼리 임베딩 생성
-        print(f"\n🔍 쿼리 임베딩 생성: '{query}'")
+        logger.debug("🔍 쿼리 임베딩 생성: '%s'", query)
         query_vector = self.embedding_model.embed_query(query)
-        print(f"📏 쿼리 벡터 차원: {len(query_vector)}")
-
-        # 인덱스 정보 확인
-        try:
-            vector_index = self.collection.indexes[0]
-            index_type = vector_index.params.get("index_type")
-            metric_type = vector_index.params.get("metric_type")
-
-            if index_type == 'HNSW':
-                params = {"ef": 64}
-            elif index_type in ["IVF_FLAT", "IVF_SQ8", "IVF_PQ"]:
-                params = {"nprobe": 10}
-            else:
-                params = {}
-        except:
-            # 기본값 사용
-            metric_type = self.metric_type
-            index_type = self.index_type
-            params = {}
-
-        # 검색 파라미터
-        print(f"\n🔧 검색 파라미터:")
-        print(f"   - metric_type: {metric_type}")
-        print(f"   - index_type: {index_type}")
-        print(f"   - params: {params}")
-        print(f"   - limit: {actual_k}")
+        logger.debug("📏 쿼리 벡터 차원: %s", len(query_vector))
         
-        search_params = {"metric_type": metric_type, "params": params}
+        # 2) 의미 캐시 - 거의 같은 쿼리(코사인 > 0.98)의 결과 재사용 (제품 필터 없는 검색만)
+        query_array = None
+        if product_ids is None:
+            query_array = l2_normalize(np.asarray([query_vector]))[0]
+            cached = self._semantic_lookup(query_array, k)
+            if cached is not None:
+                logger.debug("⚡ 의미 캐시 히트: '%s'", query)
+                self._query_cache[cache_key] = cached
+                return list(cached)
+        
+        # 제품 필터 - 해당 제품이 속한 파티션만 검색
+        expr, partition_names = None, None
+        if product_ids is not None:
+            expr = f"product_id in {product_ids}"
+            if self._partitioned:
+                partition_names = sorted({partition_name(pid) for pid in product_ids})
+
+        # 검색 파라미터 (로드 시 인덱스 정보로 한 번 계산)
+        search_params = self._search_params
+        logger.debug("🔧 검색 파라미터: index_type=%s, %s, limit=%s",
+                     self._index_type_loaded, search_params, actual_k)
         
         # 검색 실행
-        print(f"\n🔍 벡터 검색 실행 중...")
+        logger.debug("🔍 벡터 검색 실행 중...")
         try:
             results = self.collection.search(
                 data=[query_vector],
                 anns_field="vector",
                 param=search_params,
                 limit=actual_k,
-                output_fields=["product_id", "product_name", "chunk_type", "source", "content"]
+                expr=expr,
+                partition_names=partition_names,
+                output_fields=self._output_fields
             )
             
-            print(f"✅ 검색 완료!")
-            print(f"📊 검색 결과 개수: {len(results[0]) if results else 0}")
+            logger.debug("✅ 검색 완료!")
+            logger.debug("📊 검색 결과 개수: %s", len(results[0]) if results else 0)
             
-            # 각 결과의 상세 정보 출력
-            if results and len(results[0]) > 0:
+            # 각 결과의 상세 정보 출력 (DEBUG 레벨에서만 엔티티 필드 조회)
+            if results and len(results[0]) > 0 and logger.isEnabledFor(logging.DEBUG):
                 for i, hit in enumerate(results[0]):
-                    print(f"   결과 {i+1}: score={hit.score:.4f}, product_id={hit.entity.get('product_id')}")
-                    print(f"          제품명: {hit.entity.get('product_name', 'N/A')}")
-                    print(f"          청크타입: {hit.entity.get('chunk_type', 'N/A')}")
+                    logger.debug("   결과 %s: score=%.4f, product_id=%s", i+1, hit.score, hit.entity.get('product_id'))
+                    logger.debug("          제품명: %s", hit.entity.get('product_name', 'N/A'))
+                    logger.debug("          청크타입: %s", hit.entity.get('chunk_type', 'N/A'))
             
         except Exception as e:
-            print(f"❌ 검색 중 오류: {e}")
+            logger.error("❌ 검색 중 오류: %s", e)
             return []
         
         # LangChain Document 형식으로 변환
-        print(f"\n🔄 LangChain Document 형식으로 변환 중...")
+        logger.debug("🔄 LangChain Document 형식으로 변환 중...")
+        # 원문은 PostgreSQL에서 쿼리 1회로 조회
+        contents = None
+        if not self._store_content:
+            contents = fetch_chunk_texts([
+                (hit.entity.get("product_id"), hit.entity.get("chunk_ord")) for hits in results for hit in hits
+            ])
+        
         docs = []
         for hits in results:
             for hit in hits:
+                if contents is None:
+                    page_content = hit.entity.get("content")
+                else:
+                    page_content = contents.get((hit.entity.get("product_id"), hit.entity.get("chunk_ord")))
+                    if page_content is None:
+                        # 원문이 없는 청크 (재인덱싱 중 삭제 전 벡터) - 빈 텍스트로 반환하지 않고 제외
+                        continue
                 doc = Document(
-                    page_content=hit.entity.get("content"),
+                    page_content=page_content,
                     metadata={
                         "product_id": hit.entity.get("product_id"),
                         "product_name": hit.entity.get("product_name"),
@@ -303,8 +744,9 @@ class ProductMilvusVectorStore(VectorStore):
                 )
                 docs.append(doc)
         
-        print(f"✅ {len(docs)}개 문서를 LangChain Document로 변환 완료")
-        return docs
+        logger.debug("✅ %s개 문서를 LangChain Document로 변환 완료", len(docs))
+        self._store_query_result(cache_key, query_array, docs)
+        return list(docs)
     
     def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[tuple]:
         """유사도 점수와 함께 검색"""
@@ -316,7 +758,7 @@ class ProductMilvusVectorStore(VectorStore):
         """텍스트 리스트로부터 벡터 스토어 생성"""
         vector_store = cls(embedding_model=embedding_model, **kwargs)
         vector_store.add_texts(texts, metadatas)
-        print("✅ 벡터 스토어 생성 완료")
+        logger.info("✅ 벡터 스토어 생성 완료")
         return vector_store
 
     @classmethod
@@ -324,5 +766,5 @@ class ProductMilvusVectorStore(VectorStore):
         """Document 리스트로부터 벡터 스토어 생성"""
         vector_store = cls(embedding_model=embedding_model, **kwargs)
         vector_store.add_documents(documents)
-        print("✅ 벡터 스토어 생성 완료")
+        logger.info("✅ 벡터 스토어 생성 완료")
         return vector_store
\ No newline at end of file
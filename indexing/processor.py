@@ -1,10 +1,18 @@
 import os
-import json
+import functools
+import orjson
+import hashlib
 import logging
-from typing import List, Dict, Any
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from datetime import datetime
+import numpy as np
 import torch
-from FlagEmbedding import BGEM3FlagModel
+from transformers import AutoTokenizer
+from _model_registry import load_bge
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,6 +22,101 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Max number of chunk embeddings kept across batches (keyed by text hash)
+EMBEDDING_CACHE_SIZE = 10000
+
+# Max prepared (product, chunks) items waiting for the encoder in process_batch
+PREP_QUEUE_SIZE = 64
+
+# Chunks with fewer whitespace-separated words than this are not embedded
+MIN_CHUNK_WORDS = 2
+
+# BGE-M3 position limit - upper bound for the per-batch max_length
+MAX_SEQ_LENGTH = 8192
+
+# (column, label) pairs rendered by prepare_product_text, in output order
+PRODUCT_TEXT_FIELDS = (
+    ('name', 'Product Name'),
+    ('price', 'Price'),
+    ('material', 'Material'),
+    ('features', 'Features'),
+    ('description', 'Description'),
+)
+
+@functools.lru_cache(maxsize=256)
+def _info_label(key: str) -> str:
+    """Display label for a product_info key (e.g. 'care_guide' -> 'Care Guide')"""
+    return key.replace('_', ' ').title()
+
+class PinnedDenseEncoder:
+    """BGE-M3 dense-vector encoder with pinned, double-buffered host-to-device copies
+    
+    Token ids/masks are staged in page-locked buffers allocated once and
+    copied with non_blocking=True, so the CPU tokenizes batch i+1 while the
+    GPU is still running batch i. Produces the same CLS-pooled, L2-normalized
+    vectors as BGEM3FlagModel.encode(...)['dense_vecs'].
+    """
+    
+    def __init__(self, model, device: str):
+        self.encoder = model.model.model  # XLM-RoBERTa (possibly torch.compile'd)
+        self.tokenizer = model.tokenizer
+        self.device = device
+        # Two (ids, mask, copy-done event) staging slots, grown on demand
+        self._slots: List[Optional[Tuple[torch.Tensor, torch.Tensor, torch.cuda.Event]]] = [None, None]
+    
+    def _stage(self, slot: int, texts: List[str], max_length: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Tokenize into a pinned slot and start its non-blocking copy to the GPU"""
+        tokens = self.tokenizer(texts, padding='longest', truncation=True, max_length=max_length, return_tensors='pt')
+        ids, mask = tokens['input_ids'], tokens['attention_mask']
+        size = ids.numel()
+        
+        staged = self._slots[slot]
+        if staged is not None:
+            # The previous copy out of this slot must finish before it is overwritten
+            staged[2].synchronize()
+        if staged is None or staged[0].numel() < size:
+            staged = (
+                torch.empty(size, dtype=torch.long, pin_memory=True),
+                torch.empty(size, dtype=torch.long, pin_memory=True),
+                torch.cuda.Event()
+            )
+        
+        # Flat buffers viewed as (batch, seq) stay contiguous, hence pinned
+        pinned_ids = staged[0][:size].view_as(ids)
+        pinned_mask = staged[1][:size].view_as(mask)
+        pinned_ids.copy_(ids)
+        pinned_mask.copy_(mask)
+        gpu_ids = pinned_ids.to(self.device, non_blocking=True)
+        gpu_mask = pinned_mask.to(self.device, non_blocking=True)
+        staged[2].record()
+        self._slots[slot] = staged
+        return gpu_ids, gpu_mask
+    
+    def _launch(self, slot: int, texts: List[str], max_length: int) -> Tuple[torch.Tensor, torch.cuda.Event]:
+        """Queue copy, forward and device-to-host copy for one batch without waiting on the GPU"""
+        ids, mask = self._stage(slot, texts, max_length)
+        dense = self.encoder(input_ids=ids, attention_mask=mask).last_hidden_state[:, 0]
+        dense = torch.nn.functional.normalize(dense.float(), dim=-1)
+        host = torch.empty(dense.shape, dtype=torch.float32, pin_memory=True)
+        host.copy_(dense, non_blocking=True)
+        done = torch.cuda.Event()
+        done.record()
+        return host, done
+    
+    def encode(self, text_batches: List[List[str]], max_length: int) -> Iterator[np.ndarray]:
+        """Yield a (len(batch) x dim) float32 array per batch, in order"""
+        with torch.inference_mode():
+            pending = None
+            for i, texts in enumerate(text_batches):
+                launched = self._launch(i % 2, texts, max_length)
+                if pending is not None:
+                    pending[1].synchronize()
+                    yield pending[0].numpy()
+                pending = launched
+            if pending is not None:
+                pending[1].synchronize()
+                yield pending[0].numpy()
+
 class EmbeddingProcessor:
     def __init__(self):
         self.model_name = os.environ['EMBEDDING_MODEL']
@@ -22,19 +125,40 @@ class EmbeddingProcessor:
         self.batch_size = int(os.environ['EMBEDDING_BATCH_SIZE'])
         self.use_cuda = os.environ['USE_CUDA'].lower() == 'true'
         
+        # LRU of text hash -> dense vector, shared by all generate_embeddings calls
+        self._embedding_cache = OrderedDict()
+        
+        # Number of empty, too short or duplicate chunks dropped before encoding
+        self.skipped_chunks = 0
+        
         # Initialize model
         self.device = 'cuda' if self.use_cuda and torch.cuda.is_available() else 'cpu'
         logger.info(f"Initializing BGE-M3 model on {self.device}")
         
         try:
-            self.model = BGEM3FlagModel(self.model_name, use_fp16=self.use_cuda)
+            # Shared, pre-warmed instance - every processor in this process reuses the same weights
+            # On GPU the encoder is also torch.compile'd and warmed up at the batch size
+            self.model = load_bge(
+                self.model_name,
+                self.use_cuda,
+                compile_batch=self.batch_size if self.device == 'cuda' else 0
+            )
+            # Fast (Rust) tokenizer shared by chunk_text and encode so chunks are sized in model tokens
+            if not self.model.tokenizer.is_fast:
+                self.model.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+            self.tokenizer = self.model.tokenizer
+            # On GPU, dense vectors are encoded with pinned, overlapped host-to-device copies
+            self._pinned_encoder = PinnedDenseEncoder(self.model, self.device) if self.device == 'cuda' else None
             logger.info(f"Model {self.model_name} loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise
     
     def chunk_text(self, text: str) -> List[str]:
-        """Split text into overlapping chunks
+        """Split text into overlapping chunks of model tokens
+        
+        CHUNK_SIZE / CHUNK_OVERLAP are counted in BGE-M3 tokens, and each
+        window is cut out of the original text via the tokenizer's offsets.
         
         Args:
             text: Input text to chunk
@@ -45,22 +169,96 @@ class EmbeddingProcessor:
         if not text:
             return []
         
-        chunks = []
-        words = text.split()
+        # (start, end) character span of every token, computed once
+        spans = np.asarray(
+            self.tokenizer(
+                text,
+                add_special_tokens=False,
+                return_offsets_mapping=True
+            )['offset_mapping'],
+            dtype=np.int32
+        )
+        num_tokens = len(spans)
         
-        if len(words) <= self.chunk_size:
+        if num_tokens <= self.chunk_size:
             return [text]
         
-        for i in range(0, len(words), self.chunk_size - self.chunk_overlap):
-            chunk_words = words[i:i + self.chunk_size]
-            chunk = ' '.join(chunk_words)
-            chunks.append(chunk)
-            
-            # Stop if we've processed all words
-            if i + self.chunk_size >= len(words):
-                break
+        # Window start tokens, stopping at the first window that reaches the last token
+        firsts = np.arange(0, num_tokens, self.chunk_size - self.chunk_overlap)
+        firsts = firsts[:np.argmax(firsts + self.chunk_size >= num_tokens) + 1]
+        lasts = np.minimum(firsts + self.chunk_size, num_tokens) - 1
         
-        return chunks
+        # One slice of the original text per window - no per-word lists or joins
+        return [
+            text[start:end]
+            for start, end in zip(spans[firsts, 0].tolist(), spans[lasts, 1].tolist())
+        ]
+    
+    def _batch_max_length(self, texts: List[str]) -> int:
+        """Token length of the longest text in a batch (incl. special tokens)
+        
+        Used as encode's max_length so tensors are padded to the batch's
+        longest text rather than the model's 8192-token limit.
+        """
+        lengths = self.tokenizer(texts, add_special_tokens=True, return_length=True)['length']
+        return min(MAX_SEQ_LENGTH, max(lengths))
+    
+    @staticmethod
+    def expand_product_data(product: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten the product_data JSON into product_info_json / details_arr / spec_items_arr
+        
+        The product dict is updated in place, so a product that is prepared
+        again (e.g. on re-index) is not parsed a second time. Callers that
+        already have the flat fields can pass them directly.
+        
+        Args:
+            product: Product dictionary with an optional product_data JSON
+        
+        Returns:
+            The same product dictionary
+        """
+        product_info, details, spec_items = {}, [], []
+        try:
+            # Already-decoded JSON (e.g. a JSONB column) is used as is
+            json_data = product.get('product_data') or {}
+            if isinstance(json_data, (str, bytes)):
+                json_data = orjson.loads(json_data)
+            product_info = json_data.get('product_info') or {}
+            details = list(json_data.get('details') or ())
+            spec_items = list(json_data.get('spec_items') or ())
+        except orjson.JSONDecodeError:
+            logger.warning(f"Failed to parse product_data JSON for product {product.get('id')}")
+        
+        product['product_info_json'] = product_info
+        product['details_arr'] = details
+        product['spec_items_arr'] = spec_items
+        return product
+    
+    def filter_chunks(self, chunks: List[str]) -> List[str]:
+        """Drop empty, whitespace-only, too short and repeated chunks of one product
+        
+        Chunks repeated across products are kept (each product needs its own
+        vector) but are encoded only once by generate_embeddings.
+        
+        Args:
+            chunks: Chunks of a single product, in order
+        
+        Returns:
+            Remaining chunks, in order
+        """
+        seen = set()
+        kept = []
+        for chunk in chunks:
+            if not chunk or len(chunk.split(maxsplit=MIN_CHUNK_WORDS)) < MIN_CHUNK_WORDS:
+                continue
+            key = hashlib.blake2b(chunk.encode('utf-8'), digest_size=16).digest()
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(chunk)
+        
+        self.skipped_chunks += len(chunks) - len(kept)
+        return kept
     
     def prepare_product_text(self, product: Dict[str, Any]) -> str:
         """Prepare product data as text for embedding
@@ -71,88 +269,89 @@ class EmbeddingProcessor:
         Returns:
             Formatted text string
         """
-        text_parts = []
-        
-        # Add product name
-        if product.get('name'):
-            text_parts.append(f"Product Name: {product['name']}")
+        # Top-level columns, in PRODUCT_TEXT_FIELDS order
+        text_parts = [f"{label}: {value}" for key, label in PRODUCT_TEXT_FIELDS if (value := product.get(key))]
         
-        # Add price
-        if product.get('price'):
-            text_parts.append(f"Price: {product['price']}")
+        # Flattened product_data fields (see expand_product_data)
+        if product.get('product_data') and 'details_arr' not in product:
+            self.expand_product_data(product)
         
-        # Add material
-        if product.get('material'):
-            text_parts.append(f"Material: {product['material']}")
+        # Add product info
+        text_parts.extend(
+            f"{_info_label(key)}: {value}"
+            for key, value in (product.get('product_info_json') or {}).items()
+            if value and key not in ('name', 'price')
+        )
         
-        # Add features
-        if product.get('features'):
-            text_parts.append(f"Features: {product['features']}")
-        
-        # Add description
-        if product.get('description'):
-            text_parts.append(f"Description: {product['description']}")
-        
-        # Parse and add JSON data if available
-        if product.get('product_data'):
-            try:
-                json_data = json.loads(product['product_data'])
-                
-                # Add product info
-                if 'product_info' in json_data:
-                    info = json_data['product_info']
-                    for key, value in info.items():
-                        if value and key not in ['name', 'price']:
-                            text_parts.append(f"{key.replace('_', ' ').title()}: {value}")
-                
-                # Add details
-                if 'details' in json_data:
-                    for detail in json_data['details']:
-                        if detail:
-                            text_parts.append(f"Detail: {detail}")
-                
-                # Add spec items
-                if 'spec_items' in json_data:
-                    for spec in json_data['spec_items']:
-                        if spec:
-                            text_parts.append(f"Specification: {spec}")
-            except json.JSONDecodeError:
-                logger.warning(f"Failed to parse product_data JSON for product {product.get('id')}")
+        # Add details and spec items
+        text_parts.extend(f"Detail: {detail}" for detail in product.get('details_arr') or () if detail)
+        text_parts.extend(f"Specification: {spec}" for spec in product.get('spec_items_arr') or () if spec)
         
         # Combine all parts
         full_text = " | ".join(text_parts)
         return full_text
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """Generate embeddings for a batch of texts
         
+        Duplicate texts (shared templates, boilerplate) are encoded once and
+        texts seen in earlier calls are served from the LRU cache.
+        
         Args:
             texts: List of text strings
         
         Returns:
-            List of embedding vectors
+            (len(texts) x dim) float32 array of embedding vectors
         """
         if not texts:
-            return []
+            return np.empty((0, 0), dtype=np.float32)
         
         try:
+            keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest() for text in texts]
+            
+            # Cache hits, then the unique texts still to encode (first occurrence order)
+            vectors = {}
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key in vectors or key in missing:
+                    continue
+                cached = self._embedding_cache.get(key)
+                if cached is not None:
+                    self._embedding_cache.move_to_end(key)
+                    vectors[key] = cached
+                else:
+                    missing[key] = text
+            
             # Process in batches
-            all_embeddings = []
+            missing_keys = list(missing)
+            key_batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+            text_batches = [[missing[key] for key in batch_keys] for batch_keys in key_batches]
             
-            for i in range(0, len(texts), self.batch_size):
-                batch_texts = texts[i:i + self.batch_size]
-                
-                # Generate embeddings using BGE-M3
-                embeddings = self.model.encode(
-                    batch_texts,
-                    batch_size=len(batch_texts),
-                    max_length=8192
-                )['dense_vecs']
-                
-                # Convert to list and extend
-                all_embeddings.extend(embeddings.tolist())
+            # Generate embeddings using BGE-M3
+            if self._pinned_encoder is not None:
+                batch_embeddings = self._pinned_encoder.encode(text_batches, MAX_SEQ_LENGTH)
+            else:
+                batch_embeddings = (
+                    self.model.encode(
+                        batch_texts,
+                        batch_size=len(batch_texts),
+                        max_length=self._batch_max_length(batch_texts)
+                    )['dense_vecs']
+                    for batch_texts in text_batches
+                )
+            
+            for batch_keys, embeddings in zip(key_batches, batch_embeddings):
+                for key, embedding in zip(batch_keys, embeddings):
+                    vectors[key] = embedding
+                    self._embedding_cache[key] = embedding
+            
+            while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
             
-            logger.info(f"Generated {len(all_embeddings)} embeddings")
+            # Scatter back to input order as one contiguous float32 matrix
+            all_embeddings = np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+            
+            logger.info(f"Generated {len(all_embeddings)} embeddings ({len(missing_keys)} encoded)")
             return all_embeddings
         except Exception as e:
             logger.error(f"Failed to generate embeddings: {e}")
@@ -171,8 +370,8 @@ class EmbeddingProcessor:
             # Prepare product text
             full_text = self.prepare_product_text(product)
             
-            # Chunk the text
-            chunks = self.chunk_text(full_text)
+            # Chunk the text, dropping chunks not worth encoding
+            chunks = self.filter_chunks(self.chunk_text(full_text))
             
             if not chunks:
                 logger.warning(f"No text to process for product {product.get('id')}")
@@ -197,25 +396,113 @@ class EmbeddingProcessor:
             logger.error(f"Failed to process product {product.get('id')}: {e}")
             raise
     
-    def process_batch(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Process a batch of products
+    def _embed_products(self, pending: List[Tuple[Dict[str, Any], List[str]]]) -> List[Dict[str, Any]]:
+        """Embed the chunks of several prepared products with one generate_embeddings call
+        
+        Falls back to one call per product if the batch fails, so a bad
+        product only loses its own chunks.
+        
+        Args:
+            pending: List of (product, chunks) tuples
+        
+        Returns:
+            List of chunk dictionaries with embeddings
+        """
+        try:
+            embeddings = self.generate_embeddings([chunk for _, chunks in pending for chunk in chunks])
+        except Exception as e:
+            logger.warning(f"Batch embedding failed, retrying per product: {e}")
+            embeddings = None
+        
+        results = []
+        offset = 0
+        for product, chunks in pending:
+            if embeddings is not None:
+                product_embeddings = embeddings[offset:offset + len(chunks)]
+                offset += len(chunks)
+            else:
+                try:
+                    product_embeddings = self.generate_embeddings(chunks)
+                except Exception as e:
+                    logger.error(f"Failed to process product {product.get('id')}: {e}")
+                    continue
+            
+            for idx, (chunk, embedding) in enumerate(zip(chunks, product_embeddings)):
+                results.append({
+                    'product_id': product['id'],
+                    'chunk_id': idx,
+                    'text': chunk,
+                    'embedding': embedding
+                })
+        
+        return results
+    
+    def process_batch(self, products: List[Dict[str, Any]],
+                      sink: Optional[Callable[[List[Dict[str, Any]]], Any]] = None) -> List[Dict[str, Any]]:
+        """Process a batch of products as a three-stage pipeline
+        
+        (a) a producer thread prepares and chunks products into a bounded queue,
+        (b) this thread encodes them in batches of ~batch_size chunks,
+        (c) each encoded batch is handed to `sink` (e.g. VectorIndexer.index_embeddings)
+        on a background thread, so CPU prep, GPU encode and storage overlap.
         
         Args:
             products: List of product dictionaries
+            sink: Optional callable receiving each list of embedded chunk dictionaries
         
         Returns:
             List of all chunk dictionaries with embeddings
         """
-        all_results = []
+        prepared: queue.Queue = queue.Queue(maxsize=PREP_QUEUE_SIZE)
         
-        for product in products:
+        def prepare():
             try:
-                results = self.process_product(product)
-                all_results.extend(results)
-            except Exception as e:
-                logger.error(f"Failed to process product {product.get('id')}: {e}")
-                continue
+                for product in products:
+                    try:
+                        chunks = self.filter_chunks(self.chunk_text(self.prepare_product_text(product)))
+                    except Exception as e:
+                        logger.error(f"Failed to process product {product.get('id')}: {e}")
+                        continue
+                    if not chunks:
+                        logger.warning(f"No text to process for product {product.get('id')}")
+                        continue
+                    prepared.put((product, chunks))
+            finally:
+                prepared.put(None)
+        
+        producer = threading.Thread(target=prepare, name="processor-prepare", daemon=True)
+        producer.start()
+        
+        all_results = []
+        sink_futures = []
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="processor-sink") as sink_pool:
+            pending = []
+            pending_chunks = 0
+            while True:
+                item = prepared.get()
+                if item is not None:
+                    pending.append(item)
+                    pending_chunks += len(item[1])
+                    if pending_chunks < self.batch_size:
+                        continue
+                
+                if pending:
+                    results = self._embed_products(pending)
+                    all_results.extend(results)
+                    if sink is not None and results:
+                        sink_futures.append(sink_pool.submit(sink, results))
+                    pending = []
+                    pending_chunks = 0
+                
+                if item is None:
+                    break
+            
+            for future in sink_futures:
+                future.result()
         
+        producer.join()
+        logger.info(f"Processed {len(products)} products into {len(all_results)} chunks "
+                    f"({self.skipped_chunks} chunks skipped so far)")
         return all_results
 
 # Singleton instance
@@ -0,0 +1,97 @@
+"""
+Text-Embeddings-Inference(TEI) HTTP 임베딩 클라이언트
+BGE-M3를 별도 TEI 서버에서 실행하여 서버 측 동적 배칭/FlashAttention 활용
+SentenceTransformerWrapper와 같은 인터페이스 제공 (embed_query, embed_documents_np 등)
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class TEIEmbeddings:
+    """TEI /embed 엔드포인트를 사용하는 임베딩 모델"""
+
+    # TEI 서버는 HTTP로 처리하므로 프로세스 풀 인코딩 경로 불필요
+    supports_multi_process = False
+
+    def __init__(self, url: str, batch_size: int = 32, timeout: float = 60.0):
+        """
+        Args:
+            url: TEI 서버 주소 (예: http://uncommon_rag-tei:80)
+            batch_size: 요청당 최대 텍스트 수 (TEI --max-client-batch-size 이하)
+            timeout: 요청 타임아웃(초)
+        """
+        self.url = url.rstrip('/')
+        self.batch_size = batch_size
+        self.device = 'tei'
+        limits = httpx.Limits(max_connections=16, max_keepalive_connections=16)
+        self.client = httpx.Client(base_url=self.url, timeout=timeout, limits=limits)
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+        info = self.client.get('/info').json()
+        logger.info(f"✅ TEI 연결: {self.url} (모델: {info.get('model_id')}, dtype: {info.get('model_dtype')})")
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.post('/embed', json={"inputs": texts, "normalize": True, "truncate": True})
+        response.raise_for_status()
+        return response.json()
+
+    def embed_query(self, text: str) -> List[float]:
+        """단일 쿼리 임베딩"""
+        return self._embed_batch([text])[0]
+
+    def embed_documents(self, texts: List[str], batch_size: int = 64, max_length: Optional[int] = None) -> List[List[float]]:
+        """여러 문서 임베딩 (langchain 호환 - Python 리스트 반환)"""
+        return self.embed_documents_np(texts, batch_size=batch_size, max_length=max_length).tolist()
+
+    def embed_documents_np(self, texts: List[str], batch_size: int = 64, max_length: Optional[int] = None) -> np.ndarray:
+        """
+        여러 문서 임베딩 - float32 ndarray 반환
+
+        batch_size/max_length는 인터페이스 호환용이며, 요청 크기는 self.batch_size,
+        최대 길이는 TEI 서버 설정(truncate)을 따릅니다.
+        """
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[i:i + self.batch_size]))
+        if not vectors:
+            return np.empty((0, 1024), dtype=np.float32)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_documents_mp(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """멀티 프로세스 경로 호환 - TEI에서는 일반 경로와 동일"""
+        return self.embed_documents_np(texts, batch_size=batch_size)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """비동기 문서 임베딩 - 배치 요청을 동시에 보내 TEI 서버 측에서 묶어 처리"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.url, timeout=self.client.timeout,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+            )
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            response = await self._async_client.post('/embed', json={"inputs": batch, "normalize": True, "truncate": True})
+            response.raise_for_status()
+            return response.json()
+
+        results = await asyncio.gather(*[
+            embed_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)
+        ])
+        return [vector for batch in results for vector in batch]
+
+    def close(self):
+        """HTTP 연결 풀 종료"""
+        self.client.close()
+
+    async def aclose(self):
+        """비동기 HTTP 연결 풀까지 종료"""
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -6,17 +6,28 @@
 import os
 import sys
 import json
+from typing import Optional
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, selectinload
 from dotenv import load_dotenv
 
 # 환경변수 로드
 load_dotenv('.env')
 
 # 프로젝트 모듈 임포트
-from database import Product, ProductImage
+from database import Product
 from text_chunker import ProductTextChunker
 
+def _clean(value) -> Optional[str]:
+    """JSONB 값을 "키: 값" 텍스트로 변환 - dict의 repr(따옴표/중괄호) 대신, 비어 있으면 None"""
+    if not value:
+        return None
+    if isinstance(value, dict):
+        return " ".join(f"{key}: {text}" for key, item in value.items() if (text := _clean(item))) or None
+    if isinstance(value, list):
+        return " ".join(text for item in value if (text := _clean(item))) or None
+    return str(value)
+
 def prepare_product_data(product: Product, images):
     """DB 제품 데이터를 청킹에 적합한 형태로 준비"""
     
@@ -25,7 +36,7 @@ def prepare_product_data(product: Product, images):
         'id': product.id,
         'name': product.product_name,
         'url': product.source_global_url or product.source_kr_url,
-        'price': str(product.price) if product.price else '',
+        'price': _clean(product.price) or '',
         'brand': 'UNCOMMON',
         'category': 'eyewear'
     }
@@ -37,23 +48,10 @@ def prepare_product_data(product: Product, images):
     if product.color:
         description_parts.append(f"색상: {product.color}")
     
-    # description 정보 (JSON 처리)
-    if product.description:
-        desc_str = str(product.description)
-        if desc_str and desc_str != '{}':
-            description_parts.append(f"설명: {desc_str}")
-    
-    # material 정보 (JSON 처리)  
-    if product.material:
-        material_str = str(product.material)
-        if material_str and material_str != '{}':
-            description_parts.append(f"재질: {material_str}")
-    
-    # size 정보 (JSON 처리)
-    if product.size:
-        size_str = str(product.size)
-        if size_str and size_str != '{}':
-            description_parts.append(f"사이즈: {size_str}")
+    # description / material / size 정보 (JSONB 처리)
+    for label, value in (('설명', product.description), ('재질', product.material), ('사이즈', product.size)):
+        if (text := _clean(value)):
+            description_parts.append(f"{label}: {text}")
     
     # 설명 통합
     product_data['description'] = " | ".join(description_parts) if description_parts else ""
@@ -65,7 +63,7 @@ def prepare_product_data(product: Product, images):
             image_info = {
                 'image_id': img.id,
                 'image_order': img.image_order or idx,
-                'size_bytes': len(img.image_data) if img.image_data else 0,
+                'size_bytes': img.size_bytes or 0,  # octet_length - 이미지 바이너리 로드 없음
                 'alt_text': f"제품 이미지 {idx + 1}",
                 'context': f"제품 {product.product_name}의 {idx + 1}번째 이미지"
             }
@@ -90,14 +88,18 @@ def main():
     # 청킹 모듈 초기화
     chunker = ProductTextChunker(chunk_size=500)
     
-    # 제품 조회 (ID 2)
-    product = db.query(Product).filter(Product.id == 2).first()
+    # 제품 조회 (ID 2) - 이미지는 selectinload로 함께 조회
+    product = (
+        db.query(Product)
+        .options(selectinload(Product.images))
+        .filter(Product.id == 2)
+        .first()
+    )
     if not product:
         print("❌ 제품 ID 2를 찾을 수 없습니다.")
         return
     
-    # 이미지 조회
-    images = db.query(ProductImage).filter(ProductImage.product_id == product.id).all()
+    images = product.images
     
     print(f"🔍 제품 분석: {product.product_name}")
     print(f"📊 제품 ID: {product.id}")
@@ -5,7 +5,7 @@
 
 import logging
 from typing import List, Dict, Any
-import json
+import orjson  # C 구현 JSON 파서
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +65,7 @@ class ProductTextChunker:
         # JSON 형태 정보 파싱
         try:
             if isinstance(product_data.get('data'), str):
-                data = json.loads(product_data['data'])
+                data = orjson.loads(product_data['data'])
             else:
                 data = product_data.get('data', {})
             
@@ -73,7 +73,7 @@ class ProductTextChunker:
                 for key, value in data.items():
                     if key in ['material', 'features', 'specifications', 'dimensions']:
                         content_parts.append(f"{key}: {value}")
-        except (json.JSONDecodeError, Exception):
+        except (orjson.JSONDecodeError, Exception):
             pass
         
         if not content_parts or len(content_parts) <= 1:
@@ -100,23 +100,27 @@ class ProductTextChunker:
         if not description:
             return chunks
         
+        # 단락별 단어 수는 한 번만 계산
+        paragraphs = description.split('\n\n')
+        word_counts = [len(paragraph.split()) for paragraph in paragraphs]
+        
         # 긴 설명의 경우 분할
-        if len(description.split()) > self.chunk_size:
-            # 단락별로 분할 시도
-            paragraphs = description.split('\n\n')
-            current_chunk = ""
-            
-            for paragraph in paragraphs:
-                if len((current_chunk + paragraph).split()) <= self.chunk_size:
-                    current_chunk += paragraph + "\n\n"
-                else:
-                    if current_chunk:
-                        chunks.append(self._create_description_chunk(current_chunk.strip(), product_data))
-                    current_chunk = paragraph + "\n\n"
-            
-            # 마지막 청크 처리
-            if current_chunk:
-                chunks.append(self._create_description_chunk(current_chunk.strip(), product_data))
+        if sum(word_counts) > self.chunk_size:
+            # 두 포인터로 chunk_size 단어 이내가 되도록 연속 단락 [i, j)를 묶음
+            i = 0
+            while i < len(paragraphs):
+                j = i
+                total = 0
+                while j < len(paragraphs) and total + word_counts[j] <= self.chunk_size:
+                    total += word_counts[j]
+                    j += 1
+                # 단락 하나가 chunk_size를 넘으면 단독 청크
+                j = max(j, i + 1)
+                
+                chunk_text = "\n\n".join(paragraphs[i:j]).strip()
+                if chunk_text:
+                    chunks.append(self._create_description_chunk(chunk_text, product_data))
+                i = j
         else:
             chunks.append(self._create_description_chunk(description, product_data))
         
@@ -186,4 +190,18 @@ class ProductTextChunker:
             
             chunks.append(ProductChunk(page_content=page_content, metadata=metadata))
         
-        return chunks
\ No newline at end of file
+        return chunks
+
+def chunk_products(chunker: ProductTextChunker, products_data: List[Dict[str, Any]]) -> List[Any]:
+    """
+    여러 제품을 한 번에 청킹 - 프로세스 풀 작업 단위 (피클 가능한 모듈 수준 함수)
+    
+    한 제품의 실패가 묶음 전체를 실패시키지 않도록 제품별 예외는 결과 자리에 그대로 반환
+    """
+    results = []
+    for product_data in products_data:
+        try:
+            results.append(chunker.chunk_product_data(product_data))
+        except Exception as e:
+            results.append(e)
+    return results
@@ -5,11 +5,33 @@ Milvus에 벡터 저장
 
 import os
 import logging
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set
+import numpy as np
 from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
 
 logger = logging.getLogger(__name__)
 
+# flush 지연 - 마지막 insert 후 FLUSH_INTERVAL초 또는 미반영 FLUSH_EVERY개 누적 시 1회
+FLUSH_INTERVAL = 5.0
+FLUSH_EVERY = 10000
+
+# index_embeddings_stream의 insert 단위
+STREAM_CHUNK = 1000
+
+# 제품 파티션 수 (product_id % NUM_PARTITIONS) - milvus_client와 같은 규칙
+NUM_PARTITIONS = 16
+
+# delete_products의 삭제 표현식당 최대 제품 수
+DELETE_BATCH = 1000
+
+# 결정적 기본 키 = product_id * CHUNK_ID_STRIDE + chunk_id (재인덱싱 시 upsert로 덮어쓰기)
+CHUNK_ID_STRIDE = 1 << 20
+
+def partition_name(product_id: int) -> str:
+    """제품 ID가 속한 파티션 이름 (part_00 ~ part_15)"""
+    return f"part_{product_id % NUM_PARTITIONS:02d}"
+
 class VectorIndexer:
     """Milvus 벡터 인덱서"""
     
@@ -19,6 +41,15 @@ class VectorIndexer:
         self.collection_name = os.environ['COLLECTION_NAME']
         self.dimension = int(os.environ['DIMENSION'])
         
+        # 지연 flush 상태
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
+        self._unflushed = 0
+        
+        # 스키마별 쓰기 방식 (setup_collection에서 결정)
+        self._upsert = False
+        self._partitioned = False
+        
         self.connect()
         self.setup_collection()
     
@@ -40,12 +71,28 @@ class VectorIndexer:
             self.create_collection()
             logger.info(f"Created collection: {self.collection_name}")
         
+        # 결정적 기본 키 스키마만 upsert 가능 (기존 auto_id 스키마는 insert)
+        self._upsert = not self.collection.schema.primary_field.auto_id
+        self._ensure_partitions()
+        
         self.collection.load()
     
+    def _ensure_partitions(self):
+        """part_00 ~ part_15 파티션 생성 - _default에 기존 데이터가 있으면 파티션 미사용"""
+        if self.collection.partition("_default").num_entities > 0:
+            logger.warning("Existing data in _default partition - partition pruning disabled (reindex required)")
+            return
+        existing = {partition.name for partition in self.collection.partitions}
+        for k in range(NUM_PARTITIONS):
+            name = f"part_{k:02d}"
+            if name not in existing:
+                self.collection.create_partition(name)
+        self._partitioned = True
+    
     def create_collection(self):
         """새 컬렉션 생성"""
         fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
             FieldSchema(name="product_id", dtype=DataType.INT64),
             FieldSchema(name="chunk_id", dtype=DataType.INT64),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=8192),
@@ -55,43 +102,137 @@ class VectorIndexer:
         schema = CollectionSchema(fields=fields, description="Product embeddings")
         self.collection = Collection(name=self.collection_name, schema=schema)
         
-        # 인덱스 생성
+        # 인덱스 생성 - HNSW 그래프 (IVF_FLAT의 클러스터 전수 스캔 대신 그래프 탐색)
         index_params = {
             "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128}
+            "index_type": "HNSW",
+            "params": {"M": 16, "efConstruction": 200}
         }
         self.collection.create_index(field_name="embedding", index_params=index_params)
     
-    def index_embeddings(self, embeddings_data: List[Dict[str, Any]]) -> int:
-        """임베딩 저장"""
+    def index_embeddings(self, embeddings_data: List[Dict[str, Any]], replaced: Optional[Set[int]] = None) -> int:
+        """
+        임베딩 저장 - 제품의 기존 벡터를 삭제한 뒤 저장 (청크 수가 줄어도 이전 청크가 남지 않음)
+        
+        Args:
+            embeddings_data: 제품별 청크 전체의 임베딩 목록
+            replaced: 이미 기존 벡터를 삭제한 제품 ID 집합 (스트림에서 여러 호출에 걸친 제품을 한 번만 삭제)
+        """
         if not embeddings_data:
             return 0
         
-        # 데이터 준비
+        # 데이터 준비 - 벡터는 연속 float32 행렬로 (요소별 float 변환 없이 직렬화)
         product_ids = [item['product_id'] for item in embeddings_data]
         chunk_ids = [item['chunk_id'] for item in embeddings_data]
         texts = [item['text'] for item in embeddings_data]
-        embeddings = [item['embedding'] for item in embeddings_data]
+        embeddings = np.stack([item['embedding'] for item in embeddings_data]).astype(np.float32, copy=False)
         
-        # 삽입
         entities = [product_ids, chunk_ids, texts, embeddings]
-        self.collection.insert(entities)
-        self.collection.flush()
+        if self._upsert:
+            entities.insert(0, [pid * CHUNK_ID_STRIDE + cid for pid, cid in zip(product_ids, chunk_ids)])
+        
+        # 기존 벡터 삭제 (이번 호출에서 처음 보는 제품만)
+        if replaced is None:
+            replaced = set()
+        stale = [pid for pid in dict.fromkeys(product_ids) if pid not in replaced]
+        if stale:
+            self.delete_products(stale)
+            replaced.update(stale)
+        
+        # 삽입 - 파티션별로 나눠 upsert (같은 청크 재인덱싱은 덮어쓰기)
+        # flush는 세그먼트를 봉인하는 무거운 RPC이므로 모아서 나중에 1회
+        write = self.collection.upsert if self._upsert else self.collection.insert
+        if self._partitioned:
+            groups = {}
+            for row, pid in enumerate(product_ids):
+                groups.setdefault(partition_name(pid), []).append(row)
+            for name, rows in groups.items():
+                write([_take(column, rows) for column in entities], partition_name=name)
+        else:
+            write(entities)
+        self._schedule_flush(len(embeddings_data))
         
         logger.info(f"Indexed {len(embeddings_data)} vectors")
         return len(embeddings_data)
     
+    def index_embeddings_stream(self, embeddings_data: Iterable[Dict[str, Any]]) -> Iterator[int]:
+        """임베딩 스트림 저장 - STREAM_CHUNK개 단위로 insert 후 누적 저장 수 반환"""
+        batch = []
+        total = 0
+        # STREAM_CHUNK 경계에 걸친 제품은 첫 배치에서만 기존 벡터 삭제
+        replaced: Set[int] = set()
+        for item in embeddings_data:
+            batch.append(item)
+            if len(batch) >= STREAM_CHUNK:
+                total += self.index_embeddings(batch, replaced)
+                batch = []
+                yield total
+        if batch:
+            total += self.index_embeddings(batch, replaced)
+            yield total
+    
+    def _schedule_flush(self, count: int):
+        """미반영 insert 누적 - FLUSH_EVERY개 이상이면 즉시, 아니면 FLUSH_INTERVAL초 뒤 flush"""
+        with self._flush_lock:
+            self._unflushed += count
+            flush_now = self._unflushed >= FLUSH_EVERY
+            if not flush_now and self._flush_timer is None:
+                self._flush_timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if flush_now:
+            self.flush()
+    
+    def flush(self):
+        """미반영 insert가 있으면 flush 1회"""
+        with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._unflushed == 0:
+                return
+            self._unflushed = 0
+        self.collection.flush()
+        logger.info("Flushed pending inserts")
+    
     def delete_product(self, product_id: int):
         """제품 벡터 삭제"""
-        expr = f"product_id == {product_id}"
-        self.collection.delete(expr)
-        self.collection.flush()
-        logger.info(f"Deleted vectors for product {product_id}")
+        self.delete_products([product_id])
+    
+    def delete_products(self, product_ids: Iterable[int]):
+        """
+        여러 제품 벡터 일괄 삭제 - 파티션별 `product_id in [...]` 삭제 (DELETE_BATCH개 단위)
+        
+        삭제는 flush 없이도 검색에 바로 반영되므로 flush는 지연 flush에 맡김
+        """
+        product_ids = list(dict.fromkeys(int(pid) for pid in product_ids))
+        if not product_ids:
+            return
+        
+        groups = {}
+        for pid in product_ids:
+            groups.setdefault(partition_name(pid) if self._partitioned else None, []).append(pid)
+        
+        for name, pids in groups.items():
+            for i in range(0, len(pids), DELETE_BATCH):
+                expr = f"product_id in {pids[i:i + DELETE_BATCH]}"
+                if name is None:
+                    self.collection.delete(expr)
+                else:
+                    # 파티션 범위 삭제 - 컬렉션 전체가 아닌 해당 파티션만 스캔
+                    self.collection.delete(expr, partition_name=name)
+        self._schedule_flush(len(product_ids))
+        logger.info(f"Deleted vectors for {len(product_ids)} products")
     
     def get_stats(self) -> Dict[str, Any]:
         """통계 반환"""
         return {
             "collection": self.collection_name,
             "num_entities": self.collection.num_entities
-        }
\ No newline at end of file
+        }
+
+def _take(column, rows: List[int]):
+    """컬럼에서 rows 행만 선택 (ndarray는 팬시 인덱싱, 리스트는 컴프리헨션)"""
+    if isinstance(column, np.ndarray):
+        return column[rows]
+    return [column[row] for row in rows]
@@ -4,14 +4,170 @@ BGE-M3 모델을 사용한 쿼리 임베딩 생성
 """
 
 import os
+import asyncio
+import functools
 import logging
-from typing import List, Union
+import threading
+from typing import List, Union, Optional
 from sentence_transformers import SentenceTransformer
 import torch
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# 쿼리 임베딩 동적 배칭 - 대기 시간 동안 모인 동시 쿼리를 한 번의 encode로 처리
+QUERY_BATCH_MAX = 32
+QUERY_BATCH_WAIT_MS = 10
+
+# GPU에서 인코더 torch.compile 적용 여부 (QUERY_CUDA_GRAPHS 사용 시 무시)
+EMBED_COMPILE = os.environ.get("EMBED_COMPILE", "true").lower() == "true"
+
+# CPU 모드에서 Linear 레이어 INT8 동적 양자화 적용 여부 - 기본 비활성
+# (인덱스는 FP32/FP16 벡터이므로 INT8 쿼리 벡터는 유사도가 어긋날 수 있음, 인덱싱과 함께 켤 때만 사용)
+QUANTIZE = os.environ.get("QUANTIZE", "false").lower() == "true"
+
+# GPU 단일 쿼리 경로 CUDA 그래프 사용 여부 + 캡처할 시퀀스 길이 버킷
+QUERY_CUDA_GRAPHS = os.environ.get("QUERY_CUDA_GRAPHS", "true").lower() == "true"
+QUERY_GRAPH_BUCKETS = (64, 128, 256, 512)
+
+def quantize_encoder_int8(model: SentenceTransformer) -> None:
+    """
+    CPU 추론용 INT8 동적 양자화 - 트랜스포머의 nn.Linear 가중치를 qint8로 변환
+    
+    FP32 대비 토큰당 메모리에서 읽는 가중치 바이트가 1/4로 줄고,
+    활성값은 실행 시점에 양자화되므로 별도 보정 데이터가 필요 없음
+    """
+    transformer = model[0]
+    transformer.auto_model = torch.quantization.quantize_dynamic(
+        transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    logger.info("✅ INT8 동적 양자화 적용 완료 (nn.Linear)")
+
+def compile_encoder(model: SentenceTransformer) -> bool:
+    """
+    트랜스포머 본체를 torch.compile로 감싸고 쿼리 배치 크기로 2회씩 워밍업 (실패 시 eager 유지)
+    
+    컴파일은 첫 forward 시점에 일어나므로 첫 요청 전에 그래프 캡처/커널 선택을 끝냄
+    """
+    transformer = model[0]
+    eager_module = transformer.auto_model
+    try:
+        # dynamic=True: 쿼리마다 다른 시퀀스 길이에 대해 재컴파일 최소화
+        # mode="default": encode가 to_thread 풀 스레드에서 실행되는데 reduce-overhead의 cudagraph 트리는 스레드별이라 사용 안 함
+        transformer.auto_model = torch.compile(eager_module, mode="default", dynamic=True, fullgraph=False)
+        with torch.inference_mode():
+            for batch_size in (1, QUERY_BATCH_MAX):
+                for _ in range(2):
+                    model.encode(["워밍업 쿼리"] * batch_size, batch_size=batch_size, show_progress_bar=False)
+        logger.info("✅ torch.compile 워밍업 완료")
+        return True
+    except Exception as e:
+        transformer.auto_model = eager_module
+        logger.warning(f"⚠️ torch.compile 실패, eager 모드로 실행: {str(e)}")
+        return False
+
+class QueryGraphRunner:
+    """
+    단일 쿼리 (1, L) 임베딩용 CUDA 그래프 - 길이 버킷별로 인코더 forward를 캡처하고 replay
+    
+    배치 1 쿼리는 커널 실행 시간보다 레이어별 커널 launch 오버헤드가 커서,
+    고정 shape 그래프 replay로 launch를 한 번에 처리
+    (BGE-M3: CLS 풀링 + L2 정규화까지 그래프에 포함)
+    """
+    
+    def __init__(self, model: SentenceTransformer, buckets=QUERY_GRAPH_BUCKETS):
+        transformer = model[0]
+        self.tokenizer = transformer.tokenizer
+        # 쿼리 그래프 사용 시 load_model이 torch.compile을 건너뛰므로 eager 모듈 그대로 캡처
+        self.encoder = transformer.auto_model
+        self.device = next(self.encoder.parameters()).device
+        self.buckets = tuple(sorted(buckets))
+        self._graphs = {}
+        # 정적 입력/출력 버퍼를 공유하므로 replay는 한 번에 하나씩
+        self._lock = threading.Lock()
+        
+        for length in self.buckets:
+            self._capture(length)
+        logger.info(f"✅ 쿼리 CUDA 그래프 캡처 완료 (버킷: {self.buckets})")
+    
+    def _forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        cls = self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0]
+        return torch.nn.functional.normalize(cls, p=2, dim=1)
+    
+    def _capture(self, length: int):
+        input_ids = torch.full((1, length), self.tokenizer.pad_token_id, dtype=torch.long, device=self.device)
+        attention_mask = torch.zeros((1, length), dtype=torch.long, device=self.device)
+        attention_mask[:, 0] = 1
+        
+        with torch.inference_mode():
+            # 사이드 스트림 워밍업 후 캡처 (cuBLAS 워크스페이스 등 할당을 캡처 밖에서 끝냄)
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(3):
+                    self._forward(input_ids, attention_mask)
+            torch.cuda.current_stream().wait_stream(stream)
+            
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                output = self._forward(input_ids, attention_mask)
+        self._graphs[length] = (graph, input_ids, attention_mask, output)
+    
+    def encode(self, text: str) -> Optional[np.ndarray]:
+        """
+        쿼리 1개 임베딩 (정규화된 1차원 float32 벡터)
+        
+        Returns:
+            가장 큰 버킷보다 긴 쿼리는 None (호출 측에서 일반 encode 사용)
+        """
+        ids = self.tokenizer(text, truncation=True, max_length=self.buckets[-1] + 1)["input_ids"]
+        length = next((bucket for bucket in self.buckets if len(ids) <= bucket), None)
+        if length is None:
+            return None
+        
+        tokens = torch.tensor(ids, dtype=torch.long)
+        with self._lock:
+            graph, input_ids, attention_mask, output = self._graphs[length]
+            input_ids.fill_(self.tokenizer.pad_token_id)
+            input_ids[0, :len(ids)].copy_(tokens)
+            attention_mask.zero_()
+            attention_mask[0, :len(ids)] = 1
+            graph.replay()
+            return output[0].float().cpu().numpy()
+
+@functools.lru_cache(maxsize=4)
+def load_query_graphs(model_name: str, device: str) -> Optional[QueryGraphRunner]:
+    """(모델, 디바이스)별 쿼리 CUDA 그래프 - CLS 풀링 모델이 아니거나 캡처 실패 시 None"""
+    if not (QUERY_CUDA_GRAPHS and device.startswith("cuda")):
+        return None
+    model = load_model(model_name, device)
+    pooling = model[1] if len(model) > 1 else None
+    if not getattr(pooling, "pooling_mode_cls_token", False):
+        logger.info("ℹ️ CLS 풀링 모델이 아니므로 쿼리 CUDA 그래프 미사용")
+        return None
+    try:
+        return QueryGraphRunner(model)
+    except Exception as e:
+        logger.warning(f"⚠️ 쿼리 CUDA 그래프 캡처 실패, 일반 encode 사용: {str(e)}")
+        return None
+
+@functools.lru_cache(maxsize=4)
+def load_model(model_name: str, device: str) -> SentenceTransformer:
+    """
+    (모델, 디바이스)별 단일 인스턴스 로드 - 여러 EmbeddingGenerator가 가중치/CUDA 컨텍스트 공유
+    
+    첫 로드 시 워밍업 encode로 cuBLAS/cuDNN 커널 선택을 미리 끝냄
+    """
+    model = SentenceTransformer(model_name, device=device)
+    model.eval()
+    if device == "cpu" and QUANTIZE:
+        quantize_encoder_int8(model)
+    elif device.startswith("cuda") and EMBED_COMPILE and not QUERY_CUDA_GRAPHS:
+        # CUDA 그래프 경로는 하나만 유지 - 쿼리 그래프(QueryGraphRunner)를 쓰면 컴파일 생략
+        compile_encoder(model)
+    model.encode("warmup", convert_to_numpy=True)
+    return model
+
 class EmbeddingGenerator:
     """BGE-M3 임베딩 생성기"""
     
@@ -28,14 +184,16 @@ class EmbeddingGenerator:
             self.device = "cpu"
             logger.info("💻 CPU 모드로 실행")
         
+        # 비동기 쿼리 배처 (첫 비동기 요청 시 이벤트 루프에서 워커 시작)
+        self._query_queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+        
         # 모델 로딩
         logger.info(f"📥 임베딩 모델 로딩: {self.model_name}")
         try:
-            self.model = SentenceTransformer(self.model_name, device=self.device)
-            
-            # 모델 테스트
-            test_embedding = self.model.encode("test", convert_to_numpy=True)
-            self.dimension = len(test_embedding)
+            self.model = load_model(self.model_name, self.device)
+            self.dimension = self.model.get_sentence_embedding_dimension()
+            self.query_graphs = load_query_graphs(self.model_name, self.device)
             
             logger.info(f"✅ 임베딩 모델 로딩 완료 (차원: {self.dimension})")
             
@@ -92,7 +250,7 @@ class EmbeddingGenerator:
             processed_query = query.strip()
             
             # 임베딩 생성
-            embedding = self.generate_embedding(processed_query, normalize=True)
+            embedding = self._encode_single_query(processed_query)
             
             # 리스트로 변환하여 반환
             return embedding.tolist()
@@ -101,6 +259,72 @@ class EmbeddingGenerator:
             logger.error(f"쿼리 임베딩 생성 실패: {str(e)}")
             raise
     
+    def _encode_single_query(self, query: str) -> np.ndarray:
+        """쿼리 1개 임베딩 - GPU에서는 CUDA 그래프 replay, 버킷 초과/CPU는 일반 encode"""
+        if self.query_graphs is not None:
+            embedding = self.query_graphs.encode(query)
+            if embedding is not None:
+                return embedding
+        return self.generate_embedding(query, normalize=True)
+    
+    async def generate_query_embedding_async(self, query: str) -> List[float]:
+        """
+        검색 쿼리용 임베딩 생성 (비동기 동적 배칭)
+        
+        QUERY_BATCH_WAIT_MS 안에 들어온 동시 쿼리를 최대 QUERY_BATCH_MAX개까지 묶어
+        encode 1회로 처리 - 배치 1 encode의 가중치 로드 비용을 여러 쿼리가 나눠 씀
+        
+        Args:
+            query: 검색 쿼리 문자열
+            
+        Returns:
+            리스트 형태의 임베딩 벡터
+        """
+        if self._batch_worker is None or self._batch_worker.done():
+            self._query_queue = asyncio.Queue()
+            self._batch_worker = asyncio.create_task(self._query_batch_loop())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._query_queue.put((query.strip(), future))
+        return await future
+    
+    async def _query_batch_loop(self):
+        """큐에서 쿼리를 모아 배치 임베딩 후 각 요청의 Future에 결과 전달"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._query_queue.get()]
+            deadline = loop.time() + QUERY_BATCH_WAIT_MS / 1000
+            while len(batch) < QUERY_BATCH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._query_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            texts = [text for text, _ in batch]
+            try:
+                if len(texts) == 1:
+                    embeddings = [await asyncio.to_thread(self._encode_single_query, texts[0])]
+                else:
+                    embeddings = await asyncio.to_thread(
+                        self.model.encode, texts,
+                        convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+                    )
+            except Exception as e:
+                logger.error(f"쿼리 배치 임베딩 실패: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            if len(batch) > 1:
+                logger.debug(f"쿼리 {len(batch)}개 배치 임베딩")
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding.tolist())
+    
     def batch_generate_embeddings(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """
         배치 단위로 임베딩 생성
@@ -0,0 +1,141 @@
+"""
+LLM 응답 캐시 - 완전 일치(temperature == 0) + 시맨틱
+같은 프롬프트, 또는 같은 컨텍스트에서 의미가 거의 같은 질문이 다시 오면 Ollama 호출 없이 저장된 응답 반환
+"""
+
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 시맨틱 캐시 사용 여부 / 유사도 임계값 / 최대 항목 수
+SEMANTIC_CACHE_ENABLED = os.environ.get("LLM_SEMANTIC_CACHE", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("LLM_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("LLM_SEMANTIC_CACHE_SIZE", "512"))
+
+# 이 온도 이하의 (결정적에 가까운) 요청만 캐시
+SEMANTIC_CACHE_MAX_TEMPERATURE = 0.3
+
+# 완전 일치 캐시 (temperature == 0 요청) 최대 항목 수 / 유효 시간(초)
+EXACT_CACHE_SIZE = 1024
+EXACT_CACHE_TTL = 3600
+
+class ExactResponseCache:
+    """
+    완전 일치 키 응답 캐시 (TTL + LRU) - 같은 프롬프트의 결정적(temperature == 0) 호출 재사용
+
+    조회/저장이 await 없이 끝나므로 이벤트 루프 안에서는 별도 락 불필요
+    """
+
+    def __init__(self, max_entries: int = EXACT_CACHE_SIZE, ttl: float = EXACT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # 키 → (저장 시각, 응답), 앞쪽이 가장 오래 사용되지 않은 항목
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(model: str, prompt: str, temperature: float, image_data: Optional[bytes] = None) -> str:
+        """모델/프롬프트/온도/이미지 해시로 만든 캐시 키"""
+        digest = hashlib.sha256()
+        for part in (model, prompt, repr(temperature)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        if image_data:
+            digest.update(hashlib.sha256(image_data).digest())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """유효한 캐시 응답 반환 (없거나 만료되면 None)"""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, response: str):
+        """응답 저장 - 최대 항목 수 초과 시 가장 오래 사용되지 않은 항목 제거"""
+        self._entries[key] = (time.monotonic(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class SemanticLLMCache:
+    """
+    질문 임베딩 코사인 유사도 기반 응답 캐시
+
+    질문은 임베딩으로 비교하고, 컨텍스트(검색된 제품 정보/이전 대화)와 모델은
+    해시(scope)로 정확히 일치해야 히트 - 다른 제품 정보로 만든 답변을 재사용하지 않음
+    """
+
+    def __init__(self, embed_fn: Callable[[str], Awaitable[List[float]]],
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_SIZE):
+        """
+        Args:
+            embed_fn: 텍스트 → 정규화된 임베딩 (EmbeddingGenerator.generate_query_embedding_async)
+            threshold: 히트로 판정할 최소 코사인 유사도
+            max_entries: 최대 캐시 항목 수 (초과 시 가장 오래 사용되지 않은 항목 교체)
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        # 슬롯별 임베딩 행렬 (첫 add 시 차원 확정) + 응답/scope 병렬 리스트
+        self._matrix: Optional[np.ndarray] = None
+        self._responses: List[Optional[str]] = [None] * max_entries
+        self._scopes: List[Optional[bytes]] = [None] * max_entries
+        # 사용 순서 (슬롯 → None), 앞쪽이 가장 오래 사용되지 않은 슬롯
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def scope(model: str, context: str) -> bytes:
+        """모델 + 컨텍스트 해시 - 같은 scope 안에서만 질문 유사도 비교"""
+        return hashlib.blake2b(f"{model}\0{context}".encode("utf-8"), digest_size=16).digest()
+
+    async def embed(self, text: str) -> np.ndarray:
+        """질문 임베딩 (float32, L2 정규화)"""
+        vector = np.asarray(await self.embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, scope: bytes, embedding: np.ndarray) -> Optional[str]:
+        """같은 scope의 항목 중 유사도가 임계값 이상인 가장 가까운 응답 반환 (없으면 None)"""
+        slots = [slot for slot in self._lru if self._scopes[slot] == scope]
+        if slots:
+            sims = self._matrix[slots] @ embedding
+            best = int(sims.argmax())
+            if sims[best] >= self.threshold:
+                slot = slots[best]
+                self._lru.move_to_end(slot)
+                self.stats["hits"] += 1
+                logger.info(f"💾 LLM 시맨틱 캐시 히트 (유사도 {sims[best]:.3f})")
+                return self._responses[slot]
+        self.stats["misses"] += 1
+        return None
+
+    def add(self, scope: bytes, embedding: np.ndarray, response: str):
+        """응답 저장 - 가득 차면 가장 오래 사용되지 않은 슬롯 재사용"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+
+        if len(self._lru) < self.max_entries:
+            slot = len(self._lru)
+        else:
+            slot, _ = self._lru.popitem(last=False)
+
+        self._matrix[slot] = embedding
+        self._responses[slot] = response
+        self._scopes[slot] = scope
+        self._lru[slot] = None
@@ -5,22 +5,234 @@ Ollama Gemma3 모델을 사용한 응답 생성
 
 import os
 import logging
-import requests
-import json
-from typing import AsyncGenerator, Optional, List, Dict, Any
-import aiohttp
+import orjson
+from typing import AsyncGenerator, Awaitable, Callable, Optional, List, Dict, Any, Tuple
+import httpx
 import asyncio
-import base64
+import pybase64
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import io
+import numpy as np
+from llm_cache import ExactResponseCache, SemanticLLMCache, SEMANTIC_CACHE_MAX_TEMPERATURE
 
 logger = logging.getLogger(__name__)
 
+# Ollama 연결 풀 설정 - 모든 요청이 keep-alive 연결을 재사용
+OLLAMA_MAX_CONNECTIONS = 128
+OLLAMA_MAX_KEEPALIVE = 64
+OLLAMA_KEEPALIVE_TIMEOUT = 75
+OLLAMA_READ_TIMEOUT = 300
+
+# 동시에 Ollama로 보내는 생성 요청 상한 (Ollama 병렬 슬롯 수) - 초과 요청은 Ollama 스케줄러 대신 클라이언트에서 대기
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+
+# 모델 메모리 유지 시간 (Ollama 기본 5분 후 언로드 → 다음 요청이 모델 재로딩 지연) - "30m" 같은 기간 또는 초 단위 숫자, 음수면 계속 유지
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE) if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit() else OLLAMA_KEEP_ALIVE
+# 유지 시간이 끝나기 전에 모델을 다시 로드 상태로 갱신하는 주기(초)
+OLLAMA_KEEPWARM_INTERVAL = int(os.environ.get("OLLAMA_KEEPWARM_INTERVAL", "1500"))
+
+# 처리된 이미지 캐시 최대 항목 수 (원본 해시 → (JPEG bytes, base64))
+IMAGE_CACHE_SIZE = 64
+
+# 미리 직렬화한 JSON 본문 전송용 헤더
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# 시스템 프롬프트 (고정) - /api/chat의 system 메시지로 보내 요청/대화 간 같은 프리픽스를 Ollama KV 캐시에서 재사용
+_SYSTEM_PROMPT = """당신은 UNCOMMON 안경 브랜드의 제품 전문가입니다.
+제공된 제품 정보를 바탕으로 고객의 질문에 친절하고 정확하게 답변해주세요."""
+_IMAGE_SYSTEM_PROMPT = """당신은 UNCOMMON 안경 브랜드의 제품 전문가입니다.
+사용자가 업로드한 이미지와 제품 정보를 함께 분석해서 질문에 답변해주세요.
+이미지를 자세히 분석하고, 제품 정보와 함께 고려해서 정확하고 도움이 되는 답변을 해주세요."""
+
+# user 메시지 템플릿 조각 (컨텍스트 + 질문)
+_USER_HEAD = "제품 정보:\n"
+_USER_MID = "\n\n고객 질문: "
+
+# 이미지 최대 크기 / JPEG 품질 - Ollama가 같은 호스트면 전송 대역폭이 병목이 아니므로 해상도/품질 우선
+IMAGE_MAX_SIZE = (1024, 1024)
+IMAGE_JPEG_QUALITY = 85
+LOCAL_IMAGE_MAX_SIZE = (2048, 2048)
+LOCAL_IMAGE_JPEG_QUALITY = 95
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# 이미지 리사이즈/JPEG 인코딩/base64 처리 스레드 수 (PIL은 처리 중 GIL 해제)
+IMAGE_WORKERS = 4
+
+# 진행 중인 동일 결정적(temperature == 0) 생성 요청 병합 - 대기 없이 바로 보내고, 같은 요청이 진행 중이면 그 응답 공유
+OLLAMA_COALESCE_ENABLED = os.environ.get("OLLAMA_COALESCE_ENABLED", "true").lower() == "true"
+
+async def iter_ndjson_lines(response: httpx.Response) -> AsyncGenerator[bytes, None]:
+    """
+    NDJSON 스트림을 줄 단위 bytes로 반환 - 소켓에서 받은 만큼씩 bytearray 버퍼에 모아 b"\\n" 위치로 분할
+    
+    줄마다 str 디코딩 없이 orjson.loads에 bytes를 바로 전달
+    (aiter_bytes에 chunk_size를 주면 그 크기가 찰 때까지 토큰 전달이 지연되므로 지정하지 않음)
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            if end > start:
+                yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+    if buffer.strip():
+        yield bytes(buffer)
+
+_CONTENT_KEY = b'"content":"'
+
+def _extract_content_fast(line: bytes) -> Optional[str]:
+    """
+    채팅 스트림 한 줄에서 message.content 문자열만 추출 - 전체 JSON 트리 생성 생략
+    
+    이스케이프가 없으면 UTF-8 디코딩만, 있으면 해당 문자열 조각만 orjson으로 해석
+    키를 찾지 못하거나 문자열이 끝나지 않으면 None (호출 측에서 전체 파싱)
+    """
+    i = line.find(_CONTENT_KEY)
+    if i < 0:
+        return None
+    start = i + len(_CONTENT_KEY) - 1  # 여는 따옴표 위치
+    end = start + 1
+    while True:
+        end = line.find(b'"', end)
+        if end < 0:
+            return None
+        # 앞의 역슬래시가 짝수 개면 이스케이프되지 않은 닫는 따옴표
+        k = end - 1
+        while line[k] == 0x5C:
+            k -= 1
+        if (end - 1 - k) % 2 == 0:
+            break
+        end += 1
+    raw = line[start:end + 1]
+    if b"\\" not in raw:
+        return raw[1:-1].decode("utf-8")
+    return orjson.loads(raw)
+
+def _flatten_alpha(image: Image.Image) -> Image.Image:
+    """RGBA/LA 이미지를 흰 배경에 합성한 RGB 이미지 - out = (rgb * a + 255 * (255 - a)) / 255 (정수 반올림)"""
+    arr = np.asarray(image.convert('RGBA'), dtype=np.uint16)
+    alpha = arr[..., 3:4]
+    rgb = (arr[..., :3] * alpha + 255 * (255 - alpha) + 127) // 255
+    return Image.fromarray(rgb.astype(np.uint8), 'RGB')
+
+def _peek_jpeg_size(data: bytes) -> Optional[Tuple[int, int, int]]:
+    """
+    JPEG 헤더의 SOF 마커만 읽어 (너비, 높이, 채널 수) 반환 - 픽셀 디코딩 없음
+    
+    JPEG가 아니거나 SOS(스캔 데이터) 전에 SOF를 찾지 못하면 None
+    """
+    if data[:3] != b"\xff\xd8\xff":
+        return None
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # 채움 바이트
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # 길이 필드가 없는 마커
+            i += 2
+            continue
+        if marker == 0xDA:
+            return None
+        # SOF0~SOF15 (DHT C4, JPG C8, DAC CC 제외)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if i + 10 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height, data[i + 9]
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+class GenerateCoalescer:
+    """
+    진행 중인 동일 비스트리밍 생성 요청(/api/chat) 병합기
+    
+    요청은 대기 없이 바로 보냄 - 공유 가능한(temperature == 0) 요청은 같은 본문의 요청이
+    진행 중이면 새로 보내지 않고 그 응답을 함께 기다림 (완전 일치 캐시가 채워지기 전의 동시 요청)
+    샘플링 요청(temperature > 0)은 본문이 같아도 호출자마다 따로 생성 (샘플 공유 시 분포가 달라짐)
+    """
+    
+    def __init__(self, post: Callable[[bytes], Awaitable[httpx.Response]]):
+        """
+        Args:
+            post: 요청 본문(JSON bytes) → Ollama 응답 (LLMClient의 공유 클라이언트 POST)
+        """
+        self.post = post
+        # 요청 본문 → 진행 중인 POST 태스크
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+    
+    async def submit(self, body: bytes, shared: bool = False) -> httpx.Response:
+        """
+        요청 전송 (진행 중인 같은 공유 요청이 있으면 그 응답 대기)
+        
+        Args:
+            body: 요청 본문 (JSON bytes)
+            shared: 같은 본문의 동시 요청과 응답을 공유해도 되는지 (결정적 생성일 때만 True)
+        """
+        if not shared:
+            return await self.post(body)
+        
+        task = self._inflight.get(body)
+        if task is None:
+            task = asyncio.ensure_future(self.post(body))
+            self._inflight[body] = task
+            task.add_done_callback(lambda done: self._finish(body, done))
+        else:
+            logger.info("🔗 진행 중인 동일 generate 요청에 합류")
+        # 한 호출자가 취소되어도 같은 응답을 기다리는 다른 호출자에게 영향 없도록 shield
+        return await asyncio.shield(task)
+    
+    def _finish(self, body: bytes, task: asyncio.Future):
+        """완료된 요청 제거 (모든 호출자가 취소된 경우의 예외도 여기서 회수)"""
+        self._inflight.pop(body, None)
+        if not task.cancelled():
+            task.exception()
+
 class LLMClient:
     """Ollama LLM 클라이언트"""
     
-    def __init__(self):
-        """LLM 클라이언트 초기화"""
+    # 모든 LLMClient 인스턴스가 공유하는 HTTP 클라이언트 (첫 요청 시 생성, aclose()로 종료)
+    _client: Optional[httpx.AsyncClient] = None
+    
+    # 생성 요청 동시 실행 슬롯 (모든 인스턴스 공유, 첫 요청 시 생성)
+    _slots: Optional[asyncio.Semaphore] = None
+    
+    # (서버 주소, 설정 모델) → 연결 테스트로 확인된 모델 이름
+    _resolved_models: Dict[Tuple[str, str], str] = {}
+    
+    # 이미지 처리 스레드 풀 (모든 인스턴스 공유)
+    _image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="llm-image")
+    
+    def __init__(self, cache: Optional[SemanticLLMCache] = None):
+        """
+        LLM 클라이언트 초기화
+        
+        Args:
+            cache: 응답 시맨틱 캐시 (None이면 캐시 미사용)
+        """
+        self.cache = cache
+        # temperature == 0 호출용 완전 일치 캐시 (임베딩 없이 해시 조회만)
+        self.exact_cache = ExactResponseCache()
+        # 이미지 처리 결과 LRU (멀티턴 대화에서 같은 이미지 재처리 방지)
+        self._image_cache: "OrderedDict[bytes, Tuple[bytes, str]]" = OrderedDict()
+        self._image_cache_lock = threading.Lock()
+        # 진행 중인 동일 generate 요청 병합기
+        self._coalescer = GenerateCoalescer(self._post_chat) if OLLAMA_COALESCE_ENABLED else None
+        # (모델, stream) → 요청 본문 앞부분 bytes
+        self._body_heads: Dict[Tuple[str, bool], bytes] = {}
         self.ollama_host = os.environ["OLLAMA_HOST"]
         self.ollama_port = os.environ["OLLAMA_PORT"]
         self.model_name = os.environ["OLLAMA_MODEL"]
@@ -33,15 +245,21 @@ class LLMClient:
         self.generate_url = f"{self.base_url}/api/generate"
         self.chat_url = f"{self.base_url}/api/chat"
         
-        # 연결 테스트
-        self._test_connection()
+        # 이미지 전처리 설정 (로컬 Ollama는 큰 해상도/고품질, 이미 작은 JPEG는 재인코딩 생략)
+        self._local_ollama = self.ollama_host in LOCAL_HOSTS
+        self.image_max_size = LOCAL_IMAGE_MAX_SIZE if self._local_ollama else IMAGE_MAX_SIZE
+        self.image_quality = LOCAL_IMAGE_JPEG_QUALITY if self._local_ollama else IMAGE_JPEG_QUALITY
+        
+        # 이미 확인된 모델 이름 재사용 (연결 테스트는 startup에서 비동기로 실행)
+        self.model_name = self._resolved_models.get((self.base_url, self.model_name), self.model_name)
     
-    def _test_connection(self):
-        """Ollama 서버 연결 테스트"""
+    async def test_connection_async(self):
+        """Ollama 서버 연결 테스트 (비동기) - 설정 모델이 없으면 사용 가능한 gemma3 모델 자동 선택"""
+        configured = self.model_name
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = await self._get_client().get(f"{self.base_url}/api/tags", timeout=5.0)
             if response.status_code == 200:
-                models = response.json().get("models", [])
+                models = orjson.loads(response.content).get("models", [])
                 model_names = [m.get("name", "") for m in models]
                 
                 logger.info(f"✅ Ollama 연결 성공! 설정 모델: {self.model_name}")
@@ -54,6 +272,8 @@ class LLMClient:
                     if gemma3_models:
                         self.model_name = gemma3_models[0]
                         logger.info(f"🔄 자동 선택된 모델: {self.model_name}")
+                # 확인된 모델 이름 기억 - 이후 생성되는 클라이언트는 재확인 생략
+                LLMClient._resolved_models[(self.base_url, configured)] = self.model_name
             else:
                 logger.warning(f"⚠️ Ollama 서버 응답 오류: {response.status_code}")
                 
@@ -61,58 +281,154 @@ class LLMClient:
             logger.error(f"❌ Ollama 연결 실패: {str(e)}")
             logger.info("로컬 Ollama를 사용하거나 원격 서버 설정을 확인하세요")
     
-    def _build_prompt(self, query: str, context: str, has_image: bool = False) -> str:
-        """프롬프트 구성"""
-        if has_image:
-            prompt = f"""당신은 UNCOMMON 안경 브랜드의 제품 전문가입니다. 
-사용자가 업로드한 이미지와 제품 정보를 함께 분석해서 질문에 답변해주세요.
-
-제품 정보:
-{context}
-
-고객 질문: {query}
-
-이미지를 자세히 분석하고, 제품 정보와 함께 고려해서 정확하고 도움이 되는 답변을 해주세요.
-
-답변:"""
-        else:
-            prompt = f"""당신은 UNCOMMON 안경 브랜드의 제품 전문가입니다. 
-제공된 제품 정보를 바탕으로 고객의 질문에 친절하고 정확하게 답변해주세요.
-
-제품 정보:
-{context}
-
-고객 질문: {query}
-
-답변:"""
-        return prompt
+    async def keep_warm(self):
+        """
+        모델 상주 유지 루프 - 빈 프롬프트 /api/generate로 모델을 로드하고 keep_alive 타이머 갱신
+        
+        OLLAMA_KEEPWARM_INTERVAL마다 반복 (keep_alive가 음수면 한 번 로드 후 종료)
+        """
+        while True:
+            try:
+                body = orjson.dumps({"model": self.model_name, "prompt": "", "keep_alive": _KEEP_ALIVE})
+                response = await self._get_client().post(f"{self.base_url}/api/generate", content=body, headers=_JSON_HEADERS)
+                if response.status_code == 200:
+                    logger.info(f"🔥 모델 '{self.model_name}' 상주 갱신 (keep_alive: {_KEEP_ALIVE})")
+                else:
+                    logger.warning(f"⚠️ 모델 상주 갱신 응답 오류: {response.status_code}")
+            except Exception as e:
+                logger.warning(f"⚠️ 모델 상주 갱신 실패: {str(e)}")
+            
+            if isinstance(_KEEP_ALIVE, int) and _KEEP_ALIVE < 0:
+                return
+            await asyncio.sleep(OLLAMA_KEEPWARM_INTERVAL)
+    
+    @classmethod
+    def _get_client(cls) -> httpx.AsyncClient:
+        """keep-alive 연결 풀을 가진 공유 클라이언트 반환 - 요청마다 TCP 연결/DNS 조회 생략"""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+                    keepalive_expiry=OLLAMA_KEEPALIVE_TIMEOUT
+                ),
+                # 생성은 오래 걸릴 수 있으므로 읽기 간격만 길게 제한
+                timeout=httpx.Timeout(10.0, read=OLLAMA_READ_TIMEOUT)
+            )
+        return cls._client
+    
+    @classmethod
+    def _generation_slots(cls) -> asyncio.Semaphore:
+        """Ollama 생성 요청 동시 실행 세마포어 반환 (OLLAMA_NUM_PARALLEL개)"""
+        if cls._slots is None:
+            cls._slots = asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+        return cls._slots
+    
+    @classmethod
+    async def aclose(cls):
+        """공유 HTTP 클라이언트 종료"""
+        if cls._client is not None and not cls._client.is_closed:
+            await cls._client.aclose()
+        cls._client = None
+    
+    def _chat_body(self, messages: List[Dict[str, Any]], temperature: float, stream: bool, seed: Optional[int] = None) -> bytes:
+        """
+        /api/chat 요청 본문(JSON bytes) - 고정 필드(model/keep_alive/stream) 조각은 모델별로 한 번만 만들고
+        요청마다 메시지와 옵션만 orjson으로 직렬화해 이어 붙임
+        """
+        key = (self.model_name, stream)
+        head = self._body_heads.get(key)
+        if head is None:
+            head = b"".join((
+                b'{"model":', orjson.dumps(self.model_name),
+                b',"keep_alive":', orjson.dumps(_KEEP_ALIVE),
+                b',"stream":', b"true" if stream else b"false",
+                b',"messages":'
+            ))
+            self._body_heads[key] = head
+        options = {"temperature": temperature} if seed is None else {"temperature": temperature, "seed": seed}
+        return b"".join((head, orjson.dumps(messages), b',"options":', orjson.dumps(options), b"}"))
+    
+    async def _post_chat(self, body: bytes) -> httpx.Response:
+        """/api/chat 비스트리밍 POST (응답 본문까지 수신, 생성 슬롯이 빌 때까지 대기)"""
+        async with self._generation_slots():
+            return await self._get_client().post(self.chat_url, content=body, headers=_JSON_HEADERS)
+    
+    async def _cache_lookup(self, question: str, context: str, temperature: float) -> Tuple[Optional[str], Optional[Tuple[bytes, np.ndarray]]]:
+        """
+        시맨틱 캐시 조회
+        
+        Returns:
+            (캐시된 응답 또는 None, 미스 시 응답 저장에 쓸 (scope, 임베딩) 또는 None)
+        """
+        if self.cache is None or temperature > SEMANTIC_CACHE_MAX_TEMPERATURE or not question:
+            return None, None
+        try:
+            scope = self.cache.scope(self.model_name, context)
+            embedding = await self.cache.embed(question)
+        except Exception as e:
+            logger.warning(f"⚠️ LLM 캐시 임베딩 실패, 캐시 없이 진행: {str(e)}")
+            return None, None
+        return self.cache.lookup(scope, embedding), (scope, embedding)
+    
+    def _build_messages(self, query: str, context: str, image_b64: Optional[str] = None) -> List[Dict[str, Any]]:
+        """채팅 메시지 구성 - 고정 system 메시지 + 컨텍스트/질문 user 메시지 (이미지는 user 메시지에 첨부)"""
+        user = {"role": "user", "content": "".join((_USER_HEAD, context, _USER_MID, query))}
+        if image_b64 is not None:
+            user["images"] = [image_b64]
+        system = _IMAGE_SYSTEM_PROMPT if image_b64 is not None else _SYSTEM_PROMPT
+        return [{"role": "system", "content": system}, user]
     
     def _encode_image(self, image_data: bytes) -> str:
-        """이미지를 base64로 인코딩"""
-        return base64.b64encode(image_data).decode('utf-8')
+        """이미지를 base64로 인코딩 (SIMD 인코더, bytes → str 디코딩 없이 바로 문자열)"""
+        return pybase64.b64encode_as_string(image_data)
+    
+    async def _prepare_image(self, image_data: bytes) -> str:
+        """업로드 이미지 → Ollama 전송용 base64 (캐시 조회/리사이즈/인코딩 모두 이미지 스레드 풀에서 실행)"""
+        return await asyncio.get_running_loop().run_in_executor(self._image_pool, self._image_b64, image_data)
+    
+    def _image_b64(self, image_data: bytes) -> str:
+        """이미지 처리 + base64 인코딩 결과 반환 - 원본 내용 해시 기준 LRU 캐시 (스레드 풀에서 호출)"""
+        key = hashlib.blake2b(image_data, digest_size=16).digest()
+        with self._image_cache_lock:
+            cached = self._image_cache.get(key)
+            if cached is not None:
+                self._image_cache.move_to_end(key)
+                return cached[1]
+        
+        processed_image = self._process_image(image_data)
+        image_b64 = self._encode_image(processed_image)
+        with self._image_cache_lock:
+            self._image_cache[key] = (processed_image, image_b64)
+            if len(self._image_cache) > IMAGE_CACHE_SIZE:
+                self._image_cache.popitem(last=False)
+        return image_b64
     
-    def _process_image(self, image_data: bytes, max_size: tuple = (1024, 1024)) -> bytes:
+    def _process_image(self, image_data: bytes, max_size: Optional[tuple] = None) -> bytes:
         """이미지 크기 조정 및 최적화"""
+        max_size = max_size or self.image_max_size
         try:
-            # PIL Image로 변환
+            # 이미 크기 이내인 컬러(3채널) JPEG는 PIL을 거치지 않고 원본 전송 (SOF 헤더만 확인)
+            jpeg = _peek_jpeg_size(image_data)
+            if jpeg is not None and jpeg[2] == 3 and 0 < jpeg[0] <= max_size[0] and 0 < jpeg[1] <= max_size[1]:
+                return image_data
+            
+            # PIL Image로 변환 (헤더만 읽음, 픽셀 디코딩은 실제 사용 시점)
             image = Image.open(io.BytesIO(image_data))
             
-            # RGBA -> RGB 변환 (JPEG 호환성)
+            # 크기 조정 (알파 합성보다 먼저 - 줄어든 픽셀만 합성)
+            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+            
+            # RGBA -> RGB 변환 (JPEG 호환성) - 흰 배경 알파 합성을 numpy 벡터 연산 한 번으로
             if image.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'LA':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1])
-                image = background
+                image = _flatten_alpha(image)
             elif image.mode != 'RGB':
                 image = image.convert('RGB')
             
-            # 크기 조정
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
             # JPEG로 압축
             output = io.BytesIO()
-            image.save(output, format='JPEG', quality=85, optimize=True)
+            image.save(output, format='JPEG', quality=self.image_quality, optimize=True)
             return output.getvalue()
             
         except Exception as e:
@@ -133,35 +449,86 @@ class LLMClient:
             생성된 응답 텍스트
         """
         try:
+            # 결정적 호출은 같은 (질문, 컨텍스트, 이미지) 응답을 그대로 재사용
+            exact_key = None
+            if temperature == 0:
+                exact_key = self.exact_cache.key(self.model_name, f"{query}\0{context}", temperature, image_data)
+                cached = self.exact_cache.get(exact_key)
+                if cached is not None:
+                    return cached
+            
             # 이미지가 있는 경우 채팅 API 사용
             if image_data:
-                return await self._generate_with_image(query, context, temperature, image_data, stream=False)
+                return await self._generate_with_image(query, context, temperature, image_data, stream=False, exact_key=exact_key)
             
-            # 텍스트만 있는 경우 기존 방식
-            prompt = self._build_prompt(query, context)
+            # 텍스트만 있는 경우 - 같은 컨텍스트의 유사 질문 응답이 캐시에 있으면 재사용
+            cached, cache_entry = await self._cache_lookup(query, context, temperature)
+            if cached is not None:
+                return cached
             
-            payload = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "temperature": temperature,
-                "stream": False
-            }
+            body = self._chat_body(self._build_messages(query, context), temperature, stream=False)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.generate_url, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get("response", "응답을 생성할 수 없습니다.")
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ollama API 오류: {response.status} - {error_text}")
-                        return "죄송합니다. 응답 생성 중 오류가 발생했습니다."
-                        
+            if self._coalescer is not None:
+                # 결정적 생성(temperature == 0)만 같은 본문의 진행 중 요청과 응답 공유
+                response = await self._coalescer.submit(body, shared=temperature == 0)
+            else:
+                response = await self._post_chat(body)
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                answer = result.get("message", {}).get("content")
+                if answer:
+                    if cache_entry is not None:
+                        self.cache.add(*cache_entry, answer)
+                    if exact_key is not None:
+                        self.exact_cache.put(exact_key, answer)
+                return answer or "응답을 생성할 수 없습니다."
+            else:
+                error_text = response.text
+                logger.error(f"Ollama API 오류: {response.status_code} - {error_text}")
+                return "죄송합니다. 응답 생성 중 오류가 발생했습니다."
+                    
         except Exception as e:
             logger.error(f"응답 생성 실패: {str(e)}")
             return f"응답 생성 중 오류가 발생했습니다: {str(e)}"
     
-    async def _generate_with_image(self, query: str, context: str, temperature: float, image_data: bytes, stream: bool = False) -> str:
+    async def generate_n(self, query: str, context: str, n: int = 3, temperature: float = 0.7) -> List[str]:
+        """
+        같은 질문/컨텍스트로 응답 후보 n개 생성
+        
+        n개 요청을 공유 연결 풀로 동시에 보내 Ollama 병렬 슬롯(OLLAMA_NUM_PARALLEL)에서 함께 디코딩
+        (같은 프롬프트 프리픽스는 KV 캐시 재사용) - 호출마다 무작위 기준 seed에서 후보별로 달리해 서로 다른 샘플 생성
+        
+        Args:
+            query: 사용자 질문
+            context: 검색된 컨텍스트
+            n: 후보 수
+            temperature: 생성 온도
+            
+        Returns:
+            생성에 성공한 응답 텍스트 리스트 (요청 순서)
+        """
+        messages = self._build_messages(query, context)
+        
+        async def draft(seed: int) -> Optional[str]:
+            response = await self._post_chat(self._chat_body(messages, temperature, stream=False, seed=seed))
+            if response.status_code != 200:
+                logger.error(f"Ollama 후보 생성 오류: {response.status_code} - {response.text}")
+                return None
+            return orjson.loads(response.content).get("message", {}).get("content") or None
+        
+        # 고정 seed(0..n-1)면 같은 질문에 매번 같은 후보가 나오므로 호출마다 기준 seed를 새로 뽑음
+        base_seed = random.getrandbits(31)
+        results = await asyncio.gather(*(draft(base_seed + i) for i in range(n)), return_exceptions=True)
+        drafts = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"후보 생성 실패: {str(result)}")
+            elif result:
+                drafts.append(result)
+        return drafts
+    
+    async def _generate_with_image(self, query: str, context: str, temperature: float, image_data: bytes, stream: bool = False,
+                                   exact_key: Optional[str] = None) -> str:
         """
         이미지를 포함한 응답 생성
         
@@ -171,45 +538,36 @@ class LLMClient:
             temperature: 생성 온도
             image_data: 이미지 바이트 데이터
             stream: 스트리밍 여부
+            exact_key: 성공한 응답을 저장할 완전 일치 캐시 키 (선택사항)
             
         Returns:
             생성된 응답 텍스트
         """
         try:
-            # 이미지 처리 및 인코딩
-            processed_image = self._process_image(image_data)
-            image_b64 = self._encode_image(processed_image)
+            # 이미지 처리 및 인코딩 (같은 이미지는 캐시된 결과 사용)
+            image_b64 = await self._prepare_image(image_data)
             
             # 채팅 메시지 구성
-            messages = [
-                {
-                    "role": "user",
-                    "content": self._build_prompt(query, context, has_image=True),
-                    "images": [image_b64]
-                }
-            ]
+            messages = self._build_messages(query, context, image_b64)
             
-            payload = {
-                "model": self.model_name,
-                "messages": messages,
-                "temperature": temperature,
-                "stream": stream
-            }
+            body = self._chat_body(messages, temperature, stream=stream)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.chat_url, json=payload) as response:
-                    if response.status == 200:
-                        if stream:
-                            # 스트리밍 처리는 별도 메소드에서
-                            return ""
-                        else:
-                            result = await response.json()
-                            return result.get("message", {}).get("content", "이미지 분석 응답을 생성할 수 없습니다.")
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ollama 이미지 API 오류: {response.status} - {error_text}")
-                        return "이미지 분석 중 오류가 발생했습니다."
-                        
+            response = await self._post_chat(body)
+            if response.status_code == 200:
+                if stream:
+                    # 스트리밍 처리는 별도 메소드에서
+                    return ""
+                else:
+                    result = orjson.loads(response.content)
+                    answer = result.get("message", {}).get("content")
+                    if answer and exact_key is not None:
+                        self.exact_cache.put(exact_key, answer)
+                    return answer or "이미지 분석 응답을 생성할 수 없습니다."
+            else:
+                error_text = response.text
+                logger.error(f"Ollama 이미지 API 오류: {response.status_code} - {error_text}")
+                return "이미지 분석 중 오류가 발생했습니다."
+                    
         except Exception as e:
             logger.error(f"이미지 분석 실패: {str(e)}")
             return f"이미지 분석 중 오류가 발생했습니다: {str(e)}"
@@ -234,41 +592,42 @@ class LLMClient:
                     yield chunk
                 return
             
-            # 텍스트만 있는 경우 기존 방식
-            prompt = self._build_prompt(query, context)
-            
-            payload = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "temperature": temperature,
-                "stream": True
-            }
+            # 텍스트만 있는 경우 - system/user 메시지로 채팅 API 스트리밍
+            body = self._chat_body(self._build_messages(query, context), temperature, stream=True)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.generate_url, json=payload) as response:
-                    if response.status == 200:
-                        async for line in response.content:
-                            if line:
-                                try:
-                                    # NDJSON 파싱
-                                    data = json.loads(line.decode('utf-8'))
-                                    if "response" in data:
-                                        yield data["response"]
-                                    
-                                    # 종료 확인
-                                    if data.get("done", False):
+            client = self._get_client()
+            async with self._generation_slots(), client.stream("POST", self.chat_url, content=body, headers=_JSON_HEADERS) as response:
+                if response.status_code == 200:
+                    async for line in iter_ndjson_lines(response):
+                        if line:
+                            try:
+                                # 빠른 경로: message.content 문자열만 잘라서 사용
+                                content = _extract_content_fast(line)
+                                if content is not None:
+                                    yield content
+                                    if b'"done":true' in line:
                                         break
-                                        
-                                except json.JSONDecodeError:
-                                    continue
-                                except Exception as e:
-                                    logger.error(f"스트리밍 파싱 오류: {str(e)}")
                                     continue
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ollama 스트리밍 오류: {response.status} - {error_text}")
-                        yield "스트리밍 응답 생성 중 오류가 발생했습니다."
-                        
+                                
+                                # NDJSON 파싱
+                                data = orjson.loads(line)
+                                if "message" in data and "content" in data["message"]:
+                                    yield data["message"]["content"]
+                                
+                                # 종료 확인
+                                if data.get("done", False):
+                                    break
+                                    
+                            except orjson.JSONDecodeError:
+                                continue
+                            except Exception as e:
+                                logger.error(f"스트리밍 파싱 오류: {str(e)}")
+                                continue
+                else:
+                    error_text = (await response.aread()).decode('utf-8', errors='replace')
+                    logger.error(f"Ollama 스트리밍 오류: {response.status_code} - {error_text}")
+                    yield "스트리밍 응답 생성 중 오류가 발생했습니다."
+                    
         except Exception as e:
             logger.error(f"스트리밍 생성 실패: {str(e)}")
             yield f"스트리밍 오류: {str(e)}"
@@ -287,51 +646,47 @@ class LLMClient:
             생성된 텍스트 청크
         """
         try:
-            # 이미지 처리 및 인코딩
-            processed_image = self._process_image(image_data)
-            image_b64 = self._encode_image(processed_image)
+            # 이미지 처리 및 인코딩 (같은 이미지는 캐시된 결과 사용)
+            image_b64 = await self._prepare_image(image_data)
             
             # 채팅 메시지 구성
-            messages = [
-                {
-                    "role": "user",
-                    "content": self._build_prompt(query, context, has_image=True),
-                    "images": [image_b64]
-                }
-            ]
+            messages = self._build_messages(query, context, image_b64)
             
-            payload = {
-                "model": self.model_name,
-                "messages": messages,
-                "temperature": temperature,
-                "stream": True
-            }
+            body = self._chat_body(messages, temperature, stream=True)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.chat_url, json=payload) as response:
-                    if response.status == 200:
-                        async for line in response.content:
-                            if line:
-                                try:
-                                    # NDJSON 파싱
-                                    data = json.loads(line.decode('utf-8'))
-                                    if "message" in data and "content" in data["message"]:
-                                        yield data["message"]["content"]
-                                    
-                                    # 종료 확인
-                                    if data.get("done", False):
+            client = self._get_client()
+            async with self._generation_slots(), client.stream("POST", self.chat_url, content=body, headers=_JSON_HEADERS) as response:
+                if response.status_code == 200:
+                    async for line in iter_ndjson_lines(response):
+                        if line:
+                            try:
+                                # 빠른 경로: message.content 문자열만 잘라서 사용
+                                content = _extract_content_fast(line)
+                                if content is not None:
+                                    yield content
+                                    if b'"done":true' in line:
                                         break
-                                        
-                                except json.JSONDecodeError:
                                     continue
-                                except Exception as e:
-                                    logger.error(f"이미지 스트리밍 파싱 오류: {str(e)}")
-                                    continue
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ollama 이미지 스트리밍 오류: {response.status} - {error_text}")
-                        yield "이미지 스트리밍 응답 생성 중 오류가 발생했습니다."
-                        
+                                
+                                # NDJSON 파싱
+                                data = orjson.loads(line)
+                                if "message" in data and "content" in data["message"]:
+                                    yield data["message"]["content"]
+                                
+                                # 종료 확인
+                                if data.get("done", False):
+                                    break
+                                    
+                            except orjson.JSONDecodeError:
+                                continue
+                            except Exception as e:
+                                logger.error(f"이미지 스트리밍 파싱 오류: {str(e)}")
+                                continue
+                else:
+                    error_text = (await response.aread()).decode('utf-8', errors='replace')
+                    logger.error(f"Ollama 이미지 스트리밍 오류: {response.status_code} - {error_text}")
+                    yield "이미지 스트리밍 응답 생성 중 오류가 발생했습니다."
+                    
         except Exception as e:
             logger.error(f"이미지 스트리밍 생성 실패: {str(e)}")
             yield f"이미지 스트리밍 오류: {str(e)}"
@@ -348,23 +703,39 @@ class LLMClient:
             생성된 응답
         """
         try:
-            payload = {
-                "model": self.model_name,
-                "messages": messages,
-                "temperature": temperature,
-                "stream": False
-            }
+            # 결정적 호출은 같은 대화의 응답을 그대로 재사용
+            exact_key = None
+            if temperature == 0:
+                exact_key = self.exact_cache.key(self.model_name, orjson.dumps(messages, option=orjson.OPT_SORT_KEYS).decode(), temperature)
+                cached = self.exact_cache.get(exact_key)
+                if cached is not None:
+                    return cached
+            
+            # 마지막 메시지 내용은 임베딩으로, 이전 대화는 scope로 캐시 조회 (이미지 포함 메시지는 제외)
+            cached, cache_entry = None, None
+            if messages and not messages[-1].get("images"):
+                history = orjson.dumps(messages[:-1], option=orjson.OPT_SORT_KEYS).decode()
+                cached, cache_entry = await self._cache_lookup(messages[-1].get("content", ""), history, temperature)
+                if cached is not None:
+                    return cached
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.chat_url, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get("message", {}).get("content", "응답을 생성할 수 없습니다.")
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ollama 채팅 오류: {response.status} - {error_text}")
-                        return "채팅 응답 생성 중 오류가 발생했습니다."
-                        
+            body = self._chat_body(messages, temperature, stream=False)
+            
+            response = await self._post_chat(body)
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                answer = result.get("message", {}).get("content")
+                if answer:
+                    if cache_entry is not None:
+                        self.cache.add(*cache_entry, answer)
+                    if exact_key is not None:
+                        self.exact_cache.put(exact_key, answer)
+                return answer or "응답을 생성할 수 없습니다."
+            else:
+                error_text = response.text
+                logger.error(f"Ollama 채팅 오류: {response.status_code} - {error_text}")
+                return "채팅 응답 생성 중 오류가 발생했습니다."
+                    
         except Exception as e:
             logger.error(f"채팅 생성 실패: {str(e)}")
             return f"채팅 오류: {str(e)}"
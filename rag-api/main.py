@@ -9,26 +9,37 @@ UNCOMMON RAG API Service - BGE-M3 벡터 검색 + Ollama LLM 기반 제품 정
 
 import os
 import logging  # API 요청 및 오류 로깅
-from typing import List, Dict, Any, Optional
+from typing import AsyncGenerator, AsyncIterator, Callable, List, Dict, Any, NamedTuple, Optional
 from fastapi import FastAPI, HTTPException, Depends, status, Form, File, UploadFile
 from fastapi.responses import StreamingResponse  # 실시간 스트리밍 응답
 from fastapi.middleware.cors import CORSMiddleware  # 크로스 도메인 요청 처리
 from pydantic import BaseModel  # API 데이터 모델 정의
 from dotenv import load_dotenv  # 환경변수 로드
-import json
+import orjson
 import asyncio  # 비동기 스트리밍 처리
 import time
+import string
 from datetime import datetime
 
 # RAG 시스템 핵심 모듈 임포트 - 각각 특화된 기능 담당
 from embedding_generator import EmbeddingGenerator  # BGE-M3 임베딩 모델 관리
 from services.vector_search_service import VectorSearchService  # Milvus 벡터 검색 서비스
 from llm_client import LLMClient  # Ollama LLM 클라이언트
+from llm_cache import SemanticLLMCache, SEMANTIC_CACHE_ENABLED  # LLM 응답 시맨틱 캐시
 from router_llm_client import RouterLLMClient  # RAG 사용 여부 결정 라우터
 
 # 환경변수 로드
 load_dotenv()
 
+# 요청 처리 중 참조하는 설정값 (시작 시 한 번만 읽고 변환)
+COLLECTION_NAME = os.environ["COLLECTION_NAME"]
+EMBEDDING_MODEL = os.environ["EMBEDDING_MODEL"]
+OLLAMA_MODEL = os.environ["OLLAMA_MODEL"]
+ROUTER_LLM_MODEL = os.environ["ROUTER_LLM_MODEL"]
+DIMENSION = int(os.environ["DIMENSION"])
+METRIC_TYPE = os.environ["METRIC_TYPE"]
+MAX_CONTEXT_LENGTH = int(os.environ["MAX_CONTEXT_LENGTH"])
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -54,9 +65,72 @@ embedding_generator = None
 vector_search_service = None
 llm_client = None
 router_llm_client = None
+llm_probe_task = None  # Ollama 연결 테스트 백그라운드 태스크
+llm_keepwarm_task = None  # Ollama 모델 상주 유지 백그라운드 태스크
 
 # JWT authentication removed for MVP
 
+# SSE 이벤트 - 토큰 이벤트는 고정 앞/뒤 조각 사이에 orjson으로 직렬화한 청크 문자열만 삽입
+_SSE_CONTENT_HEAD = b'data: {"type":"content","content":'
+_SSE_CONTENT_TAIL = b'}\n\n'
+_SSE_END = b'data: {"type":"end"}\n\n'
+
+def _sse(data: Dict[str, Any]) -> bytes:
+    """SSE data 이벤트 1건 (orjson 직렬화)"""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+# 토큰 묶음 전송 - 최대 토큰 수 또는 첫 토큰 이후 대기 시간(ms) 중 먼저 도달한 시점에 SSE 프레임 1개로 전송
+SSE_COALESCE_TOKENS = int(os.environ.get("SSE_COALESCE_TOKENS", "16"))
+SSE_COALESCE_MS = int(os.environ.get("SSE_COALESCE_MS", "20"))
+
+async def _coalesce_tokens(tokens: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """
+    LLM 토큰 스트림을 묶어서 전달 - 프레임당 JSON/SSE/yield 비용을 여러 토큰에 분산
+    
+    첫 토큰은 바로 전달 (첫 응답 지연 유지), 이후 토큰은 SSE_COALESCE_TOKENS개 또는
+    SSE_COALESCE_MS 경과 시 전달 - 다음 토큰이 늦어도 모인 토큰은 제한 시간 안에 전달
+    """
+    iterator = tokens.__aiter__()
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    deadline = None
+    first = True
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                # 대기 시간 초과 - 다음 토큰은 계속 기다리면서 모인 토큰 전달
+                yield "".join(buffer)
+                buffer.clear()
+                deadline = None
+                continue
+            
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                break
+            pending = asyncio.ensure_future(iterator.__anext__())
+            
+            if first:
+                first = False
+                yield chunk
+                continue
+            buffer.append(chunk)
+            if len(buffer) >= SSE_COALESCE_TOKENS:
+                yield "".join(buffer)
+                buffer.clear()
+                deadline = None
+            elif deadline is None:
+                deadline = loop.time() + SSE_COALESCE_MS / 1000
+        
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if not pending.done():
+            pending.cancel()
+
 # 시스템 프롬프트 (메모리에 저장, 실제로는 DB나 파일에 저장)
 SYSTEM_PROMPT = """다음은 UNCOMMON 안경 제품에 대한 정보를 기반으로 사용자의 질문에 답변하는 AI 어시스턴트입니다.
 
@@ -70,6 +144,25 @@ SYSTEM_PROMPT = """다음은 UNCOMMON 안경 제품에 대한 정보를 기반
 - 한국어로 친근하게 답변해주세요
 - 정보가 불충분하다면 그 사실을 명시해주세요"""
 
+def _compile_prompt(template: str) -> Callable[[str, str], str]:
+    """
+    프롬프트 템플릿을 렌더링 함수로 한 번만 변환 - 요청마다 format 문자열을 다시 파싱하지 않음
+    
+    {query} → {context} 순서로 한 번씩만 쓰는 템플릿은 앞/중간/뒤 조각을 이어 붙이고,
+    그 외 형태(순서 변경, 반복, 서식 지정 등)는 str.format으로 처리
+    """
+    try:
+        parts = list(string.Formatter().parse(template))
+    except ValueError:
+        parts = None
+    if (parts is not None and len(parts) == 3
+            and [(field, spec, conv) for _, field, spec, conv in parts] == [("query", "", None), ("context", "", None), (None, None, None)]):
+        head, mid, tail = (literal for literal, _, _, _ in parts)
+        return lambda query, context: f"{head}{query}{mid}{context}{tail}"
+    return lambda query, context: template.format(query=query, context=context)
+
+_render_prompt = _compile_prompt(SYSTEM_PROMPT)
+
 # 요청/응답 모델
 class ChatRequest(BaseModel):
     query: str
@@ -132,10 +225,15 @@ class DocumentResponse(BaseModel):
 
 # JWT authentication functions removed for MVP
 
+async def _keep_llm_warm():
+    """연결 테스트(모델 자동 선택)가 끝난 뒤 모델 상주 유지 루프 실행"""
+    await llm_probe_task
+    await llm_client.keep_warm()
+
 @app.on_event("startup")
 async def startup_event():
     """서비스 시작 시 초기화"""
-    global embedding_generator, vector_search_service, llm_client, router_llm_client
+    global embedding_generator, vector_search_service, llm_client, router_llm_client, llm_probe_task, llm_keepwarm_task
     
     try:
         logger.info("🚀 UNCOMMON RAG API 서비스 시작")
@@ -157,7 +255,12 @@ async def startup_event():
         
         # LLM 클라이언트 초기화
         logger.info("🤖 Ollama LLM 클라이언트 초기화 중...")
-        llm_client = LLMClient()
+        llm_cache = SemanticLLMCache(embedding_generator.generate_query_embedding_async) if SEMANTIC_CACHE_ENABLED else None
+        llm_client = LLMClient(cache=llm_cache)
+        # 연결 테스트는 백그라운드에서 실행 - 응답을 기다리지 않고 서비스 시작
+        llm_probe_task = asyncio.create_task(llm_client.test_connection_async())
+        # 모델 이름 확인 후 모델을 미리 로드하고 주기적으로 상주 시간 갱신
+        llm_keepwarm_task = asyncio.create_task(_keep_llm_warm())
         logger.info("✅ Ollama LLM 클라이언트 초기화 완료")
         
         logger.info("🎉 모든 모듈 초기화 완료!")
@@ -166,6 +269,15 @@ async def startup_event():
         logger.error(f"❌ 초기화 실패: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """서비스 종료 시 연결 정리"""
+    if llm_keepwarm_task is not None:
+        llm_keepwarm_task.cancel()
+    if llm_client is not None:
+        await llm_client.aclose()
+    logger.info("👋 UNCOMMON RAG API 서비스 종료")
+
 @app.get("/")
 async def root():
     """서비스 상태 확인"""
@@ -173,8 +285,8 @@ async def root():
         "service": "UNCOMMON RAG API Service",
         "status": "running",
         "version": "1.0.0",
-        "embedding_model": os.environ["EMBEDDING_MODEL"],
-        "llm_model": os.environ["OLLAMA_MODEL"],
+        "embedding_model": EMBEDDING_MODEL,
+        "llm_model": OLLAMA_MODEL,
         "vector_store": "Milvus"
     }
 
@@ -249,13 +361,7 @@ async def chat(request: ChatRequest):
                 logger.info(f"⏱️ 직접 응답 생성 완료: {llm_end - llm_start:.2f}초")
                 logger.info(f"⏱️ 전체 처리 시간: {total_end - start_time:.2f}초")
                 
-                response_data = ChatResponse(
-                    answer=answer,
-                    sources=[],  # 직접 응답은 소스 없음
-                    query_embedding_dim=1024
-                )
-                
-                # 디버깅 정보가 요청된 경우 추가
+                # 디버깅 정보가 요청된 경우 추가 (ChatResponse 생성 없이 dict 반환)
                 if request.include_debug:
                     debug_info = {
                         "query": request.query,
@@ -265,7 +371,7 @@ async def chat(request: ChatRequest):
                         "settings": {
                             "top_k": request.top_k,
                             "temperature": request.temperature,
-                            "router_model": os.environ["ROUTER_LLM_MODEL"],
+                            "router_model": ROUTER_LLM_MODEL,
                             "stream": request.stream
                         }
                     }
@@ -276,7 +382,11 @@ async def chat(request: ChatRequest):
                         "debug_info": debug_info
                     }
                 
-                return response_data
+                return ChatResponse(
+                    answer=answer,
+                    sources=[],  # 직접 응답은 소스 없음
+                    query_embedding_dim=1024
+                )
         else:
             # RAG 사용
             logger.info("🎯 RAG 모드 (벡터 검색 + 컨텍스트 기반 응답)")
@@ -289,16 +399,16 @@ async def chat(request: ChatRequest):
             )
             search_end = time.time()
             logger.info(f"⏱️ 벡터 검색 완료: {search_end - search_start:.2f}초")
+            hits = _to_hits(search_results)
             
             # 3. 컨텍스트 구성
             context_start = time.time()
-            if not search_results:
+            if not hits:
                 logger.warning("⚠️ 관련 제품을 찾을 수 없습니다")
                 # RAG 필요하지만 데이터 없으면 컨텍스트에 "정보 없음"을 명시
                 context = "검색 결과: 요청하신 제품에 대한 정보를 데이터베이스에서 찾을 수 없습니다."
-                search_results = []  # 빈 결과 리스트
             else:
-                context = _build_context(search_results)
+                context = _build_context(hits)
             context_end = time.time()
             logger.info(f"⏱️ 컨텍스트 구성 완료: {context_end - context_start:.2f}초")
             
@@ -307,7 +417,7 @@ async def chat(request: ChatRequest):
                 # 스트리밍 응답
                 logger.info("📡 RAG 스트리밍 응답 시작")
                 return StreamingResponse(
-                    _stream_rag_response(request.query, context, search_results, request.temperature, request),
+                    _stream_rag_response(request.query, context, hits, request.temperature, request),
                     media_type="text/event-stream"
                 )
             else:
@@ -325,24 +435,25 @@ async def chat(request: ChatRequest):
                 logger.info(f"⏱️ RAG LLM 응답 생성 완료: {llm_end - llm_start:.2f}초")
                 logger.info(f"⏱️ 전체 처리 시간: {total_end - start_time:.2f}초")
                 
-                response_data = ChatResponse(
-                    answer=answer,
-                    sources=_format_sources(search_results),
-                    query_embedding_dim=1024
-                )
+                # 소스 목록은 한 번만 구성
+                formatted_sources = _format_sources(hits)
                 
-                # 디버깅 정보가 요청된 경우 추가
+                # 디버깅 정보가 요청된 경우 추가 (ChatResponse 생성 없이 dict 반환)
                 if request.include_debug:
-                    debug_info = _build_debug_info(request.query, search_results, context, request)
+                    debug_info = _build_debug_info(request.query, hits, context, request)
                     debug_info["router_decision"] = "RAG 사용 (제품 정보 필요)"
                     return {
                         "answer": answer,
-                        "sources": _format_sources(search_results),
+                        "sources": formatted_sources,
                         "query_embedding_dim": 1024,
                         "debug_info": debug_info
                     }
                 
-                return response_data
+                return ChatResponse(
+                    answer=answer,
+                    sources=formatted_sources,
+                    query_embedding_dim=1024
+                )
             
     except Exception as e:
         logger.error(f"❌ 채팅 실패: {str(e)}")
@@ -364,9 +475,10 @@ async def multimodal_chat(
         start_time = time.time()
         logger.info(f"🖼️ 멀티모달 채팅 요청: {query}")
         
-        # 이미지 처리
+        # 이미지 검증
         image_data = None
-        if image and image.size > 0:
+        has_image = image is not None and image.size > 0
+        if has_image:
             # 이미지 크기 제한 (10MB)
             if image.size > 10 * 1024 * 1024:
                 raise HTTPException(status_code=400, detail="이미지 크기가 10MB를 초과합니다")
@@ -375,20 +487,23 @@ async def multimodal_chat(
             allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
             if image.content_type not in allowed_types:
                 raise HTTPException(status_code=400, detail="지원되지 않는 이미지 형식입니다. (JPEG, PNG, GIF, WebP 지원)")
-            
-            image_data = await image.read()
-            logger.info(f"📷 이미지 업로드됨: {image.filename}, 크기: {len(image_data)} bytes, 타입: {image.content_type}")
         
-        # 1. 벡터 검색 수행
+        # 1. 벡터 검색 수행 (이미지 업로드 읽기와 동시에 진행)
         search_start = time.time()
-        search_results = await vector_search_service.search_similar_documents(
+        search = vector_search_service.search_similar_documents(
             query=query,
             top_k=top_k
         )
+        if has_image:
+            search_results, image_data = await asyncio.gather(search, image.read())
+            logger.info(f"📷 이미지 업로드됨: {image.filename}, 크기: {len(image_data)} bytes, 타입: {image.content_type}")
+        else:
+            search_results = await search
         search_end = time.time()
         logger.info(f"⏱️ 벡터 검색 완료: {search_end - search_start:.2f}초")
+        hits = _to_hits(search_results)
         
-        if not search_results:
+        if not hits:
             logger.warning("⚠️ 관련 제품을 찾을 수 없습니다")
             return ChatResponse(
                 answer="죄송합니다. 관련된 제품 정보를 찾을 수 없습니다.",
@@ -398,7 +513,7 @@ async def multimodal_chat(
         
         # 2. 컨텍스트 구성
         context_start = time.time()
-        context = _build_context(search_results)
+        context = _build_context(hits)
         context_end = time.time()
         logger.info(f"⏱️ 컨텍스트 구성 완료: {context_end - context_start:.2f}초")
         
@@ -407,7 +522,7 @@ async def multimodal_chat(
             # 스트리밍 응답
             logger.info(f"📡 {'멀티모달 ' if image_data else ''}스트리밍 응답 시작")
             return StreamingResponse(
-                _stream_multimodal_response(query, context, search_results, temperature, image_data, include_debug),
+                _stream_multimodal_response(query, context, hits, temperature, image_data, include_debug),
                 media_type="text/event-stream"
             )
         else:
@@ -426,26 +541,27 @@ async def multimodal_chat(
             logger.info(f"⏱️ LLM 응답 생성 완료: {llm_end - llm_start:.2f}초")
             logger.info(f"⏱️ 전체 처리 시간: {total_end - start_time:.2f}초")
             
-            response_data = ChatResponse(
-                answer=answer,
-                sources=_format_sources(search_results),
-                query_embedding_dim=1024
-            )
+            # 소스 목록은 한 번만 구성
+            formatted_sources = _format_sources(hits)
             
-            # 디버깅 정보가 요청된 경우 추가
+            # 디버깅 정보가 요청된 경우 추가 (ChatResponse 생성 없이 dict 반환)
             if include_debug:
-                debug_info = _build_debug_info(query, search_results, context, ChatRequest(
+                debug_info = _build_debug_info(query, hits, context, ChatRequest(
                     query=query, top_k=top_k, temperature=temperature, stream=stream, include_debug=include_debug
                 ))
                 return {
                     "answer": answer,
-                    "sources": _format_sources(search_results),
+                    "sources": formatted_sources,
                     "query_embedding_dim": 1024,
                     "debug_info": debug_info,
                     "has_image": image_data is not None
                 }
             
-            return response_data
+            return ChatResponse(
+                answer=answer,
+                sources=formatted_sources,
+                query_embedding_dim=1024
+            )
             
     except HTTPException:
         raise
@@ -453,69 +569,102 @@ async def multimodal_chat(
         logger.error(f"❌ 멀티모달 채팅 실패: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def _build_context(search_results: List[Dict]) -> str:
-    """검색 결과로부터 컨텍스트 구성"""
-    context_parts = []
-    max_length = int(os.environ["MAX_CONTEXT_LENGTH"])
+# 검색 결과 dict에 키가 없음을 나타내는 표식 - 소비처마다 다른 .get 기본값을 그대로 적용하기 위함
+_MISSING: Any = object()
+
+def _field(value: Any, default: Any) -> Any:
+    """_Hit 필드 값 - 키가 없던 경우에만 기본값 (result.get(key, default)와 동일, None은 그대로)"""
+    return default if value is _MISSING else value
+
+class _Hit(NamedTuple):
+    """검색 결과 1건 - 컨텍스트/소스/디버깅 정보 구성에 필요한 필드만 한 번 추출"""
+    content: str
+    product_id: Optional[int]
+    product_name: Any  # 값 또는 _MISSING
+    chunk_type: Any  # 값 또는 _MISSING
+    source: Optional[str]
+    score: float
+
+def _to_hits(search_results: List[Dict]) -> List[_Hit]:
+    """검색 결과 dict 리스트 → _Hit 리스트 (dict 조회는 여기서 한 번만)"""
+    return [
+        _Hit(
+            result.get("content", ""),
+            result.get("product_id"),
+            result.get("product_name", _MISSING),
+            result.get("chunk_type", _MISSING),
+            result.get("source", ""),
+            result.get("score", 0.0)
+        )
+        for result in search_results
+    ]
+
+def _build_context(hits: List[_Hit]) -> str:
+    """검색 결과로부터 컨텍스트 구성 (조각을 리스트에 모아 마지막에 join 1회)"""
+    context_parts: List[str] = []
     current_length = 0
     
-    for i, result in enumerate(search_results, 1):
-        content = result.get("content", "")
-        product_name = result.get("product_name", "")
-        chunk_type = result.get("chunk_type", "")
-        
-        # 제품 정보 포함한 컨텍스트 생성
-        context_item = f"[제품정보 {i}]\n"
-        if product_name:
-            context_item += f"제품명: {product_name}\n"
-        if chunk_type:
-            context_item += f"정보 유형: {chunk_type}\n"
-        context_item += f"{content}\n"
+    for i, hit in enumerate(hits, 1):
+        # 본문만으로도 길이 제한을 넘으면 항목을 만들지 않고 종료
+        if current_length + len(hit.content) + 1 > MAX_CONTEXT_LENGTH:
+            break
+        
+        # 제품 정보 포함한 컨텍스트 항목 조각
+        item = [f"[제품정보 {i}]\n"]
+        if product_name := _field(hit.product_name, ""):
+            item.append(f"제품명: {product_name}\n")
+        if chunk_type := _field(hit.chunk_type, ""):
+            item.append(f"정보 유형: {chunk_type}\n")
+        item.append(hit.content)
+        item.append("\n")
         
         # 길이 체크
-        if current_length + len(context_item) > max_length:
+        item_length = sum(map(len, item))
+        if current_length + item_length > MAX_CONTEXT_LENGTH:
             break
-            
-        context_parts.append(context_item)
-        current_length += len(context_item)
+        
+        if context_parts:
+            context_parts.append("\n")
+        context_parts.extend(item)
+        current_length += item_length
     
-    return "\n".join(context_parts)
+    return "".join(context_parts)
 
-def _format_sources(search_results: List[Dict]) -> List[Dict]:
+def _format_sources(hits: List[_Hit]) -> List[Dict]:
     """검색 결과를 소스 형식으로 변환"""
-    sources = []
-    for result in search_results:
-        sources.append({
-            "product_name": result.get("product_name", "Unknown"),
-            "product_id": result.get("product_id"),
-            "chunk_type": result.get("chunk_type"),
-            "score": result.get("score", 0.0)
-        })
-    return sources
-
-def _build_debug_info(query: str, search_results: List[Dict], context: str, request: ChatRequest) -> Dict[str, Any]:
+    return [
+        {
+            "product_name": _field(hit.product_name, "Unknown"),
+            "product_id": hit.product_id,
+            "chunk_type": _field(hit.chunk_type, None),
+            "score": hit.score
+        }
+        for hit in hits
+    ]
+
+def _build_debug_info(query: str, hits: List[_Hit], context: str, request: ChatRequest) -> Dict[str, Any]:
     """디버깅 정보 생성"""
     return {
         "query": query,
         "search_results": [
             {
-                "product_name": result.get("product_name", "Unknown"),
-                "chunk_type": result.get("chunk_type", "unknown"),
-                "content": result.get("content", "")[:500],  # 처음 500자만
-                "score": result.get("score", 0.0),
-                "product_id": result.get("product_id"),
-                "source": result.get("source", "")
+                "product_name": _field(hit.product_name, "Unknown"),
+                "chunk_type": _field(hit.chunk_type, "unknown"),
+                "content": hit.content[:500],  # 처음 500자만
+                "score": hit.score,
+                "product_id": hit.product_id,
+                "source": hit.source
             }
-            for result in search_results
+            for hit in hits
         ],
-        "prompt": SYSTEM_PROMPT.format(query=query, context=context),
+        "prompt": _render_prompt(query, context),
         "settings": {
             "top_k": request.top_k,
             "temperature": request.temperature,
-            "embedding_model": os.environ["EMBEDDING_MODEL"],
-            "llm_model": os.environ["OLLAMA_MODEL"],
+            "embedding_model": EMBEDDING_MODEL,
+            "llm_model": OLLAMA_MODEL,
             "stream": request.stream,
-            "max_context_length": int(os.environ["MAX_CONTEXT_LENGTH"])
+            "max_context_length": MAX_CONTEXT_LENGTH
         }
     }
 
@@ -533,7 +682,7 @@ async def _stream_direct_response(query: str, temperature: float, request: ChatR
                 "settings": {
                     "top_k": request.top_k,
                     "temperature": temperature,
-                    "router_model": os.environ["ROUTER_LLM_MODEL"],
+                    "router_model": ROUTER_LLM_MODEL,
                     "stream": request.stream
                 }
             }
@@ -546,83 +695,80 @@ async def _stream_direct_response(query: str, temperature: float, request: ChatR
         if debug_info:
             start_data['debug_info'] = debug_info
         
-        yield f"data: {json.dumps(start_data)}\n\n"
+        yield _sse(start_data)
         
         # Router LLM 스트리밍 응답
-        async for chunk in router_llm_client.stream_direct_response(query, temperature):
-            yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
-            await asyncio.sleep(0.01)
+        async for chunk in _coalesce_tokens(router_llm_client.stream_direct_response(query, temperature)):
+            yield _SSE_CONTENT_HEAD + orjson.dumps(chunk) + _SSE_CONTENT_TAIL
         
         # 스트리밍 종료 이벤트
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        yield _SSE_END
         
     except Exception as e:
         logger.error(f"직접 응답 스트리밍 오류: {str(e)}")
-        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        yield _sse({'type': 'error', 'error': str(e)})
 
-async def _stream_rag_response(query: str, context: str, search_results: List[Dict], temperature: float, request: ChatRequest = None):
+async def _stream_rag_response(query: str, context: str, hits: List[_Hit], temperature: float, request: ChatRequest = None):
     """RAG 스트리밍 응답 생성"""
     try:
         # 디버깅 정보 준비
         debug_info = None
         if request and request.include_debug:
-            debug_info = _build_debug_info(query, search_results, context, request)
+            debug_info = _build_debug_info(query, hits, context, request)
             debug_info["router_decision"] = "RAG 사용 (제품 정보 필요)"
         
         # 스트리밍 시작 이벤트 (디버깅 정보 포함)
         start_data = {
             'type': 'start', 
-            'sources': _format_sources(search_results)
+            'sources': _format_sources(hits)
         }
         if debug_info:
             start_data['debug_info'] = debug_info
         
-        yield f"data: {json.dumps(start_data)}\n\n"
+        yield _sse(start_data)
         
         # LLM 스트리밍 응답
-        async for chunk in llm_client.stream_generate(query, context, temperature):
-            yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
-            await asyncio.sleep(0.01)  # 백프레셔 제어
+        async for chunk in _coalesce_tokens(llm_client.stream_generate(query, context, temperature)):
+            yield _SSE_CONTENT_HEAD + orjson.dumps(chunk) + _SSE_CONTENT_TAIL
         
         # 스트리밍 종료 이벤트
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        yield _SSE_END
         
     except Exception as e:
         logger.error(f"RAG 스트리밍 오류: {str(e)}")
-        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        yield _sse({'type': 'error', 'error': str(e)})
 
-async def _stream_multimodal_response(query: str, context: str, search_results: List[Dict], temperature: float, image_data: Optional[bytes] = None, include_debug: bool = False):
+async def _stream_multimodal_response(query: str, context: str, hits: List[_Hit], temperature: float, image_data: Optional[bytes] = None, include_debug: bool = False):
     """멀티모달 스트리밍 응답 생성"""
     try:
         # 디버깅 정보 준비
         debug_info = None
         if include_debug:
-            debug_info = _build_debug_info(query, search_results, context, ChatRequest(
+            debug_info = _build_debug_info(query, hits, context, ChatRequest(
                 query=query, temperature=temperature, stream=True, include_debug=include_debug
             ))
         
         # 스트리밍 시작 이벤트 (디버깅 정보 포함)
         start_data = {
             'type': 'start', 
-            'sources': _format_sources(search_results),
+            'sources': _format_sources(hits),
             'has_image': image_data is not None
         }
         if debug_info:
             start_data['debug_info'] = debug_info
         
-        yield f"data: {json.dumps(start_data)}\n\n"
+        yield _sse(start_data)
         
         # LLM 스트리밍 응답 (이미지 포함)
-        async for chunk in llm_client.stream_generate(query, context, temperature, image_data):
-            yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
-            await asyncio.sleep(0.01)  # 백프레셔 제어
+        async for chunk in _coalesce_tokens(llm_client.stream_generate(query, context, temperature, image_data)):
+            yield _SSE_CONTENT_HEAD + orjson.dumps(chunk) + _SSE_CONTENT_TAIL
         
         # 스트리밍 종료 이벤트
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        yield _SSE_END
         
     except Exception as e:
         logger.error(f"멀티모달 스트리밍 오류: {str(e)}")
-        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        yield _sse({'type': 'error', 'error': str(e)})
 
 @app.get("/stats")
 async def get_stats():
@@ -630,10 +776,10 @@ async def get_stats():
     try:
         stats = await vector_search_service.get_service_stats()
         return {
-            "collection_name": os.environ["COLLECTION_NAME"],
+            "collection_name": COLLECTION_NAME,
             "total_vectors": stats.get("vector_store", {}).get("row_count", 0),
-            "embedding_dim": int(os.environ["DIMENSION"]),
-            "metric_type": os.environ["METRIC_TYPE"]
+            "embedding_dim": DIMENSION,
+            "metric_type": METRIC_TYPE
         }
     except Exception as e:
         logger.error(f"통계 조회 실패: {str(e)}")
@@ -666,8 +812,9 @@ async def get_system_prompt():
 @app.post("/admin/prompt")
 async def update_system_prompt(request: SystemPromptRequest):
     """시스템 프롬프트 업데이트"""
-    global SYSTEM_PROMPT
+    global SYSTEM_PROMPT, _render_prompt
     SYSTEM_PROMPT = request.prompt
+    _render_prompt = _compile_prompt(SYSTEM_PROMPT)
     logger.info("시스템 프롬프트가 업데이트됨")
     return {
         "prompt": SYSTEM_PROMPT,
@@ -6,6 +6,7 @@ Router LLM Client for Conditional RAG
 import os
 import logging
 import httpx
+import orjson
 from typing import Optional
 from dotenv import load_dotenv
 
@@ -13,6 +14,9 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# orjson으로 직렬화한 요청 본문 전송용 헤더
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
 class RouterLLMClient:
     """RAG 필요성 판단을 위한 라우터 LLM 클라이언트"""
     
@@ -41,7 +45,7 @@ class RouterLLMClient:
                 # 모델 존재 확인
                 response = client.get(f"{self.base_url}/api/tags")
                 if response.status_code == 200:
-                    models = response.json().get("models", [])
+                    models = orjson.loads(response.content).get("models", [])
                     model_names = [m["name"] for m in models]
                     if self.model in model_names:
                         logger.info(f"✅ Router 모델 '{self.model}' 확인됨")
@@ -80,7 +84,7 @@ class RouterLLMClient:
             async with httpx.AsyncClient(timeout=30.0) as client:
                 response = await client.post(
                     f"{self.base_url}/api/generate",
-                    json={
+                    content=orjson.dumps({
                         "model": self.model,
                         "prompt": router_prompt,
                         "stream": False,
@@ -89,11 +93,12 @@ class RouterLLMClient:
                             "num_predict": 10,   # 짧은 답변만 필요
                             "stop": ["\n", ".", ","]  # 답변을 짧게 제한
                         }
-                    }
+                    }),
+                    headers=_JSON_HEADERS
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content)
                     answer = result.get("response", "").strip().lower()
                     
                     # 답변 분석
@@ -138,7 +143,7 @@ class RouterLLMClient:
             async with httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(
                     f"{self.base_url}/api/generate",
-                    json={
+                    content=orjson.dumps({
                         "model": self.model,
                         "prompt": direct_prompt,
                         "stream": False,
@@ -146,11 +151,12 @@ class RouterLLMClient:
                             "temperature": temperature,
                             "num_predict": 200
                         }
-                    }
+                    }),
+                    headers=_JSON_HEADERS
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content)
                     answer = result.get("response", "").strip()
                     
                     logger.info(f"✅ Router LLM 직접 응답 생성 완료 ({len(answer)}자)")
@@ -191,7 +197,7 @@ class RouterLLMClient:
                 async with client.stream(
                     "POST",
                     f"{self.base_url}/api/generate",
-                    json={
+                    content=orjson.dumps({
                         "model": self.model,
                         "prompt": direct_prompt,
                         "stream": True,
@@ -199,15 +205,15 @@ class RouterLLMClient:
                             "temperature": temperature,
                             "num_predict": 200
                         }
-                    }
+                    }),
+                    headers=_JSON_HEADERS
                 ) as response:
                     
                     if response.status_code == 200:
                         async for line in response.aiter_lines():
                             if line:
                                 try:
-                                    import json
-                                    chunk_data = json.loads(line)
+                                    chunk_data = orjson.loads(line)
                                     
                                     if "response" in chunk_data:
                                         chunk = chunk_data["response"]
@@ -219,7 +225,7 @@ class RouterLLMClient:
                                         logger.info("✅ Router LLM 스트리밍 완료")
                                         break
                                         
-                                except json.JSONDecodeError:
+                                except orjson.JSONDecodeError:
                                     continue
                                     
                     else:
@@ -4,9 +4,10 @@
 """
 
 import os
+import asyncio
 import logging
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.documents import Document
 
 # 프로젝트 모듈
@@ -15,6 +16,10 @@ from retriever.retriever import get_retriever, AdvancedRetriever
 
 logger = logging.getLogger(__name__)
 
+# 동시 검색 요청 배칭 - 대기 시간 동안 모인 쿼리 벡터를 Milvus search 1회로 처리
+SEARCH_BATCH_MAX = 32
+SEARCH_BATCH_WAIT_MS = 5
+
 class VectorSearchService:
     """벡터 검색 서비스 클래스"""
     
@@ -31,6 +36,10 @@ class VectorSearchService:
         
         # 고급 검색기 초기화
         self.advanced_retriever = AdvancedRetriever(self.vector_store)
+        
+        # 비동기 검색 배처 (첫 비동기 검색 시 이벤트 루프에서 워커 시작)
+        self._search_queue: Optional[asyncio.Queue] = None
+        self._search_worker: Optional[asyncio.Task] = None
     
     def _init_vector_store(self):
         """벡터 스토어 초기화"""
@@ -67,7 +76,10 @@ class VectorSearchService:
             
             # 검색 수행
             if search_type == 'similarity':
-                docs = self.vector_store.similarity_search_with_score(query, k=top_k)
+                # 쿼리 임베딩은 동시 요청과 묶어 한 번의 encode로 처리
+                query_vector = await self.embedding_generator.generate_query_embedding_async(query)
+                # Milvus 검색도 동시 요청과 묶어 search 1회로 처리
+                docs = await self._search_vector(query_vector, top_k)
             else:
                 # 다른 검색 타입들을 위한 확장 가능
                 retriever = get_retriever(self.vector_store, search_type, k=top_k)
@@ -100,6 +112,57 @@ class VectorSearchService:
             logger.error(f"❌ 벡터 검색 실패: {str(e)}")
             raise
     
+    async def _search_vector(self, query_vector: List[float], top_k: int) -> List[Tuple[Any, float]]:
+        """
+        쿼리 벡터 검색 (비동기 동적 배칭)
+        
+        SEARCH_BATCH_WAIT_MS 안에 들어온 동시 검색을 최대 SEARCH_BATCH_MAX개까지 묶어
+        Milvus search 1회로 처리 - 요청당 고정 오버헤드와 왕복을 여러 쿼리가 나눠 씀
+        
+        Returns:
+            (Document, 점수) 리스트
+        """
+        if self._search_worker is None or self._search_worker.done():
+            self._search_queue = asyncio.Queue()
+            self._search_worker = asyncio.create_task(self._search_batch_loop())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._search_queue.put((query_vector, top_k, future))
+        return await future
+    
+    async def _search_batch_loop(self):
+        """큐에서 검색 요청을 모아 배치 검색 후 각 요청의 Future에 결과 전달"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._search_queue.get()]
+            deadline = loop.time() + SEARCH_BATCH_WAIT_MS / 1000
+            while len(batch) < SEARCH_BATCH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._search_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # top_k가 다른 요청은 가장 큰 k로 검색한 뒤 요청별로 자름
+            vectors = [vector for vector, _, _ in batch]
+            max_k = max(top_k for _, top_k, _ in batch)
+            try:
+                batch_docs = await asyncio.to_thread(self.vector_store.similarity_search_by_vectors, vectors, max_k)
+            except Exception as e:
+                logger.error(f"배치 벡터 검색 실패: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            if len(batch) > 1:
+                logger.debug(f"검색 {len(batch)}개 배치 처리")
+            for (_, top_k, future), docs in zip(batch, batch_docs):
+                if not future.done():
+                    future.set_result([(doc, doc.metadata.get('score', 0.0)) for doc in docs[:top_k]])
+    
     async def search_with_context_ranking(self, 
                                         query: str, 
                                         top_k: int = 5,
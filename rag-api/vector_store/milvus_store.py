@@ -5,7 +5,8 @@
 
 import os
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import psycopg2
 from pymilvus import Collection, connections, utility
 from langchain_core.documents import Document
 from langchain.vectorstores.base import VectorStore
@@ -40,6 +41,9 @@ class ImprovedMilvusVectorStore(VectorStore):
         self.milvus_host = milvus_host or os.environ["MILVUS_HOST"]
         self.milvus_port = milvus_port or os.environ["MILVUS_INTERNAL_PORT"]
         
+        # 청크 원문 조회용 PostgreSQL 연결 (content 필드 없는 스키마에서 첫 검색 시 생성)
+        self._pg_conn = None
+        
         # Milvus 연결
         self._connect_milvus()
         
@@ -76,6 +80,14 @@ class ImprovedMilvusVectorStore(VectorStore):
             self.collection = Collection(name=self.collection_name)
             self.collection.load()
             
+            # 인덱싱 서비스가 원문을 PostgreSQL product_chunks에 저장하는 스키마인지 확인
+            field_names = {field.name for field in self.collection.schema.fields}
+            self._store_content = "content" in field_names
+            self._output_fields = [
+                name for name in ("product_id", "product_name", "chunk_type", "chunk_ord", "source", "content")
+                if name in field_names
+            ]
+            
             # 컬렉션 정보 확인
             total_docs = self.collection.num_entities
             logger.info(f"📊 컬렉션 총 문서 수: {total_docs}")
@@ -99,16 +111,57 @@ class ImprovedMilvusVectorStore(VectorStore):
             "params": params
         }
     
+    def _fetch_contents(self, keys: List[Tuple[int, int]]) -> Dict[Tuple[int, int], str]:
+        """(product_id, chunk_ord) 목록의 청크 원문을 PostgreSQL에서 쿼리 1회로 조회"""
+        if not keys:
+            return {}
+        if self._pg_conn is None or self._pg_conn.closed:
+            self._pg_conn = psycopg2.connect(
+                host=os.environ["POSTGRES_HOST"],
+                port=os.environ["POSTGRES_PORT"],
+                database=os.environ["POSTGRES_DB"],
+                user=os.environ["POSTGRES_USER"],
+                password=os.environ["POSTGRES_PASSWORD"]
+            )
+            self._pg_conn.autocommit = True
+        
+        with self._pg_conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.product_id, c.chunk_ord, c.content FROM product_chunks c "
+                "JOIN unnest(%s::integer[], %s::smallint[]) AS k(product_id, chunk_ord) "
+                "USING (product_id, chunk_ord)",
+                ([pid for pid, _ in keys], [ord_ for _, ord_ in keys])
+            )
+            return {(product_id, chunk_ord): content for product_id, chunk_ord, content in cursor.fetchall()}
+    
     def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
         """
         유사한 문서 검색 (LangChain 인터페이스)
         레퍼런스 코드 기반으로 개선
         """
+        # 쿼리 임베딩 생성
+        logger.info(f"🔍 쿼리 임베딩 생성: '{query[:50]}...'")
+        query_vector = self.embedding_model.generate_query_embedding(query)
+        return self.similarity_search_by_vector(query_vector, k, **kwargs)
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        """
+        미리 계산된 쿼리 임베딩으로 검색 (비동기 배치 임베딩 경로용)
+        """
+        return self.similarity_search_by_vectors([embedding], k, **kwargs)[0]
+    
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4, **kwargs) -> List[List[Document]]:
+        """
+        여러 쿼리 임베딩을 Milvus search 1회로 검색 (동시 요청 배치 검색용)
+        
+        Returns:
+            쿼리별 Document 리스트 (입력 순서)
+        """
         # 컬렉션 총 문서 수 확인
         self.collection.load()
         total_docs = self.collection.num_entities
         logger.info(f"📊 컬렉션 총 문서 수: {total_docs}")
-        logger.info(f"📊 요청된 k 값: {k}")
+        logger.info(f"📊 요청된 k 값: {k} (쿼리 {len(embeddings)}개)")
         
         # 실제 k 값 조정
         actual_k = min(k, total_docs)
@@ -116,12 +169,9 @@ class ImprovedMilvusVectorStore(VectorStore):
         
         if total_docs == 0:
             logger.warning("⚠️ 컬렉션에 문서가 없습니다!")
-            return []
+            return [[] for _ in embeddings]
         
-        # 쿼리 임베딩 생성
-        logger.info(f"🔍 쿼리 임베딩 생성: '{query[:50]}...'")
-        query_vector = self.embedding_model.generate_query_embedding(query)
-        logger.info(f"📏 쿼리 벡터 차원: {len(query_vector)}")
+        logger.info(f"📏 쿼리 벡터 차원: {len(embeddings[0])}")
         
         # 검색 파라미터 설정
         search_params = self._get_search_params()
@@ -135,34 +185,57 @@ class ImprovedMilvusVectorStore(VectorStore):
         logger.info("🔍 벡터 검색 실행 중...")
         try:
             results = self.collection.search(
-                data=[query_vector],
+                data=embeddings,
                 anns_field="vector",
                 param=search_params,
                 limit=actual_k,
-                output_fields=["product_id", "product_name", "chunk_type", "source", "content"]
+                output_fields=self._output_fields
             )
             
             logger.info("✅ 검색 완료!")
-            logger.info(f"📊 검색 결과 개수: {len(results[0]) if results else 0}")
+            logger.info(f"📊 검색 결과 개수: {sum(len(hits) for hits in results) if results else 0}")
             
             # 각 결과의 상세 정보 출력
-            if results and len(results[0]) > 0:
-                for i, hit in enumerate(results[0]):
-                    logger.info(f"   결과 {i+1}: score={hit.score:.4f}, id={hit.id}")
+            for q, hits in enumerate(results or []):
+                for i, hit in enumerate(hits):
+                    logger.info(f"   [쿼리 {q+1}] 결과 {i+1}: score={hit.score:.4f}, id={hit.id}")
                     logger.info(f"          product_name: {hit.entity.get('product_name', 'N/A')}")
-                    logger.info(f"          content 길이: {len(hit.entity.get('content', ''))}")
+                    logger.info(f"          chunk_type: {hit.entity.get('chunk_type', 'N/A')}")
             
         except Exception as e:
             logger.error(f"❌ 검색 중 오류: {e}")
-            return []
+            return [[] for _ in embeddings]
         
         # LangChain Document 형식으로 변환
         logger.info("🔄 LangChain Document 형식으로 변환 중...")
-        docs = []
+        # 원문은 PostgreSQL에서 조회 (content 필드가 있는 기존 스키마는 Milvus 값 사용) - 배치 전체를 쿼리 1회로
+        contents = None
+        # 원문 조회에 성공했는데 원문이 없는 청크(재인덱싱 중 삭제 전 벡터)는 결과에서 제외
+        skip_missing = True
+        if not self._store_content:
+            try:
+                contents = self._fetch_contents(list(dict.fromkeys(
+                    (hit.entity.get("product_id"), hit.entity.get("chunk_ord")) for hits in results for hit in hits
+                )))
+            except Exception as e:
+                logger.error(f"❌ 청크 원문 조회 실패: {e}")
+                contents = {}
+                skip_missing = False
+        
+        batch_docs = []
         for hits in results:
+            docs = []
             for hit in hits:
+                if contents is None:
+                    page_content = hit.entity.get("content", "")
+                else:
+                    page_content = contents.get((hit.entity.get("product_id"), hit.entity.get("chunk_ord")))
+                    if page_content is None:
+                        if skip_missing:
+                            continue
+                        page_content = ""
                 doc = Document(
-                    page_content=hit.entity.get("content", ""),
+                    page_content=page_content,
                     metadata={
                         "product_id": hit.entity.get("product_id"),
                         "product_name": hit.entity.get("product_name"),
@@ -173,15 +246,21 @@ class ImprovedMilvusVectorStore(VectorStore):
                     }
                 )
                 docs.append(doc)
+            batch_docs.append(docs)
         
-        logger.info(f"✅ {len(docs)}개 문서를 LangChain Document로 변환 완료")
-        return docs
+        logger.info(f"✅ {sum(len(docs) for docs in batch_docs)}개 문서를 LangChain Document로 변환 완료")
+        return batch_docs
     
     def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[tuple]:
         """유사도 점수와 함께 검색"""
         docs = self.similarity_search(query, k, **kwargs)
         return [(doc, doc.metadata.get('score', 0.0)) for doc in docs]
     
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[tuple]:
+        """미리 계산된 쿼리 임베딩으로 유사도 점수와 함께 검색"""
+        docs = self.similarity_search_by_vector(embedding, k, **kwargs)
+        return [(doc, doc.metadata.get('score', 0.0)) for doc in docs]
+    
     def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
         """텍스트 리스트를 벡터 스토어에 추가 (미구현 - 인덱싱 서비스에서 처리)"""
         logger.warning("텍스트 추가는 인덱싱 서비스에서 처리됩니다")
@@ -4,7 +4,7 @@
 # 의존성: .env.global의 PostgreSQL 환경변수
 
 import os
-from sqlalchemy import create_engine  # PostgreSQL 데이터베이스 엔진 생성
+from sqlalchemy import create_engine, text  # PostgreSQL 데이터베이스 엔진 생성
 from sqlalchemy.ext.declarative import declarative_base  # ORM 모델 기본 클래스
 from sqlalchemy.orm import sessionmaker  # 데이터베이스 세션 팩토리
 
@@ -34,6 +34,9 @@ Base = declarative_base()  # ORM 모델의 기반 클래스
 def init_db():
     """데이터베이스 테이블 초기화 - Base에 등록된 모든 모델의 테이블 생성"""
     Base.metadata.create_all(bind=engine)  # CREATE TABLE IF NOT EXISTS 실행
+    # 기존 products 테이블에 통합 검색 텍스트 컬럼 추가 (create_all은 기존 테이블을 변경하지 않음)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS searchable_text TEXT"))
 
 # 데이터베이스 세션 생성 및 관리 함수 - FastAPI Dependency Injection에서 사용
 # 목적: HTTP 요청별로 독립적인 데이터베이스 세션 제공
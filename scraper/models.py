@@ -32,6 +32,9 @@ class Product(Base):
     material = Column(JSONB, default={})  # 재질/소재 정보
     size = Column(JSONB, default={})  # 사이즈 정보
     
+    # 인덱싱용 통합 검색 텍스트 - 저장 시 JSONB 필드에서 한 번만 생성 (build_searchable_text)
+    searchable_text = Column(Text, nullable=True)
+    
     # 상태 관리 필드
     issoldout = Column(Boolean, default=False, name='issoldout')  # 품절 여부
     indexed = Column(Boolean, default=False)  # 벡터 DB 인덱싱 완료 여부
@@ -15,6 +15,42 @@ from lxml import etree
 from decimal import Decimal
 import html
 
+# 통합 검색 텍스트 구성 필드 - (컬럼명, 접두어), 순서대로 " | "로 결합
+SEARCHABLE_FIELDS = (
+    ('color', '색상: '),
+    ('description', '설명: '),
+    ('material', '재질: '),
+    ('size', '사이즈: '),
+    ('reward_points', '리워드 포인트: '),
+)
+
+# 검색 텍스트 정리용 정규식 - HTML 태그와 중복 공백 제거 (indexing/main.py _flatten과 동일 규칙)
+_TAG = re.compile(r"<[^>]+>")
+_WS = re.compile(r"\s+")
+
+def _clean_text(value: Any) -> str:
+    """HTML 태그를 공백으로 바꾸고 연속 공백을 하나로 압축"""
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return _WS.sub(" ", _TAG.sub(" ", text)).strip()
+
+def _searchable_value(value: Any) -> str:
+    """필드 값을 검색용 텍스트로 변환 - 다국어 JSONB는 정리된 언어별 값을 " / "로 결합"""
+    if not value:
+        return ""
+    if isinstance(value, dict):
+        return " / ".join(
+            text for text in (_clean_text(v) for v in value.values() if v) if text
+        )
+    return value if isinstance(value, str) else _clean_text(value)
+
+def build_searchable_text(product: Product) -> str:
+    """인덱싱 서비스가 그대로 임베딩할 통합 검색 텍스트 생성"""
+    return " | ".join(
+        prefix + text
+        for attr, prefix in SEARCHABLE_FIELDS
+        if (text := _searchable_value(getattr(product, attr)))
+    )
+
 class ProductScraper:
     def __init__(self, db: Session):
         self.db = db
@@ -529,6 +565,7 @@ class ProductScraper:
             size=size_json,
             issoldout=product_data.get("isSoldout", False)
         )
+        product.searchable_text = build_searchable_text(product)
         self.db.add(product)
         self.db.commit()
         self.db.refresh(product)
@@ -565,6 +602,7 @@ class ProductScraper:
         product.material = material_json
         product.size = size_json
         product.issoldout = product_data.get("isSoldout", False)
+        product.searchable_text = build_searchable_text(product)
         
         self.db.commit()
     